@@ -1,26 +1,150 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import User, Slot, SlotParticipant, Auto, AutoQueue
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from .models import User, Slot, SlotParticipant, Auto, AutoQueue, DispatchOffer
 
 
-class UserAdmin(admin.ModelAdmin):
+def estimated_count(queryset):
+    """
+    A cheap row count for queryset's whole table from PostgreSQL's planner
+    statistics, or None where there are none to go on. Other databases are
+    counted exactly: the highest id, say, overcounts a table with churn like
+    AutoQueue, whose rows are deleted as autos are popped.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 until the table is first analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts an unfiltered changelist from PostgreSQL's table statistics once
+    the table holds ADMIN_ESTIMATED_COUNT_THRESHOLD rows or more, instead of
+    COUNT(*) over all of it. Searches, filters and other databases are
+    counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def indexed_lookup(model, path, value):
+    # A relation is searched through a subquery on its own index, so ORing
+    # it with the other search fields doesn't turn into a scan of the join
+    name, _, rest = path.partition('__')
+    field = model._meta.get_field(name)
+    if rest and field.is_relation:
+        related = field.related_model
+        return Q(**{f'{name}__in': related._default_manager.filter(indexed_lookup(related, rest, value)).values('pk')})
+    return Q(**{name: value})
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Changelists that stay fast on tables with millions of rows. Every
+    search_fields entry must be an indexed column and is matched exactly
+    against the whole search term; fields the term isn't a valid value for
+    (e.g. text for an id) are left out. A date_hierarchy is drawn from the
+    MIN and MAX of its field (api/templatetags/scalable_admin.py).
+    """
+    change_list_template = 'admin/scalable_change_list.html'
+    paginator = EstimatedCountPaginator
+    # The "N total" link costs another COUNT(*) of the whole table
+    show_full_result_count = False
+    ordering = ('-id',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        lookups = Q()
+        for path in self.get_search_fields(request):
+            field = get_fields_from_path(self.model, path)[-1]
+            try:
+                value = field.to_python(term)
+                field.run_validators(value)
+            except ValidationError:
+                continue
+            lookups |= indexed_lookup(self.model, path, value)
+        if not lookups:
+            return queryset.none(), False
+        return queryset.filter(lookups), False
+
+
+class UserAdmin(ScalableAdmin):
     list_display = ('username', 'email', 'phone', 'user_type',)
-    search_fields = ('username', 'email', 'phone')
+    list_filter = ('user_type', 'is_active', 'is_staff')
+    search_fields = ('id', 'username', 'email', 'phone')
 
-class SlotAdmin(admin.ModelAdmin):
-    list_display = ('id', 'created_at')
-    search_fields = ('id', 'start_time', 'end_time')
+class SlotAdmin(ScalableAdmin):
+    list_display = ('id', 'ride_time', 'start_loc', 'dest_loc', 'status', 'auto_plate', 'creator',
+                    'current_capacity', 'max_capacity', 'fare', 'created_at')
+    list_select_related = ('auto', 'creator')
+    list_filter = ('status', 'start_loc', 'dest_loc')
+    date_hierarchy = 'ride_time'
+    search_fields = ('id', 'auto__license_plate', 'creator__username', 'creator__email')
+    raw_id_fields = ('auto', 'creator')
 
-class SlotParticipantAdmin(admin.ModelAdmin):
+    @admin.display(description='auto', ordering='auto__license_plate')
+    def auto_plate(self, obj):
+        return obj.auto.license_plate
+
+class SlotParticipantAdmin(ScalableAdmin):
     list_display = ('id', 'slot', 'user', 'status', 'convenience_fee', 'paid', 'joined_at')
-    search_fields = ('id', 'slot', 'user', 'status')
+    list_select_related = ('slot', 'user')
+    list_filter = ('status', 'paid')
+    search_fields = ('id', 'slot', 'user__username', 'user__email')
+    raw_id_fields = ('slot', 'user')
 
-class AutoAdmin(admin.ModelAdmin):
+class AutoAdmin(ScalableAdmin):
     list_display = ('id', 'driver', 'license_plate', 'status')
-    search_fields = ('id', 'driver', 'license_plate', 'status')
+    list_select_related = ('driver',)
+    list_filter = ('status',)
+    search_fields = ('id', 'license_plate', 'driver__username')
+    raw_id_fields = ('driver',)
+
+class AutoQueueAdmin(ScalableAdmin):
+    list_display = ('id', 'auto_plate', 'created_at')
+    list_select_related = ('auto',)
+    search_fields = ('auto__license_plate',)
+    raw_id_fields = ('auto',)
+
+    @admin.display(description='auto', ordering='auto__license_plate')
+    def auto_plate(self, obj):
+        return obj.auto.license_plate if obj.auto_id else None
+
+class DispatchOfferAdmin(ScalableAdmin):
+    list_display = ('id', 'slot', 'auto_plate', 'status', 'created_at', 'expires_at', 'responded_at')
+    list_select_related = ('slot', 'auto')
+    list_filter = ('status',)
+    search_fields = ('id', 'slot', 'auto__license_plate')
+    raw_id_fields = ('slot', 'auto')
+
+    @admin.display(description='auto', ordering='auto__license_plate')
+    def auto_plate(self, obj):
+        return obj.auto.license_plate
 
 
 admin.site.register(User, UserAdmin)
 admin.site.register(Slot, SlotAdmin)
 admin.site.register(SlotParticipant, SlotParticipantAdmin)
 admin.site.register(Auto, AutoAdmin)
-admin.site.register(AutoQueue)
+admin.site.register(AutoQueue, AutoQueueAdmin)
+admin.site.register(DispatchOffer, DispatchOfferAdmin)
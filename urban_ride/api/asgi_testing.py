@@ -0,0 +1,85 @@
+"""
+Drives ASGI WebSocket applications in-process for tests and benchmarks.
+"""
+import asyncio
+import json
+
+
+class WebsocketCommunicator:
+    def __init__(self, application, path, query_string=''):
+        self.application = application
+        self.scope = {
+            'type': 'websocket',
+            'path': path,
+            'query_string': query_string.encode(),
+            'headers': [],
+        }
+        self.input = asyncio.Queue()
+        self.output = asyncio.Queue()
+        self.task = None
+
+    async def connect(self, timeout=1):
+        self.task = asyncio.ensure_future(self.application(self.scope, self.input.get, self.output.put))
+        await self.input.put({'type': 'websocket.connect'})
+        event = await self.receive_event(timeout)
+        return event['type'] == 'websocket.accept', event
+
+    async def receive_event(self, timeout=1):
+        return await asyncio.wait_for(self.output.get(), timeout)
+
+    async def receive_json(self, timeout=1):
+        event = await self.receive_event(timeout)
+        return json.loads(event['text'])
+
+    async def receive_nothing(self, timeout=0.1):
+        try:
+            await self.receive_event(timeout)
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    async def send_json(self, payload):
+        await self.input.put({'type': 'websocket.receive', 'text': json.dumps(payload)})
+
+    async def disconnect(self, timeout=1):
+        await self.input.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, timeout)
+
+
+async def http_request(application, path, query_string='', method='GET', headers=(), body=b''):
+    """
+    Sends one HTTP request through an ASGI application and returns
+    (status, headers, body).
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), *headers],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'status': None, 'headers': [], 'body': []}
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        # The client never disconnects early; block until the app is done
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = message.get('headers', [])
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await application(scope, receive, send)
+    return response['status'], response['headers'], b''.join(response['body'])
@@ -0,0 +1,148 @@
+"""
+Async-native versions of the hot read endpoints for ASGI deployments.
+
+DRF views are synchronous, so under uvicorn every request to them is pushed
+through a sync adapter thread from start to finish. These views run on the
+event loop and only hand the ORM and cache calls off (through Django's a*
+APIs), while producing the same bodies, status codes and ETags as the sync
+views in views.py. urls.py routes to them when ASYNC_READ_ENDPOINTS is on.
+
+token_obtain_pair stands in for simplejwt's TokenObtainPairView when
+ASYNC_TOKEN_ENDPOINT is on, awaiting the password check on the hashing pool.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.utils.module_loading import import_string
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import slot_cache
+from .fast_serializers import compile_serializer
+from .hashing import PooledModelBackend
+from .models import Auto, Slot
+from .pagination import IdCursorPagination, SlotCursorPagination
+from .renderers import FastJSONRenderer
+from .serializers import AutoSerializer, SlotSerializer
+from .views import slot_detail_queryset
+
+ALLOWED_METHODS = 'GET, HEAD, OPTIONS'
+TOKEN_ALLOWED_METHODS = 'POST, OPTIONS'
+
+
+def finalize(response, allowed_methods=ALLOWED_METHODS):
+    # What APIView.finalize_response does for a JSON client
+    response.accepted_renderer = FastJSONRenderer() if settings.FAST_READ_SERIALIZERS else JSONRenderer()
+    response.accepted_media_type = response.accepted_renderer.media_type
+    response.renderer_context = {}
+    response['Allow'] = allowed_methods
+    patch_vary_headers(response, ('Accept',))
+    return response.render()
+
+
+def error_response(exc):
+    return Response({'detail': exc.detail}, status=exc.status_code)
+
+
+def serialize(serializer_class, instance, request, many=False):
+    if settings.FAST_READ_SERIALIZERS:
+        plan = compile_serializer(serializer_class(context={'request': request}))
+        return plan.many(instance) if many else plan.one(instance)
+    return serializer_class(instance, many=many, context={'request': request}).data
+
+
+async def paginated(request, queryset, paginator, serializer_class):
+    # The cursor filter and slice are built on the loop; async for fetches the
+    # page (query and prefetches) through the async ORM
+    page = await paginator.apaginate_queryset(queryset, request)
+    data = serialize(serializer_class, page, request, many=True)
+    return paginator.get_paginated_response(data)
+
+
+async def slot_list(request):
+    request = Request(request)
+    if request.method not in ('GET', 'HEAD'):
+        return finalize(error_response(exceptions.MethodNotAllowed(request.method)))
+
+    async def render():
+        queryset = slot_detail_queryset(SlotSerializer(context={'request': request}))
+        return await paginated(request, queryset, SlotCursorPagination(), SlotSerializer)
+
+    try:
+        key = await sync_to_async(slot_cache.list_key)(request)
+        return finalize(await slot_cache.acached_response(request, key, render))
+    except exceptions.APIException as exc:
+        return finalize(error_response(exc))
+
+
+async def slot_detail(request, pk):
+    request = Request(request)
+    if request.method not in ('GET', 'HEAD'):
+        return finalize(error_response(exceptions.MethodNotAllowed(request.method)))
+
+    async def render():
+        context = {'request': request}
+        queryset = slot_detail_queryset(SlotSerializer(context=context))
+        try:
+            slot = await queryset.aget(pk=pk)
+        except Slot.DoesNotExist:
+            return error_response(exceptions.NotFound())
+        return Response(serialize(SlotSerializer, slot, request), status=status.HTTP_200_OK)
+
+    key = await sync_to_async(slot_cache.detail_key)(pk, request)
+    return finalize(await slot_cache.acached_response(request, key, render))
+
+
+async def auto_list(request):
+    request = Request(request)
+    if request.method not in ('GET', 'HEAD'):
+        return finalize(error_response(exceptions.MethodNotAllowed(request.method)))
+
+    try:
+        response = await paginated(
+            request, Auto.objects.select_related('driver'), IdCursorPagination(), AutoSerializer
+        )
+    except exceptions.APIException as exc:
+        response = error_response(exc)
+    return finalize(response)
+
+
+async def token_obtain_pair(request):
+    request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+    if request.method != 'POST':
+        return finalize(error_response(exceptions.MethodNotAllowed(request.method)), TOKEN_ALLOWED_METHODS)
+
+    serializer = import_string(jwt_settings.TOKEN_OBTAIN_SERIALIZER)(data=request.data)
+    try:
+        # What TokenObtainPairSerializer.validate does, with authenticate() awaited
+        attrs = serializer.to_internal_value(request.data)
+        user = await PooledModelBackend().aauthenticate(
+            request, username=attrs[serializer.username_field], password=attrs['password']
+        )
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise exceptions.AuthenticationFailed(
+                serializer.error_messages['no_active_account'], 'no_active_account'
+            )
+    except exceptions.APIException as exc:
+        if isinstance(exc, exceptions.AuthenticationFailed):
+            exc.auth_header = f'{jwt_settings.AUTH_HEADER_TYPES[0]} realm="api"'
+        return finalize(exception_handler(exc, {}), TOKEN_ALLOWED_METHODS)
+
+    refresh = serializer.get_token(user)
+    if jwt_settings.UPDATE_LAST_LOGIN:
+        await sync_to_async(update_last_login)(None, user)
+    data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+    return finalize(Response(data, status=status.HTTP_200_OK), TOKEN_ALLOWED_METHODS)
+
+
+# Like DRF views, these are exempt from CsrfViewMiddleware. Django 4.2's
+# csrf_exempt decorator does not support coroutine functions, so the flag the
+# middleware looks for is set directly.
+for view in (slot_list, slot_detail, auto_list, token_obtain_pair):
+    view.csrf_exempt = True
@@ -0,0 +1,210 @@
+"""
+JWT authentication without loading the User row on every request.
+
+Tokens from TokenObtainPairView and TokenRefreshView carry the user's
+username, user_type and is_staff, and their token_version as 'ver'.
+ClaimsJWTAuthentication builds request.user from those claims. The user
+is a ClaimsUser: simplejwt's TokenUser plus user_type. It then only checks
+that the token is still current against the user's (token_version,
+is_active). Those two values are kept in a per-process LRU cache for
+AUTH_CLAIMS_CACHE_TTL seconds, and a miss costs one indexed query.
+
+Bumping token_version revokes a user's tokens. revoke_tokens() does it,
+and so does saving a change to any claim, the password or is_active.
+The process making the change drops its cache entry at once. Other
+processes see the new version when their entry expires, or sooner if a
+token with a newer version turns up. So a revoked, deactivated or demoted
+user is locked out everywhere within AUTH_CLAIMS_CACHE_TTL seconds.
+
+Tokens issued before the claims were added have no 'ver'. They still
+authenticate through the database, as with JWTAuthentication.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+VERSION_CLAIM = 'ver'
+CLAIM_FIELDS = ('username', 'user_type', 'is_staff')
+# Saving a change to any of these revokes the user's tokens
+REVOKING_FIELDS = CLAIM_FIELDS + ('password', 'is_active')
+
+
+def user_claims(user):
+    return {**{name: getattr(user, name) for name in CLAIM_FIELDS}, VERSION_CLAIM: user.token_version}
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        # Access tokens copy the refresh token's claims
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if VERSION_CLAIM in refresh:
+            # Refreshing always checks the database, so a revoked refresh
+            # token cannot mint access tokens with stale claims
+            state = get_token_state(refresh[api_settings.USER_ID_CLAIM], refresh[VERSION_CLAIM], refresh=True)
+            check_token_state(state, refresh[VERSION_CLAIM])
+        return super().validate(attrs)
+
+
+class ClaimsUser(TokenUser):
+    @property
+    def user_type(self):
+        return self.token.get('user_type', '')
+
+
+class TokenStateCache:
+    """user id -> (token_version, is_active, expires at), least recently used evicted first."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[:2]
+
+    def set(self, user_id, state):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[user_id] = (*state, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenStateCache(settings.AUTH_CLAIMS_CACHE_SIZE, settings.AUTH_CLAIMS_CACHE_TTL)
+    return _cache
+
+
+def reset_token_cache():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def get_token_state(user_id, version, refresh=False):
+    """(token_version, is_active) for user_id, or None if there is no such user."""
+    cache = get_token_cache()
+    state = None if refresh else cache.get(user_id)
+    # A token newer than the cached version means the cache is behind
+    if state is None or state[0] < version:
+        state = User.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+        if state is None:
+            cache.discard(user_id)
+            return None
+        cache.set(user_id, state)
+    return state
+
+
+def check_token_state(state, version):
+    if state is None:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    current_version, is_active = state
+    if not is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if version != current_version:
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+
+def revoke_tokens(user_id):
+    """Invalidates every token issued to user_id so far."""
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    cache = get_token_cache()
+    cache.discard(user_id)
+    # A request in between could cache the old version until the commit
+    transaction.on_commit(lambda: cache.discard(user_id), robust=True)
+
+
+def remember_revoking_change(user, update_fields=None):
+    """
+    pre_save: notes whether this save changes anything the tokens depend on,
+    and keeps it from writing back a token_version older than the stored one.
+    """
+    user._revokes_tokens = False
+    if user.pk is None or user._state.adding:
+        return
+    fields = [name for name in REVOKING_FIELDS + ('token_version',) if update_fields is None or name in update_fields]
+    if not fields:
+        return
+    stored = User.objects.filter(pk=user.pk).values_list(*fields).first()
+    if stored is None:
+        return
+    stored = dict(zip(fields, stored))
+    if 'token_version' in stored:
+        user.token_version = max(user.token_version, stored.pop('token_version'))
+    user._revokes_tokens = any(getattr(user, name) != value for name, value in stored.items())
+
+
+def revoke_if_changed(user):
+    """post_save: revokes the user's tokens if remember_revoking_change found a change."""
+    if getattr(user, '_revokes_tokens', False):
+        user._revokes_tokens = False
+        revoke_tokens(user.pk)
+        user.token_version = User.objects.filter(pk=user.pk).values_list('token_version', flat=True).get()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        version = validated_token.get(VERSION_CLAIM)
+        if version is None:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        check_token_state(get_token_state(user_id, version), version)
+        return ClaimsUser(validated_token)
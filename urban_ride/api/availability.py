@@ -0,0 +1,154 @@
+"""
+Keeps the RouteAvailability summary in step with Slot.
+
+Every Slot instance remembers the state it was loaded or last saved with.
+On post_save and post_delete the change in what it contributes (one open
+slot and its free seats, while it is OPEN) is applied to the summary as an
+F() delta, inside the same transaction as the slot write. Writes that go
+through update() or bulk_create() skip those signals and adjust the summary
+themselves: reserve_seat takes the joined seats off its row, and the
+lifecycle worker refreshes the routes of the slots it finalized.
+
+reconcile() rebuilds rows from Slot with one aggregate query. The periodic
+reconcile_availability job runs it to correct anything the deltas missed,
+such as raw SQL or a save from an instance loaded with deferred fields.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import RouteAvailability, Slot, hour_bucket
+
+STATE_FIELDS = ('status', 'start_loc', 'dest_loc', 'ride_time', 'max_capacity', 'current_capacity')
+
+
+def slot_state(instance):
+    """The fields the summary depends on, or None if any were deferred."""
+    values = instance.__dict__
+    if any(name not in values for name in STATE_FIELDS):
+        return None
+    return tuple(values[name] for name in STATE_FIELDS)
+
+
+def contribution(state):
+    """((start_loc, dest_loc, hour), free seats) for an OPEN slot, else None."""
+    if state is None or state[0] != 'OPEN':
+        return None
+    _, start_loc, dest_loc, ride_time, max_capacity, current_capacity = state
+    if isinstance(ride_time, str):
+        ride_time = parse_datetime(ride_time)
+    if ride_time is None:
+        return None
+    if timezone.is_naive(ride_time):
+        ride_time = timezone.make_aware(ride_time)
+    return (start_loc, dest_loc, hour_bucket(ride_time)), max(int(max_capacity) - int(current_capacity), 0)
+
+
+def apply_change(before, after):
+    """Moves a slot's contribution from before to after in the summary."""
+    if before == after:
+        return
+    if before and after and before[0] == after[0]:
+        RouteAvailability.objects.add(*before[0], free_seats=after[1] - before[1])
+        return
+    if before:
+        RouteAvailability.objects.add(*before[0], open_slots=-1, free_seats=-before[1])
+    if after:
+        RouteAvailability.objects.add(*after[0], open_slots=1, free_seats=after[1])
+
+
+def remember(instance):
+    instance._availability_state = slot_state(instance)
+
+
+def slot_saved(instance, created):
+    state = slot_state(instance)
+    if created:
+        before = None
+    elif state is None or getattr(instance, '_availability_state', None) is None:
+        # Loaded with deferred fields, so the change is unknown; rebuild the
+        # row the slot is in now and leave the rest to reconciliation
+        instance._availability_state = state
+        refresh_slots([instance.pk])
+        return
+    else:
+        before = contribution(instance._availability_state)
+    apply_change(before, contribution(state))
+    instance._availability_state = state
+
+
+def slot_deleted(instance):
+    apply_change(contribution(getattr(instance, '_availability_state', None)), None)
+
+
+def actual_counts(slots):
+    """{(start_loc, dest_loc, hour): (open_slots, free_seats)} aggregated from slots."""
+    rows = slots.filter(status='OPEN').annotate(
+        hour=TruncHour('ride_time', tzinfo=timezone.get_default_timezone())
+    ).order_by().values('start_loc', 'dest_loc', 'hour').annotate(
+        open_slots=Count('id'),
+        free_seats=Sum(F('max_capacity') - F('current_capacity')),
+    ).values_list('start_loc', 'dest_loc', 'hour', 'open_slots', 'free_seats')
+    return {(start_loc, dest_loc, hour): (count, free) for start_loc, dest_loc, hour, count, free in rows}
+
+
+def reconcile(since=None, keys=None):
+    """
+    Rewrites summary rows to match Slot, for the (start_loc, dest_loc, hour)
+    keys given or for every hour from since on, and deletes rows before
+    since. Returns counts of rows created, updated and deleted.
+    """
+    slots = Slot.objects.all()
+    rows = RouteAvailability.objects.all()
+    if keys is not None:
+        keys = set(keys)
+        if not keys:
+            return {'created': 0, 'updated': 0, 'deleted': 0}
+        hours = {hour for _, _, hour in keys}
+        slots = slots.filter(ride_time__gte=min(hours), ride_time__lt=max(hours) + timedelta(hours=1))
+        rows = rows.filter(hour__in=hours)
+    elif since is not None:
+        since = hour_bucket(since)
+        slots = slots.filter(ride_time__gte=since)
+        rows = rows.filter(hour__gte=since)
+
+    with transaction.atomic():
+        actual = actual_counts(slots)
+        stored = {(row.start_loc, row.dest_loc, row.hour): row for row in rows}
+        if keys is not None:
+            actual = {key: counts for key, counts in actual.items() if key in keys}
+            stored = {key: row for key, row in stored.items() if key in keys}
+
+        created, updated = [], []
+        for key, (count, free) in actual.items():
+            row = stored.pop(key, None)
+            if row is None:
+                created.append(RouteAvailability(
+                    start_loc=key[0], dest_loc=key[1], hour=key[2], open_slots=count, free_seats=free,
+                ))
+            elif (row.open_slots, row.free_seats) != (count, free):
+                row.open_slots, row.free_seats = count, free
+                updated.append(row)
+        RouteAvailability.objects.bulk_create(created)
+        RouteAvailability.objects.bulk_update(updated, ['open_slots', 'free_seats'])
+        # Whatever is left has no open slot behind it any more
+        deleted, _ = RouteAvailability.objects.filter(pk__in=[row.pk for row in stored.values()]).delete()
+        if keys is None and since is not None:
+            pruned, _ = RouteAvailability.objects.filter(hour__lt=since).delete()
+            deleted += pruned
+    return {'created': len(created), 'updated': len(updated), 'deleted': deleted}
+
+
+def refresh_slots(slot_ids):
+    """Reconciles the summary rows that slot_ids fall in."""
+    keys = {
+        (start_loc, dest_loc, hour_bucket(ride_time))
+        for start_loc, dest_loc, ride_time in Slot.objects.filter(pk__in=slot_ids).values_list(
+            'start_loc', 'dest_loc', 'ride_time'
+        )
+    }
+    return reconcile(keys=keys)
@@ -0,0 +1,103 @@
+"""
+Helpers shared by the bench_* management commands.
+
+Benchmarks seed large tables, so they run against a throwaway test database
+instead of the configured one.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Auto, Slot, User
+
+
+@contextmanager
+def scratch_database(verbosity=0, name=None):
+    # SQLite test databases live in memory unless given a file name; use one
+    # when other threads or processes need their own connections to it
+    if name:
+        connection.settings_dict['TEST']['NAME'] = name
+    old_name = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def percentile(ordered, pct):
+    index = round(pct / 100 * (len(ordered) - 1))
+    return ordered[min(len(ordered) - 1, index)]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+    }
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def format_stats(label, stats):
+    return (
+        f"{label:<28} n={stats['count']:<6} mean={stats['mean_ms']:8.3f}ms "
+        f"p50={stats['p50_ms']:8.3f}ms p95={stats['p95_ms']:8.3f}ms "
+        f"p99={stats['p99_ms']:8.3f}ms"
+    )
+
+
+def seed_fleet(prefix='bench'):
+    driver = User.objects.create(
+        username=f'{prefix}_driver', email=f'{prefix}_driver@bench.local',
+        phone='0000000000', user_type='DRIVER',
+    )
+    creator = User.objects.create(
+        username=f'{prefix}_rider', email=f'{prefix}_rider@bench.local',
+        phone='0000000001', user_type='CUSTOMER',
+    )
+    auto = Auto.objects.create(driver=driver, license_plate=f'{prefix.upper()}-0001', status='BOOKED')
+    return auto, creator
+
+
+def random_slots(count, auto, creator, rng, days=60):
+    locations = [code for code, _ in Slot.LOCATIONS]
+    statuses = [code for code, _ in Slot.STATUS_CHOICES]
+    now = timezone.now()
+    for _ in range(count):
+        start_loc, dest_loc = rng.sample(locations, 2)
+        max_capacity = rng.randint(2, 6)
+        yield Slot(
+            auto=auto,
+            creator=creator,
+            max_capacity=max_capacity,
+            current_capacity=rng.randint(1, max_capacity),
+            fare=100,
+            status=rng.choice(statuses),
+            ride_time=now + timedelta(minutes=rng.randint(0, days * 24 * 60)),
+            start_loc=start_loc,
+            dest_loc=dest_loc,
+        )
+
+
+def bulk_seed_slots(count, auto, creator, rng, batch_size=10000):
+    remaining = count
+    while remaining > 0:
+        batch = min(batch_size, remaining)
+        Slot.objects.bulk_create(random_slots(batch, auto, creator, rng), batch_size=batch)
+        remaining -= batch
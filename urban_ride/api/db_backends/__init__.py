@@ -0,0 +1,8 @@
+"""
+Database backends behind the DATABASE_PROFILE setting.
+
+sqlite3 and postgresql are Django's own backends with the connection
+handling Django 5.1 adds (OPTIONS 'init_command' and 'transaction_mode' for
+SQLite, 'pool' for PostgreSQL) backported, so the settings carry over
+unchanged when the project moves to a Django that has them.
+"""
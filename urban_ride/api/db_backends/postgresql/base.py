@@ -0,0 +1,173 @@
+"""
+PostgreSQL with an optional in-process connection pool.
+
+Set OPTIONS['pool'] to a dict (or True for the defaults) to share open
+connections between the threads of a process instead of opening one per
+request:
+
+- 'max_size': connections open at once; a thread wanting one more waits up
+  to 'timeout' seconds for one to be returned, then gets OperationalError.
+- 'max_idle': seconds an unused connection is kept before it is closed.
+- 'check': ping a connection that has been idle this many seconds before
+  handing it out, so one the server dropped is replaced instead of failing
+  the request.
+
+Django returns the connection whenever it would otherwise close it, so use
+the pool with CONN_MAX_AGE = 0: connections go back at the end of each
+request, and the pool, not each thread, keeps them alive. Without 'pool'
+this is Django's backend, and CONN_MAX_AGE with CONN_HEALTH_CHECKS gives
+each thread its own persistent connection instead.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+if base.is_psycopg3:
+    TRANSACTION_IDLE = base.Database.pq.TransactionStatus.IDLE
+else:
+    TRANSACTION_IDLE = base.Database.extensions.TRANSACTION_STATUS_IDLE
+
+POOL_DEFAULTS = {'max_size': 10, 'timeout': 30, 'max_idle': 300, 'check': 30}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, max_size, timeout, max_idle, check):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check = check
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        # (connection, returned at); the most recently used is reused first,
+        # so the ones at the far end go idle and get closed
+        self.idle = deque()
+        self.pid = os.getpid()
+
+    def acquire(self, connect):
+        if os.getpid() != self.pid:
+            # Forked after connections were opened: they belong to the parent
+            self.idle.clear()
+            self.pid = os.getpid()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(f'No pooled database connection became free within {self.timeout}s')
+        try:
+            while True:
+                with self.lock:
+                    connection, returned = self.idle.pop() if self.idle else (None, None)
+                if connection is None:
+                    return connect()
+                if self.usable(connection, time.monotonic() - returned):
+                    return connection
+                discard(connection)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def usable(self, connection, idle_for):
+        if connection.closed or idle_for > self.max_idle:
+            return False
+        if idle_for < self.check:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def release(self, connection):
+        try:
+            if connection.closed:
+                return
+            # Never hand on an open transaction
+            if connection.info.transaction_status != TRANSACTION_IDLE:
+                try:
+                    connection.rollback()
+                except base.Database.Error:
+                    discard(connection)
+                    return
+            now = time.monotonic()
+            with self.lock:
+                while self.idle and now - self.idle[0][1] > self.max_idle:
+                    discard(self.idle.popleft()[0])
+                self.idle.append((connection, now))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            while self.idle:
+                discard(self.idle.pop()[0])
+
+
+def discard(connection):
+    try:
+        connection.close()
+    except base.Database.Error:
+        pass
+
+
+def get_pool(key, options):
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(**options)
+    return pool
+
+
+def close_pools():
+    """Closes every idle pooled connection, e.g. before dropping a database."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections to the test database would block DROP DATABASE
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        pool_options = conn_params.pop('pool', None)
+        if not pool_options:
+            self.pool = None
+            return conn_params
+        pool_options = {**POOL_DEFAULTS, **(pool_options if isinstance(pool_options, dict) else {})}
+        # One pool per server, database and user, so the test runner's
+        # connections to the 'postgres' database are pooled separately
+        key = (self.alias, *sorted((name, repr(value)) for name, value in conn_params.items()))
+        self.pool = get_pool(key, pool_options)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        connection = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # A reused connection keeps the isolation level it was opened with;
+        # only the wrapper's record of it needs setting
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.release(self.connection)
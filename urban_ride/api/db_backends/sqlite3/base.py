@@ -0,0 +1,50 @@
+"""
+SQLite tuned for several threads and processes writing to one file.
+
+OPTIONS takes, besides the sqlite3.connect() arguments:
+
+- 'init_command': statements run on every new connection, for PRAGMAs such
+  as journal_mode=WAL, so readers no longer block the writer or wait on it.
+- 'transaction_mode': how atomic() begins its transaction. With IMMEDIATE
+  the write lock is taken at BEGIN, so a transaction that reads and then
+  writes waits out the busy timeout for its turn. With the default
+  (DEFERRED) it upgrades from a read lock mid-transaction, and SQLite
+  fails one of two such writers at once with "database is locked" rather
+  than make it wait.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'EXCLUSIVE', 'IMMEDIATE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    init_commands = ()
+    transaction_mode = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.init_commands = [
+            statement.strip() for statement in kwargs.pop('init_command', '').split(';') if statement.strip()
+        ]
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES[{self.alias!r}]['OPTIONS']['transaction_mode'] "
+                f"is improperly configured to '{transaction_mode}'. Use one of "
+                f"{', '.join(repr(mode) for mode in TRANSACTION_MODES)}, or None."
+            )
+        self.transaction_mode = transaction_mode.upper() if transaction_mode else None
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.init_commands:
+            conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute('BEGIN')
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,342 @@
+"""
+Driver offers: a new slot is offered to the driver of the auto it was booked
+on, who has DISPATCH_OFFER_TIMEOUT seconds to accept or decline it.
+
+- Accepting opens the slot. Only the offered driver can, and only before
+  the offer expires.
+- Declining, or letting the offer expire, sends that auto back to the tail
+  of AutoQueue and offers the slot to the auto at the head of the queue.
+  An auto is never offered the same slot twice; a slot with nobody left to
+  offer it to is CANCELLED.
+
+Deadlines are kept in a hashed timing wheel (TimerWheel) in each web
+process: an array of buckets, one per DISPATCH_WHEEL_RESOLUTION seconds,
+that a background thread steps through. Adding or cancelling a timer is
+O(1) and a tick only looks at the bucket it lands on, however many offers
+are outstanding. As with the lifecycle heap, the wheel is only a schedule:
+every offer is claimed with a conditional UPDATE, so a driver answering at
+the deadline, or two processes expiring the same offer, resolve it exactly
+once. Each process also reloads the offers coming due from the database
+every DISPATCH_REFRESH_INTERVAL seconds, which picks up offers scheduled by
+a process that has since exited.
+
+The thread is started by start_offer_dispatcher on a process's first
+request, not when the WSGI or ASGI application is imported: under
+gunicorn --preload that import runs in the master, which would then tick
+over a database connection its forked workers share while they run none.
+"""
+import logging
+import math
+import os
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Case, When
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .matching import get_matching_engine
+from .models import Auto, AutoQueue, DispatchOffer, Slot
+from .realtime import publish_slot_updates
+from .slot_cache import invalidate_slot_dependencies
+
+logger = logging.getLogger(__name__)
+
+
+def offer_timeout():
+    return timedelta(seconds=settings.DISPATCH_OFFER_TIMEOUT)
+
+
+class TimerWheel:
+    """
+    size buckets of resolution seconds each, covering one turn of the wheel.
+    A timer goes in the bucket of the tick its deadline rounds up to and is
+    fired when the wheel reaches that tick, so never early and at most one
+    resolution late. Deadlines more than a turn away wait in their bucket
+    for the turns in between.
+    """
+
+    def __init__(self, resolution=1.0, size=512, start=0.0):
+        self.resolution = resolution
+        self.size = size
+        self._buckets = [{} for _ in range(size)]
+        # key -> tick of its deadline
+        self._ticks = {}
+        # The next tick to fire
+        self._tick = math.floor(start / resolution)
+
+    def __len__(self):
+        return len(self._ticks)
+
+    def __contains__(self, key):
+        return key in self._ticks
+
+    def schedule(self, key, deadline):
+        """Fires key at deadline (seconds), replacing any timer key already has."""
+        self.cancel(key)
+        # An overdue deadline fires on the next tick
+        tick = max(math.ceil(deadline / self.resolution), self._tick)
+        self._ticks[key] = tick
+        self._buckets[tick % self.size][key] = tick
+
+    def cancel(self, key):
+        tick = self._ticks.pop(key, None)
+        if tick is not None:
+            del self._buckets[tick % self.size][key]
+
+    def advance(self, now):
+        """Moves the wheel on to now (seconds) and returns the keys due by then."""
+        target = math.floor(now / self.resolution)
+        if target < self._tick:
+            return []
+        due = []
+        # After a long pause every bucket is visited once, not once per turn
+        for tick in range(self._tick, min(target + 1, self._tick + self.size)):
+            bucket = self._buckets[tick % self.size]
+            fired = [key for key, when in bucket.items() if when <= target]
+            for key in fired:
+                del bucket[key]
+                del self._ticks[key]
+            due.extend(fired)
+        self._tick = target + 1
+        return due
+
+
+def schedule_offers(offers):
+    """Adds offers to this process's timers once the transaction commits."""
+    offers = [(offer.pk, offer.expires_at) for offer in offers]
+    transaction.on_commit(lambda: get_offer_dispatcher().schedule_many(offers), robust=True)
+
+
+def offer_slots(bookings, now=None):
+    """
+    Offers each slot in bookings, (slot id, auto id) pairs, to the driver of
+    that auto and returns the offers. Call inside transaction.atomic(), with
+    the slots saved.
+    """
+    expires_at = (now or timezone.now()) + offer_timeout()
+    offers = DispatchOffer.objects.bulk_create([
+        DispatchOffer(slot_id=slot_id, auto_id=auto_id, expires_at=expires_at)
+        for slot_id, auto_id in bookings
+    ])
+    schedule_offers(offers)
+    return offers
+
+
+def claim_offers(offers, status, now):
+    """
+    Moves the OFFERED offers among the queryset offers to status and returns
+    (offer id, slot id, auto id) for each. Call inside transaction.atomic().
+    """
+    offers = offers.filter(status='OFFERED')
+    while True:
+        claimed = list(offers.values_list('id', 'slot_id', 'auto_id'))
+        if not claimed:
+            return []
+        # As in AutoQueue.pop_many(), the UPDATE's row count is the claim. If
+        # a driver or another process answered some of these first, roll back
+        # to the savepoint and read them again.
+        with transaction.atomic():
+            updated = DispatchOffer.objects.filter(
+                pk__in=[offer_id for offer_id, _, _ in claimed], status='OFFERED'
+            ).update(status=status, responded_at=now)
+            if updated == len(claimed):
+                return claimed
+            transaction.set_rollback(True)
+
+
+def redispatch(lapsed, now):
+    """
+    Offers the slots of lapsed (claimed declined or expired offers) to the
+    next queued autos, cancels those with nobody left to offer them to, and
+    returns the lapsed autos to the queue. Returns (new offers, cancelled
+    slot ids). Call inside transaction.atomic().
+    """
+    slot_ids = sorted({slot_id for _, slot_id, _ in lapsed})
+    tried = defaultdict(set)
+    for slot_id, auto_id in DispatchOffer.objects.filter(slot_id__in=slot_ids).values_list('slot_id', 'auto_id'):
+        tried[slot_id].add(auto_id)
+    autos = AutoQueue.objects.pop_each([tried[slot_id] for slot_id in slot_ids])
+    assigned = {slot_id: auto.pk for slot_id, auto in zip(slot_ids, autos) if auto is not None}
+
+    # Slots are only moved or cancelled while still pending, e.g. not once the
+    # lifecycle worker has cancelled them
+    pending = Slot.objects.filter(status='PENDING_DRIVER')
+    if assigned:
+        pending.filter(pk__in=assigned).update(
+            auto_id=Case(*(When(pk=slot_id, then=auto_id) for slot_id, auto_id in assigned.items()))
+        )
+    unassigned = [slot_id for slot_id in slot_ids if slot_id not in assigned]
+    pending.filter(pk__in=unassigned).update(status='CANCELLED')
+
+    moved = set(Slot.objects.filter(pk__in=slot_ids).values_list('id', 'auto_id'))
+    reoffered = [(slot_id, auto_id) for slot_id, auto_id in assigned.items() if (slot_id, auto_id) in moved]
+    cancelled = list(Slot.objects.filter(pk__in=unassigned, status='CANCELLED').values_list('id', flat=True))
+    Auto.objects.filter(pk__in=[auto_id for _, auto_id in reoffered]).update(status='QUEUED')
+    # Popped for a slot that stopped pending meanwhile; back to the tail
+    AutoQueue.objects.bulk_create(
+        AutoQueue(auto_id=auto_id) for slot_id, auto_id in assigned.items() if (slot_id, auto_id) not in moved
+    )
+    AutoQueue.objects.requeue([auto_id for _, _, auto_id in lapsed])
+    offers = offer_slots(reoffered, now)
+
+    # update() skips the post_save receivers, so do their work here
+    invalidate_slot_dependencies()
+    publish_slot_updates([slot_id for slot_id, _ in reoffered], 'slot.reoffered')
+    publish_slot_updates(cancelled, 'slot.expired')
+    engine = get_matching_engine()
+    transaction.on_commit(lambda: [engine.slot_removed(slot_id) for slot_id in cancelled], robust=True)
+    return offers, cancelled
+
+
+def expire_offers(offer_ids, now=None):
+    """
+    Expires whichever of offer_ids are still outstanding and past their
+    deadline at now, and offers their slots on. Returns (expired, new
+    offers, cancelled slot ids).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lapsed = claim_offers(DispatchOffer.objects.filter(pk__in=offer_ids, expires_at__lte=now), 'EXPIRED', now)
+        if not lapsed:
+            return 0, [], []
+        offers, cancelled = redispatch(lapsed, now)
+    return len(lapsed), offers, cancelled
+
+
+def respond_to_offer(slot, accept, now=None):
+    """
+    Accepts or declines the outstanding offer of slot, which must be
+    PENDING_DRIVER, on behalf of its auto's driver. Returns False when the
+    offer has expired or was already answered. A slot booked without an
+    offer can always be accepted. Call inside transaction.atomic().
+    """
+    now = now or timezone.now()
+    outstanding = DispatchOffer.objects.filter(slot=slot, auto_id=slot.auto_id, expires_at__gt=now)
+    if accept:
+        return bool(claim_offers(outstanding, 'ACCEPTED', now)) or not slot.offers.exists()
+    lapsed = claim_offers(outstanding, 'DECLINED', now)
+    if lapsed:
+        redispatch(lapsed, now)
+    return bool(lapsed)
+
+
+class OfferDispatcher:
+    def __init__(self, resolution=None, size=None, batch_size=None, refresh_interval=None, clock=timezone.now):
+        self.clock = clock
+        self.wheel = TimerWheel(
+            resolution or settings.DISPATCH_WHEEL_RESOLUTION,
+            size or settings.DISPATCH_WHEEL_SIZE,
+            start=clock().timestamp(),
+        )
+        self.batch_size = batch_size or settings.DISPATCH_BATCH_SIZE
+        self.refresh_interval = timedelta(seconds=refresh_interval or settings.DISPATCH_REFRESH_INTERVAL)
+        self.totals = {'expired': 0, 'reoffered': 0, 'cancelled': 0}
+        self._next_refresh = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.wheel)
+
+    def schedule_many(self, offers):
+        """Sets timers for (offer id, expires_at) pairs."""
+        with self._lock:
+            for offer_id, expires_at in offers:
+                self.wheel.schedule(offer_id, expires_at.timestamp())
+
+    def refresh(self, now):
+        """Loads every outstanding offer expiring before the next refresh."""
+        horizon = now + self.refresh_interval
+        rows = list(DispatchOffer.objects.filter(status='OFFERED', expires_at__lt=horizon).values_list(
+            'id', 'expires_at'
+        ))
+        self.schedule_many(rows)
+        self._next_refresh = horizon
+
+    def tick(self):
+        """Expires every offer due now and offers their slots on."""
+        now = self.clock()
+        if self._next_refresh is None or now >= self._next_refresh:
+            self.refresh(now)
+
+        # The lock only guards the wheel; redispatching schedules new offers
+        # through it on commit
+        with self._lock:
+            due = self.wheel.advance(now.timestamp())
+        for start in range(0, len(due), self.batch_size):
+            expired, offers, cancelled = expire_offers(due[start:start + self.batch_size], now)
+            self.schedule_many((offer.pk, offer.expires_at) for offer in offers)
+            self.totals['expired'] += expired
+            self.totals['reoffered'] += len(offers)
+            self.totals['cancelled'] += len(cancelled)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='offer-dispatcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.tick()
+                except Exception:
+                    logger.exception('Error expiring driver offers')
+                self._stop.wait(self.wheel.resolution)
+        finally:
+            connection.close()
+
+    def shutdown(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_offer_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = OfferDispatcher()
+    return _dispatcher
+
+
+def reset_offer_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown(timeout=5)
+
+
+def start_offer_dispatcher(**kwargs):
+    """request_started receiver that starts this process's dispatcher."""
+    get_offer_dispatcher().start()
+
+
+def reset_after_fork():
+    # A forked child inherits the parent's dispatcher, but not its thread
+    global _dispatcher, _dispatcher_lock
+    _dispatcher, _dispatcher_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+@receiver(setting_changed)
+def reset_on_dispatch_settings_change(setting, **kwargs):
+    if setting.startswith('DISPATCH_'):
+        reset_offer_dispatcher()
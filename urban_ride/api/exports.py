@@ -0,0 +1,154 @@
+"""
+Streaming exports of slots, participants and ride history for finance and
+analytics.
+
+Rows come straight from values_list() through .iterator(chunk_size=...), so
+only one chunk is held in memory at a time however large the table gets;
+no model instances or serializers are involved. Each dataset is keyset
+ordered by id. An export covers ids in (since, cursor], and the next
+incremental pull passes since=<cursor>. cursor is the highest id among rows
+created at least EXPORT_SAFETY_LAG seconds before the export starts, not the
+table's max id: ids are handed out on insert, not on commit, so a row can
+commit after a higher id has already been exported. The lag holds the
+newest rows back until such transactions have finished.
+
+Incremental pulls have two limits:
+
+- A transaction that stays open longer than EXPORT_SAFETY_LAG after its
+  insert can still commit below the cursor, and that row is skipped.
+- A row is exported as it was at the time, once. Later changes, e.g. to
+  paid or status, are not picked up; re-export from since=0 (or an older
+  cursor) to reconcile them.
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Slot, SlotParticipant
+
+FORMATS = ('ndjson', 'csv')
+
+# dataset -> (model, creation time field, [(column, lookup), ...]); id must
+# stay first, it is the cursor
+DATASETS = {
+    'slots': (Slot, 'created_at', [
+        ('id', 'id'),
+        ('status', 'status'),
+        ('start_loc', 'start_loc'),
+        ('dest_loc', 'dest_loc'),
+        ('ride_time', 'ride_time'),
+        ('fare', 'fare'),
+        ('max_capacity', 'max_capacity'),
+        ('current_capacity', 'current_capacity'),
+        ('auto_id', 'auto_id'),
+        ('license_plate', 'auto__license_plate'),
+        ('creator_id', 'creator_id'),
+        ('created_at', 'created_at'),
+    ]),
+    'participants': (SlotParticipant, 'joined_at', [
+        ('id', 'id'),
+        ('slot_id', 'slot_id'),
+        ('user_id', 'user_id'),
+        ('status', 'status'),
+        ('convenience_fee', 'convenience_fee'),
+        ('paid', 'paid'),
+        ('joined_at', 'joined_at'),
+    ]),
+    # One row per rider per trip, denormalized so analytics needs no joins
+    'rides': (SlotParticipant, 'joined_at', [
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('slot_id', 'slot_id'),
+        ('slot_status', 'slot__status'),
+        ('start_loc', 'slot__start_loc'),
+        ('dest_loc', 'slot__dest_loc'),
+        ('ride_time', 'slot__ride_time'),
+        ('fare', 'slot__fare'),
+        ('riders', 'slot__current_capacity'),
+        ('convenience_fee', 'convenience_fee'),
+        ('paid', 'paid'),
+        ('status', 'status'),
+        ('joined_at', 'joined_at'),
+    ]),
+}
+
+
+class Echo:
+    """File-like object whose write() returns what it is given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def to_json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def export_cursor(dataset, since=0, now=None):
+    """
+    The highest id of the rows created EXPORT_SAFETY_LAG seconds or more
+    before now, and never less than since.
+    """
+    model, created, _ = DATASETS[dataset]
+    settled = (now or timezone.now()) - timedelta(seconds=settings.EXPORT_SAFETY_LAG)
+    cursor = model.objects.filter(**{f'{created}__lte': settled}).order_by('-id').values_list('id', flat=True).first()
+    return max(cursor or 0, since)
+
+
+def export_rows(dataset, since=0, cursor=None, chunk_size=None):
+    """Yields value tuples for ids in (since, cursor], in id order."""
+    model, _, columns = DATASETS[dataset]
+    queryset = model.objects.filter(id__gt=since)
+    if cursor is not None:
+        queryset = queryset.filter(id__lte=cursor)
+    return queryset.order_by('id').values_list(
+        *(lookup for _, lookup in columns)
+    ).iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+
+
+def export_lines(dataset, export_format, rows):
+    """Yields the export as encoded text lines in NDJSON or CSV."""
+    _, _, columns = DATASETS[dataset]
+    names = [name for name, _ in columns]
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([to_json_value(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(names, map(to_json_value, row)))) + '\n'
+
+
+def next_batch(iterator, size):
+    batch = []
+    for line in iterator:
+        batch.append(line)
+        if len(batch) == size:
+            break
+    return ''.join(batch)
+
+
+async def aiterate(lines, batch_size=100):
+    """
+    Async wrapper for export_lines(). Under ASGI Django 4.2 buffers a sync
+    iterator whole before sending it, so the ASGI path pulls batches of
+    lines on the thread-sensitive executor instead, the same thread the
+    view and its database connection run on.
+    """
+    iterator = iter(lines)
+    while True:
+        chunk = await sync_to_async(next_batch)(iterator, batch_size)
+        if not chunk:
+            return
+        yield chunk
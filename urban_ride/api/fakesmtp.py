@@ -0,0 +1,104 @@
+"""
+A small in-process SMTP server for tests and benchmarks.
+
+It speaks just enough ESMTP for smtplib (EHLO, AUTH PLAIN, MAIL, RCPT, DATA,
+RSET, NOOP, QUIT) and keeps every accepted message in memory. Recipients in
+rejected are refused, as a server does for an unknown mailbox. STARTTLS is not
+supported, so point EMAIL_USE_TLS at False when using it.
+"""
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.handshake_delay)
+        self.reply('220 fakesmtp ESMTP ready')
+
+        mail_from, rcpt_tos = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.wfile.write(b'250-fakesmtp\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n')
+            elif verb == 'HELO':
+                self.reply('250 fakesmtp')
+            elif verb == 'AUTH':
+                time.sleep(server.handshake_delay)
+                with server.lock:
+                    server.logins += 1
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                mail_from, rcpt_tos = command[10:].strip('<>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt_to = command[8:].strip('<>')
+                if rcpt_to in server.rejected:
+                    self.reply('550 5.1.1 Mailbox unavailable')
+                    continue
+                rcpt_tos.append(rcpt_to)
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b'.\r\n', b''):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                with server.lock:
+                    server.messages.append((mail_from, rcpt_tos, message_from_bytes(b''.join(lines))))
+                    server.received.notify_all()
+                self.reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, handshake_delay=0.0):
+        super().__init__((host, port), FakeSMTPHandler)
+        self.handshake_delay = handshake_delay
+        self.lock = threading.Lock()
+        self.received = threading.Condition(self.lock)
+        self.messages = []
+        self.rejected = set()
+        self.connections = 0
+        self.logins = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def wait_for(self, count, timeout=5):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.messages) >= count, timeout)
@@ -0,0 +1,247 @@
+"""
+Compiled, read-only rendering for the hot list and detail endpoints.
+
+DRF builds every nested serializer and walks every field per row; for a
+page of slots that means a SlotParticipantSerializer, a UserSerializer and
+an AutoSlotSerializer per participant. compile_serializer() instead turns
+a bound serializer (already trimmed by ?fields= and ?expand=) into a flat
+list of (name, accessor) pairs once. Plans are cached per class and field
+set, and rendering a row is then one accessor call per field.
+
+Accessors reproduce Field.to_representation for the field types these
+serializers use, and otherwise fall back to the field itself. So the
+payload is the same as serializer.data, and renders to the same bytes.
+The one deliberate difference is SlotParticipantSerializer.slot_details:
+DRF leaves its fare and ride_time as Decimal and datetime for the JSON
+encoder, while here they are encoded up front (float and ISO string, as
+the encoder would) so the payload is plain JSON types throughout.
+"""
+import datetime
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+from .profiling import timed
+from .serializers import (
+    AutoSlotSerializer, SlotParticipantSerializer, SlotSerializer, UserSerializer,
+)
+
+MAX_CACHED_PLANS = 256
+
+
+def encoded_datetime(value):
+    # What rest_framework.utils.encoders.JSONEncoder does with a datetime
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+    return value
+
+
+def generic_accessor(field):
+    # Serializer.to_representation for a single field
+    def access(instance, tz):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return SkipField
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        if check_for_none is None:
+            return None
+        return field.to_representation(attribute)
+    return access
+
+
+def model_attname(serializer, field):
+    """The model attribute a field reads directly, or None if it is not that simple."""
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete:
+        return None
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        # use_pk_only_optimization reads <name>_id without loading the object
+        return model_field.attname if model_field.is_relation and not field.pk_field else None
+    if model_field.is_relation or type(field).get_attribute is not drf_fields.Field.get_attribute:
+        return None
+    return model_field.attname
+
+
+def nested_accessor(field):
+    plan = compile_serializer(field)
+    get = attrgetter(field.source)
+
+    def access(instance, tz):
+        value = get(instance)
+        return None if value is None else plan.render(value, tz)
+    return access
+
+
+def typed_accessor(get, fallback, value_type):
+    # Integer, Boolean and CharField return values of their own type unchanged
+    def access(instance, tz):
+        value = get(instance)
+        if value is None or type(value) is value_type:
+            return value
+        return fallback(value)
+    return access
+
+
+def choice_accessor(get, field):
+    choices = field.choice_strings_to_values
+
+    def access(instance, tz):
+        value = get(instance)
+        if value in ('', None):
+            return value
+        return choices.get(value, value) if type(value) is str else field.to_representation(value)
+    return access
+
+
+def datetime_accessor(get, fallback):
+    def access(instance, tz):
+        value = get(instance)
+        if value is None:
+            return None
+        if tz is None or type(value) is not datetime.datetime or value.tzinfo is None:
+            return fallback(value)
+        return encoded_datetime(value.astimezone(tz))
+    return access
+
+
+def field_accessor(serializer, field):
+    override = METHOD_OVERRIDES.get((type(serializer), field.field_name))
+    if override is not None:
+        return override(serializer)
+    if isinstance(field, serializers.Serializer):
+        if field.source == '*' or '.' in field.source:
+            return generic_accessor(field)
+        return nested_accessor(field)
+
+    attname = model_attname(serializer, field)
+    if attname is None:
+        return generic_accessor(field)
+    get = attrgetter(attname)
+    fallback = field.to_representation
+
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return lambda instance, tz: get(instance)
+    if isinstance(field, drf_fields.ChoiceField):
+        return choice_accessor(get, field)
+    for field_class, value_type in (
+        (drf_fields.IntegerField, int),
+        (drf_fields.BooleanField, bool),
+        (drf_fields.CharField, str),
+    ):
+        if isinstance(field, field_class) and type(field).to_representation is field_class.to_representation:
+            return typed_accessor(get, fallback, value_type)
+    if (type(field) is drf_fields.DateTimeField and not hasattr(field, 'timezone')
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT) == drf_fields.ISO_8601):
+        return datetime_accessor(get, fallback)
+
+    def access(instance, tz):
+        value = get(instance)
+        return None if value is None else fallback(value)
+    return access
+
+
+class CompiledSerializer:
+    def __init__(self, serializer):
+        self.accessors = [
+            (field.field_name, field_accessor(serializer, field))
+            for field in serializer._readable_fields
+        ]
+
+    def render(self, instance, tz):
+        row = {}
+        for name, access in self.accessors:
+            value = access(instance, tz)
+            if value is not SkipField:
+                row[name] = value
+        return row
+
+    @timed
+    def one(self, instance):
+        return self.render(instance, current_timezone())
+
+    @timed
+    def many(self, instances):
+        tz = current_timezone()
+        return [self.render(instance, tz) for instance in instances]
+
+
+def current_timezone():
+    # Looked up once per response rather than per datetime field
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+_plans = {}
+
+
+def compile_serializer(serializer):
+    """
+    The rendering plan for a bound serializer instance. Plans depend only
+    on the serializer class and which fields survived ?fields= / ?expand=.
+    """
+    key = (type(serializer), tuple(serializer.fields))
+    plan = _plans.get(key)
+    if plan is None:
+        if len(_plans) >= MAX_CACHED_PLANS:
+            _plans.clear()
+        plan = _plans[key] = CompiledSerializer(serializer)
+    return plan
+
+
+def slot_participants(serializer):
+    # SlotSerializer.get_participants, without a serializer per participant
+    plan = compile_serializer(SlotParticipantSerializer())
+    return lambda slot, tz: [plan.render(participant, tz) for participant in slot.participants.all()]
+
+
+def participant_slot_details(serializer):
+    # SlotParticipantSerializer.get_slot_details
+    user_plan = compile_serializer(UserSerializer())
+    auto_plan = compile_serializer(AutoSlotSerializer())
+    no_creator = dict(UserSerializer(None).data)
+
+    def access(participant, tz):
+        slot = participant.slot
+        return {
+            'id': slot.id,
+            'fare': float(slot.fare),
+            'ride_time': encoded_datetime(slot.ride_time),
+            'start_loc': slot.start_loc,
+            'dest_loc': slot.dest_loc,
+            'status': slot.status,
+            'creator': dict(no_creator) if slot.creator is None else user_plan.render(slot.creator, tz),
+            'auto': auto_plan.render(slot.auto, tz),
+        }
+    return access
+
+
+def method_field(method_name):
+    def factory(serializer):
+        method = getattr(serializer, method_name)
+        return lambda instance, tz: method(instance)
+    return factory
+
+
+# SerializerMethodFields with a compiled equivalent; any other method field
+# calls its serializer method
+METHOD_OVERRIDES = {
+    (SlotSerializer, 'participants'): slot_participants,
+    (SlotParticipantSerializer, 'slot_details'): participant_slot_details,
+    (UserSerializer, 'image_url'): method_field('get_image_url'),
+    (UserSerializer, 'image_thumbnail_url'): method_field('get_image_thumbnail_url'),
+}
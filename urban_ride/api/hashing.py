@@ -0,0 +1,216 @@
+"""
+Password hashing on a bounded process pool.
+
+PBKDF2 is deliberately slow, and it used to run on the request thread for
+every registration and login. hash_password() and verify_password() hand
+it to a pool of PASSWORD_HASHING_WORKERS processes instead, and their a*
+versions await it without holding up the event loop under ASGI.
+
+At most PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_QUEUE_SIZE hashes are
+admitted at once. A caller waits up to PASSWORD_HASHING_TIMEOUT seconds for
+room, then gets HashingUnavailable, a 503 with Retry-After, so a burst of
+sign-ups sheds load instead of piling up threads and memory. With
+PASSWORD_HASHING_WORKERS = 0 hashes run inline, as before.
+
+Workers are started with forkserver (spawn where that is missing), never
+fork: the web process already runs threads (mail, image uploads, driver
+offers), and forking it mid-lock can deadlock the child.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many sign-ins right now, try again shortly.')
+    default_code = 'hashing_unavailable'
+    # Seconds; DRF's exception handler sends it as Retry-After
+    wait = 1
+
+
+def worker_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class PasswordHashingPool:
+    def __init__(self, workers, queue_size=0, timeout=5):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+            return self._executor
+
+    def _submit(self, fn, *args):
+        """Starts fn on a worker process; the caller holds a slot, which is released when fn is done."""
+        try:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM killed); start over with fresh processes
+                with self._lock:
+                    broken, self._executor = self._executor, None
+                broken.shutdown(wait=False)
+                future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingUnavailable()
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+        return self._submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            # Waiting for room blocks, so only a full pool costs a thread
+            acquiring = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire, timeout=self.timeout))
+            try:
+                admitted = await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # Hand back the slot if it is granted after the caller gave up
+                acquiring.add_done_callback(lambda task: task.result() and self._slots.release())
+                raise
+            if not admitted:
+                raise HashingUnavailable()
+        if self.workers <= 0:
+            try:
+                return await sync_to_async(fn, thread_sensitive=False)(*args)
+            finally:
+                self._slots.release()
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def map(self, fn, iterable, chunksize=64):
+        """fn over iterable on the pool's processes, for batch jobs; bypasses admission."""
+        if self.workers <= 0:
+            return map(fn, iterable)
+        return self._get_executor().map(fn, iterable, chunksize=chunksize)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordHashingPool(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    queue_size=settings.PASSWORD_HASHING_QUEUE_SIZE,
+                    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+                )
+    return _pool
+
+
+def reset_hashing_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def hash_password(password):
+    return get_hashing_pool().run(make_password, password)
+
+
+def verify_password(password, encoded):
+    return get_hashing_pool().run(check_password, password, encoded)
+
+
+async def ahash_password(password):
+    return await get_hashing_pool().arun(make_password, password)
+
+
+async def averify_password(password, encoded):
+    return await get_hashing_pool().arun(check_password, password, encoded)
+
+
+def needs_rehash(encoded):
+    try:
+        return identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        return False
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend with the password check done on the hashing pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so an unknown username takes as long as a wrong password
+            hash_password(password)
+            return None
+        if verify_password(password, user.password) and self.user_can_authenticate(user):
+            if needs_rehash(user.password):
+                user.password = hash_password(password)
+                user.save(update_fields=['password'])
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget(**{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            await ahash_password(password)
+            return None
+        if await averify_password(password, user.password) and self.user_can_authenticate(user):
+            if needs_rehash(user.password):
+                user.password = await ahash_password(password)
+                await sync_to_async(user.save)(update_fields=['password'])
+            return user
+        return None
+
+
+@receiver(setting_changed)
+def reset_on_hashing_settings_change(setting, **kwargs):
+    # PASSWORD_HASHERS too: workers keep the hashers they started with
+    if setting.startswith('PASSWORD_HASH'):
+        reset_hashing_pool()
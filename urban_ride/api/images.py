@@ -0,0 +1,302 @@
+"""
+Profile images, processed and uploaded off the request.
+
+UserSerializer stages an uploaded image to PROFILE_IMAGE_STAGING_DIR and
+returns. Once the transaction commits, a worker thread downscales it to
+PROFILE_IMAGE_MAX_SIZE, renders a square thumbnail for each of
+PROFILE_IMAGE_VARIANTS, pushes every rendition to the PROFILE_IMAGE_STORAGE
+backend and points User.image at the result. Until then the user keeps the
+previous image. Jobs for one user always go to the same worker, so the last
+upload is the one that sticks.
+
+User.image stays a CloudinaryField whichever backend holds the files: it
+stores 'image/upload/v<version>/<public_id>.jpg', and a variant lives at
+'<public_id>_<variant>'. URLs are built once per public id and variant and
+memoized, since every nested user in a slot response renders them.
+"""
+import io
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import suppress
+from functools import lru_cache
+
+import cloudinary.uploader
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from .models import User
+from .slot_cache import invalidate_slot_dependencies
+
+logger = logging.getLogger(__name__)
+
+# Images stored by the pipeline; only these have variants
+IMAGE_FOLDER = 'profile_images/processed'
+IMAGE_FORMAT = 'jpg'
+STAGED_SUFFIX = '.upload'
+
+
+class CloudinaryImageStorage:
+    def save(self, public_id, data):
+        result = cloudinary.uploader.upload(
+            io.BytesIO(data), public_id=public_id, resource_type='image', type='upload', overwrite=True
+        )
+        return result['version']
+
+    def url(self, public_id, format, version):
+        return CloudinaryResource(public_id, format=format, version=version, type='upload', resource_type='image').url
+
+
+class FileSystemImageStorage:
+    """Keeps images under MEDIA_ROOT and serves them from MEDIA_URL; stands in for Cloudinary in tests."""
+
+    def __init__(self):
+        self.files = FileSystemStorage()
+
+    def save(self, public_id, data):
+        self.files.save(f'{public_id}.{IMAGE_FORMAT}', ContentFile(data))
+        return int(time.time())
+
+    def url(self, public_id, format, version):
+        return self.files.url(f'{public_id}.{format}' if format else public_id)
+
+
+def variant_public_id(public_id, variant):
+    return public_id if variant is None else f'{public_id}_{variant}'
+
+
+def check_image(upload):
+    """
+    Raises unless upload is an image Pillow can read of at most
+    PROFILE_IMAGE_MAX_PIXELS; reads only the headers. A small file can declare
+    huge dimensions, and render_renditions decodes the whole bitmap.
+    """
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+            if width * height > settings.PROFILE_IMAGE_MAX_PIXELS:
+                raise ValueError(f'Image is {width}x{height} pixels')
+            image.verify()
+    finally:
+        upload.seek(0)
+
+
+def flatten(image):
+    # JPEG has no alpha; put transparent images on white rather than black
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image):
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=settings.PROFILE_IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def render_renditions(source):
+    """{None: the downscaled image, variant: square thumbnail} as JPEG bytes."""
+    max_size = settings.PROFILE_IMAGE_MAX_SIZE
+    with Image.open(source) as image:
+        # Lets a JPEG decode at a fraction of its full size
+        image.draft('RGB', (max_size, max_size))
+        image = flatten(ImageOps.exif_transpose(image))
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    renditions = {None: encode(image)}
+    for variant, size in settings.PROFILE_IMAGE_VARIANTS.items():
+        renditions[variant] = encode(ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS))
+    return renditions
+
+
+class ImageUploader:
+    def __init__(self, storage, workers=2):
+        self.storage = storage
+        self.workers = max(workers, 1)
+        self._queues = [queue.Queue() for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        # user id -> path of their newest staged upload
+        self._latest = {}
+
+    def stage(self, user_id, upload):
+        """Copies upload to the staging directory and returns its path."""
+        os.makedirs(settings.PROFILE_IMAGE_STAGING_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_IMAGE_STAGING_DIR, f'{user_id}-{uuid.uuid4().hex}{STAGED_SUFFIX}')
+        # Written under another name first, so a crash never leaves half a file to push
+        with open(path + '.part', 'wb') as out:
+            for chunk in upload.chunks():
+                out.write(chunk)
+        os.replace(path + '.part', path)
+        with self._lock:
+            self._latest[user_id] = path
+        return path
+
+    def submit(self, user_id, path):
+        self._ensure_started()
+        self._queues[user_id % self.workers].put((user_id, path))
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i, jobs in enumerate(self._queues):
+                thread = threading.Thread(target=self._run, args=(jobs,), name=f'image-uploader-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self, jobs):
+        while True:
+            job = jobs.get()
+            try:
+                if job is None:
+                    return
+                self.process(*job)
+            finally:
+                jobs.task_done()
+
+    def _superseded(self, user_id, path):
+        with self._lock:
+            return self._latest.get(user_id, path) != path
+
+    def process(self, user_id, path):
+        """Pushes the staged upload at path and sets it as user_id's image, unless a newer one is staged."""
+        try:
+            if self._superseded(user_id, path):
+                return
+            with open(path, 'rb') as source:
+                renditions = render_renditions(source)
+            public_id = f'{IMAGE_FOLDER}/{uuid.uuid4().hex}'
+            version = self._push(public_id, renditions)
+            if self._superseded(user_id, path):
+                return
+            User.objects.filter(pk=user_id).update(image=f'image/upload/v{version}/{public_id}.{IMAGE_FORMAT}')
+            # update() sends no post_save, and slot responses nest users
+            invalidate_slot_dependencies()
+        except Exception:
+            logger.exception('Error processing profile image for user %s', user_id)
+        finally:
+            with self._lock:
+                if self._latest.get(user_id) == path:
+                    del self._latest[user_id]
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            close_old_connections()
+
+    def _push(self, public_id, renditions):
+        # Retry once; the upload API drops the odd connection
+        for attempt in range(2):
+            try:
+                version = None
+                for variant, data in renditions.items():
+                    saved = self.storage.save(variant_public_id(public_id, variant), data)
+                    if variant is None:
+                        version = saved
+                return version
+            except Exception as e:
+                if attempt:
+                    raise
+                logger.warning('Error uploading profile image %s (attempt %d): %s', public_id, attempt + 1, e)
+
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for jobs in self._queues:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            with jobs.all_tasks_done:
+                if not jobs.all_tasks_done.wait_for(lambda: not jobs.unfinished_tasks, remaining):
+                    return False
+        return True
+
+    def shutdown(self, timeout=None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if threads:
+            for jobs in self._queues:
+                jobs.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+
+_storage = None
+_uploader = None
+_images_lock = threading.Lock()
+
+
+def get_image_storage():
+    global _storage
+    if _storage is None:
+        with _images_lock:
+            if _storage is None:
+                _storage = import_string(settings.PROFILE_IMAGE_STORAGE)()
+    return _storage
+
+
+def get_image_uploader():
+    global _uploader
+    if _uploader is None:
+        storage = get_image_storage()
+        with _images_lock:
+            if _uploader is None:
+                _uploader = ImageUploader(storage, workers=settings.PROFILE_IMAGE_WORKERS)
+    return _uploader
+
+
+def reset_images():
+    global _storage, _uploader
+    with _images_lock:
+        uploader, _storage, _uploader = _uploader, None, None
+    if uploader is not None:
+        uploader.shutdown(timeout=5)
+    _image_url.cache_clear()
+
+
+def schedule_image_upload(user_id, upload):
+    """Stages upload for user_id now and queues it for the workers once the transaction commits."""
+    uploader = get_image_uploader()
+    path = uploader.stage(user_id, upload)
+    transaction.on_commit(lambda: uploader.submit(user_id, path), robust=True)
+
+
+def staged_uploads():
+    """(user id, path) of uploads left in the staging directory, oldest first."""
+    directory = settings.PROFILE_IMAGE_STAGING_DIR
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(STAGED_SUFFIX)]
+    paths.sort(key=os.path.getmtime)
+    return [(int(os.path.basename(path).split('-', 1)[0]), path) for path in paths]
+
+
+@lru_cache(maxsize=4096)
+def _image_url(public_id, format, version, variant):
+    # Images uploaded before the pipeline have no variants; fall back to the image itself
+    if variant is not None and not public_id.startswith(IMAGE_FOLDER + '/'):
+        variant = None
+    return get_image_storage().url(variant_public_id(public_id, variant), format, version)
+
+
+def image_url(image, variant=None):
+    """URL of a User.image value or one of its PROFILE_IMAGE_VARIANTS, None without an image."""
+    if not image:
+        return None
+    return _image_url(image.public_id, image.format, image.version, variant)
+
+
+@receiver(setting_changed)
+def reset_on_image_settings_change(setting, **kwargs):
+    if setting.startswith(('PROFILE_IMAGE_', 'MEDIA_')):
+        reset_images()
@@ -0,0 +1,244 @@
+"""
+Bulk slot ingestion, e.g. a term of daily campus shuttle runs at once.
+
+Rows are validated column by column before anything is written. Creators
+and participants are each looked up in one query for the whole batch, and
+missing fares and convenience fees are priced in one vectorized call. Valid
+rows are then written in chunks of SLOT_BULK_CHUNK_SIZE. Each chunk runs in
+its own transaction, draws its autos from AutoQueue with one locking query,
+and bulk_creates its slots and participants. A bad row is reported by index
+and never aborts the rest of the batch.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .dispatch import offer_slots
+from .models import Auto, AutoQueue, Slot, SlotParticipant, User
+from .parsers import InvalidRow
+from .pricing import LOCATION_INDEX, local_hour, price_arrays, to_decimal
+from .realtime import publish_slot_updates
+from .slot_cache import invalidate_slot_dependencies
+
+# Field instances are only used for their to_internal_value/validators, so
+# values get the same coercion and error messages as the single-slot API
+FIELDS = {
+    'creator_id': serializers.IntegerField(),
+    'ride_time': serializers.DateTimeField(),
+    'start_loc': serializers.ChoiceField(choices=Slot.LOCATIONS),
+    'dest_loc': serializers.ChoiceField(choices=Slot.LOCATIONS),
+    'max_capacity': serializers.IntegerField(min_value=1),
+    'fare': serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0),
+}
+FEE_FIELD = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+USER_ID_FIELD = serializers.IntegerField()
+
+DEFAULTS = {
+    'start_loc': Slot._meta.get_field('start_loc').default,
+    'dest_loc': Slot._meta.get_field('dest_loc').default,
+    'max_capacity': 4,
+}
+
+
+class RowErrors:
+    def __init__(self):
+        self.by_row = defaultdict(lambda: defaultdict(list))
+
+    def add(self, index, field, message):
+        self.by_row[index][field].append(str(message))
+
+    def add_detail(self, index, field, detail):
+        for message in detail if isinstance(detail, list) else [detail]:
+            self.add(index, field, message)
+
+    def __contains__(self, index):
+        return index in self.by_row
+
+    def as_list(self):
+        return [
+            {'row': index, 'errors': dict(fields)}
+            for index, fields in sorted(self.by_row.items())
+        ]
+
+
+def clean_participants(index, value, errors):
+    """Normalizes a row's participants to [(user_id, fee or None), ...]."""
+    if not isinstance(value, list):
+        errors.add(index, 'participants', 'Expected a list of user ids or objects')
+        return []
+    participants = []
+    for item in value:
+        user_id, fee = (item.get('user_id'), item.get('convenience_fee')) if isinstance(item, dict) else (item, None)
+        try:
+            user_id = USER_ID_FIELD.run_validation(user_id)
+            if fee is not None:
+                fee = FEE_FIELD.run_validation(fee)
+        except serializers.ValidationError as e:
+            errors.add_detail(index, 'participants', e.detail)
+            continue
+        participants.append((user_id, fee))
+    return participants
+
+
+def clean_fields(rows, errors):
+    """Per-row checks that need no database: types, choices and ranges."""
+    now = timezone.now()
+    cleaned = {}
+    for index, row in enumerate(rows):
+        if isinstance(row, InvalidRow):
+            errors.add(index, 'non_field_errors', row.error)
+            continue
+        if not isinstance(row, dict):
+            errors.add(index, 'non_field_errors', 'Expected an object')
+            continue
+
+        data = {}
+        for name, field in FIELDS.items():
+            value = row.get(name, DEFAULTS.get(name))
+            if value is None:
+                if name in ('creator_id', 'ride_time'):
+                    errors.add(index, name, 'This field is required.')
+                continue
+            try:
+                data[name] = field.run_validation(value)
+            except serializers.ValidationError as e:
+                errors.add_detail(index, name, e.detail)
+        if 'ride_time' in data and data['ride_time'] < now:
+            errors.add(index, 'ride_time', 'Ride time cannot be in the past')
+
+        participants = clean_participants(index, row.get('participants', []), errors)
+        user_ids = [user_id for user_id, _ in participants]
+        if len(set(user_ids)) != len(user_ids):
+            errors.add(index, 'participants', 'A user can only join a slot once')
+        if data.get('creator_id') in user_ids:
+            errors.add(index, 'participants', 'Slot creator cannot join as a participant')
+        # The creator holds the first seat
+        if 'max_capacity' in data and len(participants) + 1 > data['max_capacity']:
+            errors.add(index, 'participants', 'More participants than seats')
+        data['participants'] = participants
+
+        if index not in errors:
+            cleaned[index] = data
+    return cleaned
+
+
+def check_users(cleaned, errors):
+    """Creator and participant checks, one query each for the whole batch."""
+    creator_ids = {data['creator_id'] for data in cleaned.values()}
+    known_creators = set(User.objects.filter(id__in=creator_ids).values_list('id', flat=True))
+
+    participant_ids = {user_id for data in cleaned.values() for user_id, _ in data['participants']}
+    customers = set(User.objects.filter(
+        id__in=participant_ids, user_type='CUSTOMER'
+    ).values_list('id', flat=True))
+
+    # Same rule as joining a slot: one booking per rider per ride_time, both
+    # against slots already stored and between rows of this batch
+    booked = set(SlotParticipant.objects.filter(
+        user_id__in=customers,
+        slot__ride_time__in={data['ride_time'] for data in cleaned.values() if data['participants']},
+        slot__status__in=['OPEN', 'PENDING_DRIVER'],
+    ).values_list('user_id', 'slot__ride_time'))
+
+    for index, data in list(cleaned.items()):
+        if data['creator_id'] not in known_creators:
+            errors.add(index, 'creator_id', 'Invalid creator ID')
+        for user_id, _ in data['participants']:
+            if user_id not in customers:
+                errors.add(index, 'participants', f'User {user_id} not found or not a customer')
+            elif (user_id, data['ride_time']) in booked:
+                errors.add(index, 'participants', f'User {user_id} already has a slot booked for this time')
+            else:
+                booked.add((user_id, data['ride_time']))
+        if index in errors:
+            del cleaned[index]
+
+
+def price_missing(cleaned):
+    """Fills in fares and convenience fees left out, in one vectorized call."""
+    if not cleaned:
+        return
+    rows = list(cleaned.values())
+    tz = timezone.get_default_timezone()
+    prices = price_arrays(
+        np.array([LOCATION_INDEX[data['start_loc']] for data in rows]),
+        np.array([LOCATION_INDEX[data['dest_loc']] for data in rows]),
+        np.array([local_hour(data['ride_time'], tz) for data in rows]),
+        np.array([len(data['participants']) + 1 for data in rows]),
+    )
+    for data, fare, fee in zip(rows, prices['fare'].tolist(), prices['convenience_fee'].tolist()):
+        data.setdefault('fare', to_decimal(fare))
+        data['participants'] = [
+            (user_id, user_fee if user_fee is not None else to_decimal(fee))
+            for user_id, user_fee in data['participants']
+        ]
+
+
+def write_chunk(chunk):
+    """
+    Books one chunk of clean rows onto autos from the queue and offers each
+    slot to its driver. Returns the created slots in row order; rows beyond
+    the autos available are skipped. Call inside transaction.atomic().
+    """
+    autos = AutoQueue.objects.pop_many(len(chunk))
+    if not autos:
+        return []
+    slots = Slot.objects.bulk_create([
+        Slot(
+            auto=auto,
+            creator_id=data['creator_id'],
+            max_capacity=data['max_capacity'],
+            current_capacity=len(data['participants']) + 1,
+            fare=data['fare'],
+            status='PENDING_DRIVER',
+            ride_time=data['ride_time'],
+            start_loc=data['start_loc'],
+            dest_loc=data['dest_loc'],
+        )
+        for (_, data), auto in zip(chunk, autos)
+    ])
+    SlotParticipant.objects.bulk_create([
+        SlotParticipant(slot=slot, user_id=user_id, status='JOINED', convenience_fee=fee)
+        for slot, (_, data) in zip(slots, chunk)
+        for user_id, fee in data['participants']
+    ])
+    Auto.objects.filter(pk__in=[auto.pk for auto in autos]).update(status='QUEUED')
+    offer_slots([(slot.pk, slot.auto_id) for slot in slots])
+
+    # bulk_create and update() skip the post_save receivers, so do their work
+    invalidate_slot_dependencies()
+    publish_slot_updates([slot.pk for slot in slots], 'slot.created')
+    return slots
+
+
+def ingest_slots(rows, chunk_size=None):
+    """
+    Validates and creates slots from a list of row dicts. Returns
+    {'created': [{'row', 'id', 'auto'}], 'errors': [{'row', 'errors'}]}.
+    """
+    chunk_size = chunk_size or settings.SLOT_BULK_CHUNK_SIZE
+    errors = RowErrors()
+    cleaned = clean_fields(rows, errors)
+    if cleaned:
+        check_users(cleaned, errors)
+    price_missing(cleaned)
+
+    valid = sorted(cleaned.items())
+    created = []
+    for offset in range(0, len(valid), chunk_size):
+        chunk = valid[offset:offset + chunk_size]
+        with transaction.atomic():
+            slots = write_chunk(chunk)
+        for (index, _), slot in zip(chunk, slots):
+            created.append({'row': index, 'id': slot.pk, 'auto': slot.auto_id})
+        if len(slots) < len(chunk):
+            # The queue ran dry; nothing later in the batch can be booked
+            for index, _ in valid[offset + len(slots):]:
+                errors.add(index, 'auto', 'No autos in queue')
+            break
+
+    return {'created': created, 'errors': errors.as_list()}
@@ -0,0 +1,193 @@
+"""
+Background slot lifecycle: expiring, finalizing and recycling autos.
+
+- A PENDING_DRIVER slot that no driver accepts within SLOT_PENDING_TIMEOUT
+  seconds of being created, or by its ride_time, is CANCELLED, and the
+  driver offer it is waiting on expires (see api/dispatch.py).
+- An OPEN or BOOKED slot is FINALIZED SLOT_RIDE_DURATION seconds after its
+  ride_time.
+- Once an auto has no active slot left, it goes back to AVAILABLE and to
+  the tail of AutoQueue.
+
+LifecycleScheduler keeps a heap of (due time, slot id) covering the next
+refresh window, loaded from the database by status and ride_time. It wakes
+only when the head of the heap comes due and applies the transitions for
+everything due in batched conditional UPDATEs. The heap is only a schedule:
+every UPDATE re-checks status and times in SQL, so a slot that was accepted,
+cancelled or moved after it was loaded is left alone.
+
+Only the slots a tick itself moved are reported on. Their cached responses
+are invalidated through the shared cache, and their 'slot.expired' and
+'slot.finalized' events go to REALTIME_HUB. run_lifecycle is a process of
+its own, so those events only reach WebSocket clients through a hub that
+relays between processes; the default in-process hub has no subscribers
+there. The web processes' matching indexes need no signal: they only hold
+OPEN slots, and candidates() skips the ones that have departed.
+"""
+import heapq
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .availability import refresh_slots
+from .models import ACTIVE_SLOT_STATUSES, AutoQueue, DispatchOffer, Slot
+from .realtime import publish_slot_updates
+from .slot_cache import invalidate_slot_dependencies
+
+ACTIVE_STATUSES = ACTIVE_SLOT_STATUSES
+RIDING_STATUSES = ('OPEN', 'BOOKED')
+
+
+def pending_timeout():
+    return timedelta(seconds=settings.SLOT_PENDING_TIMEOUT)
+
+
+def ride_duration():
+    return timedelta(seconds=settings.SLOT_RIDE_DURATION)
+
+
+def due_at(status, ride_time, created_at):
+    if status == 'PENDING_DRIVER':
+        return min(created_at + pending_timeout(), ride_time)
+    return ride_time + ride_duration()
+
+
+def expired_filter(now):
+    return Q(status='PENDING_DRIVER') & (Q(created_at__lte=now - pending_timeout()) | Q(ride_time__lte=now))
+
+
+def finished_filter(now):
+    return Q(status__in=RIDING_STATUSES, ride_time__lte=now - ride_duration())
+
+
+def claim_slots(slots, status):
+    """
+    Moves the slots of the queryset slots to status and returns their ids.
+    Call inside transaction.atomic().
+    """
+    while True:
+        claimed = list(slots.values_list('id', flat=True))
+        if not claimed:
+            return []
+        # As in dispatch.claim_offers(), the UPDATE's row count is the claim.
+        # If another writer moved some of these first, roll back to the
+        # savepoint and read them again.
+        with transaction.atomic():
+            if slots.filter(pk__in=claimed).update(status=status) == len(claimed):
+                return claimed
+            transaction.set_rollback(True)
+
+
+def recycle_autos(slot_ids):
+    """
+    Returns the autos of slot_ids that have no active slot left to AVAILABLE
+    and the tail of AutoQueue. Returns the number recycled. Call inside
+    transaction.atomic(), after the slot UPDATEs.
+    """
+    finished_autos = Slot.objects.filter(pk__in=slot_ids).exclude(
+        status__in=ACTIVE_STATUSES
+    ).values_list('auto_id', flat=True)
+    return AutoQueue.objects.requeue(finished_autos)
+
+
+def apply_transitions(slot_ids, now=None):
+    """
+    Expires and finalizes whichever of slot_ids are due at now and recycles
+    their autos, in one transaction. Returns (expired, finalized, recycled).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = claim_slots(Slot.objects.filter(expired_filter(now), pk__in=slot_ids), 'CANCELLED')
+        finalized = claim_slots(Slot.objects.filter(finished_filter(now), pk__in=slot_ids), 'FINALIZED')
+        if not (expired or finalized):
+            return 0, 0, 0
+        # Nobody can take up the offers of a cancelled slot any more
+        DispatchOffer.objects.filter(slot_id__in=expired, status='OFFERED').update(
+            status='EXPIRED', responded_at=now
+        )
+        recycled = recycle_autos(expired + finalized)
+
+        # update() skips the post_save receivers, so do their work here
+        invalidate_slot_dependencies()
+        refresh_slots(finalized)
+        publish_slot_updates(expired, 'slot.expired')
+        publish_slot_updates(finalized, 'slot.finalized')
+    return len(expired), len(finalized), recycled
+
+
+class LifecycleScheduler:
+    def __init__(self, batch_size=None, refresh_interval=None, resolution=1.0, clock=timezone.now):
+        self.batch_size = batch_size or settings.LIFECYCLE_BATCH_SIZE
+        # Slots falling due within this many seconds of each other share a
+        # tick, and so a batch, instead of waking the worker once each
+        self.resolution = resolution
+        self.refresh_interval = timedelta(seconds=refresh_interval or settings.LIFECYCLE_REFRESH_INTERVAL)
+        self.clock = clock
+        self._heap = []
+        self._scheduled = {}
+        self._next_refresh = None
+        self.totals = {'expired': 0, 'finalized': 0, 'recycled': 0}
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def schedule(self, slot_id, due):
+        if self._scheduled.get(slot_id) == due:
+            return
+        # A changed due time leaves the old heap entry behind; it is skipped
+        # when popped because it no longer matches _scheduled
+        self._scheduled[slot_id] = due
+        heapq.heappush(self._heap, (due, slot_id))
+
+    def refresh(self, now):
+        """Loads every active slot coming due before the next refresh."""
+        horizon = now + self.refresh_interval
+        # Separate queries rather than one OR, so each can use slot_lifecycle_idx
+        for due_soon in (
+            Q(status='PENDING_DRIVER', ride_time__lte=horizon),
+            Q(status='PENDING_DRIVER', created_at__lte=horizon - pending_timeout()),
+            finished_filter(horizon),
+        ):
+            rows = Slot.objects.filter(due_soon).values_list(
+                'id', 'status', 'ride_time', 'created_at'
+            ).iterator(chunk_size=self.batch_size)
+            for slot_id, status, ride_time, created_at in rows:
+                self.schedule(slot_id, due_at(status, ride_time, created_at))
+        self._next_refresh = horizon
+
+    def pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, slot_id = heapq.heappop(self._heap)
+            if self._scheduled.get(slot_id) == when:
+                del self._scheduled[slot_id]
+                due.append(slot_id)
+        return due
+
+    def tick(self):
+        """Runs everything due now. Returns how long to sleep before the next tick."""
+        now = self.clock()
+        if self._next_refresh is None or now >= self._next_refresh:
+            self.refresh(now)
+
+        due = self.pop_due(now)
+        for start in range(0, len(due), self.batch_size):
+            expired, finalized, recycled = apply_transitions(due[start:start + self.batch_size], now)
+            self.totals['expired'] += expired
+            self.totals['finalized'] += finalized
+            self.totals['recycled'] += recycled
+
+        wake = self._next_refresh
+        if self._heap:
+            wake = min(wake, self._heap[0][0])
+        return max((wake - self.clock()).total_seconds(), self.resolution)
+
+    def run(self, stop=None, max_sleep=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            delay = self.tick()
+            stop.wait(delay if max_sleep is None else min(delay, max_sleep))
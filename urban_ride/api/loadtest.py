@@ -0,0 +1,355 @@
+"""
+End-to-end load test for the core ride flows.
+
+seed() fills a database with riders, drivers, autos (some waiting in
+AutoQueue) and slots with participants. Ride times follow the hourly demand
+curve used for pricing.
+
+LoadTest then runs concurrent virtual users. Each iteration goes through
+the public API the way the apps do:
+
+    register a rider and a driver -> create an auto -> create a slot
+    -> the offered driver logs in, once per driver -> the driver accepts
+    -> a seeded rider joins -> list slots
+
+A failed step ends its iteration, since later steps depend on it. Latency
+is recorded for every request, and errors are counted per flow by status.
+Requests go either through the ASGI application in-process (ASGITransport)
+or over HTTP to Django's live test server (HTTPTransport with live_server()).
+
+Reports are plain dicts so they can be saved as JSON and compared against
+a baseline with regressions(); see the loadtest management command.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.asgi import get_asgi_application
+from django.test.testcases import LiveServerThread
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from .asgi_testing import http_request
+from .availability import reconcile
+from .benchmarks import summarize
+from .matching import reset_matching_engine
+from .models import Auto, AutoQueue, Slot, SlotParticipant, User
+from .pricing import DEMAND_BY_HOUR, LOCATION_CODES, LOCATION_INDEX, price_arrays, to_decimal
+from .slot_cache import invalidate_slot_dependencies
+
+# Every seeded and registered user shares this password
+PASSWORD = 'loadtest'
+FLOWS = ('register', 'create_auto', 'create_slot', 'login', 'accept', 'join', 'list')
+
+
+def random_ride_time(rng, now, days):
+    # Busy hours get proportionally more rides, as with demand pricing
+    hour = rng.choices(range(24), weights=DEMAND_BY_HOUR)[0]
+    day = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day + timedelta(days=rng.randint(1, days), hours=hour, minutes=rng.randrange(60))
+
+
+def seed(customers=1000, drivers=100, slots=2000, days=14, rng=None):
+    """
+    Creates a realistic data set with bulk inserts. Returns the seeded rider
+    ids, for joins.
+    """
+    rng = rng or random.Random(0)
+    now = timezone.now()
+    # Hashing once keeps seeding fast
+    password = make_password(PASSWORD)
+
+    riders = User.objects.bulk_create(
+        User(username=f'lt_rider{i}', email=f'lt_rider{i}@load.test', phone=f'9{i:09d}',
+             user_type='CUSTOMER', password=password)
+        for i in range(customers)
+    )
+    driver_users = User.objects.bulk_create(
+        User(username=f'lt_driver{i}', email=f'lt_driver{i}@load.test', phone=f'8{i:09d}',
+             user_type='DRIVER', password=password)
+        for i in range(drivers)
+    )
+    # Half the fleet is out on seeded slots, the other half waits in the queue
+    autos = Auto.objects.bulk_create(
+        Auto(driver=driver, license_plate=f'LT-{i:05d}', status='BOOKED' if i % 2 else 'AVAILABLE')
+        for i, driver in enumerate(driver_users)
+    )
+    busy = [auto for auto in autos if auto.status == 'BOOKED']
+    AutoQueue.objects.bulk_create(AutoQueue(auto=auto) for auto in autos if auto.status == 'AVAILABLE')
+
+    rows = []
+    for i in range(slots):
+        start_loc, dest_loc = rng.sample(LOCATION_CODES, 2)
+        max_capacity = rng.randint(3, 6)
+        status = 'OPEN' if rng.random() < 0.7 else 'PENDING_DRIVER'
+        joined = rng.randint(0, max_capacity - 1) if status == 'OPEN' else 0
+        rows.append((start_loc, dest_loc, random_ride_time(rng, now, days), max_capacity, status, joined))
+
+    tz = timezone.get_default_timezone()
+    prices = price_arrays(
+        np.array([LOCATION_INDEX[row[0]] for row in rows], dtype=int),
+        np.array([LOCATION_INDEX[row[1]] for row in rows], dtype=int),
+        np.array([row[2].astimezone(tz).hour for row in rows], dtype=int),
+        np.array([row[5] + 1 for row in rows], dtype=int),
+    )
+    seeded = Slot.objects.bulk_create(
+        Slot(
+            auto=busy[i % len(busy)] if busy else autos[0],
+            creator=rng.choice(riders),
+            max_capacity=max_capacity,
+            current_capacity=joined + 1,
+            fare=to_decimal(fare),
+            status=status,
+            ride_time=ride_time,
+            start_loc=start_loc,
+            dest_loc=dest_loc,
+        )
+        for i, ((start_loc, dest_loc, ride_time, max_capacity, status, joined), fare)
+        in enumerate(zip(rows, prices['fare'].tolist()))
+    )
+    SlotParticipant.objects.bulk_create(
+        SlotParticipant(slot=slot, user=user, status='JOINED', convenience_fee=to_decimal(fee))
+        for slot, row, fee in zip(seeded, rows, prices['convenience_fee'].tolist())
+        for user in [rider for rider in rng.sample(riders, row[5] + 1) if rider.pk != slot.creator_id][:row[5]]
+    )
+
+    # bulk_create skips the receivers that keep these in step
+    reconcile()
+    reset_matching_engine()
+    invalidate_slot_dependencies()
+    return [rider.pk for rider in riders]
+
+
+def encode(data, form):
+    if data is None:
+        return None, b''
+    if form:
+        return 'application/x-www-form-urlencoded', urlencode(data).encode()
+    return 'application/json', json.dumps(data).encode()
+
+
+def decode(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+class ASGITransport:
+    """Requests through the ASGI application in this process."""
+
+    def __init__(self, application=None):
+        self.application = application or get_asgi_application()
+
+    async def request(self, method, path, data=None, form=False, query='', token=None):
+        content_type, body = encode(data, form)
+        headers = [(b'content-length', str(len(body)).encode())]
+        if content_type:
+            headers.append((b'content-type', content_type.encode()))
+        if token:
+            headers.append((b'authorization', f'Bearer {token}'.encode()))
+        status, _, content = await http_request(self.application, path, query, method, headers, body)
+        return status, decode(content)
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Requests over HTTP to base_url, from a pool of concurrency threads."""
+
+    def __init__(self, base_url, concurrency=10):
+        self.base_url = base_url.rstrip('/')
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def send(self, method, path, data, form, query, token):
+        content_type, body = encode(data, form)
+        url = f'{self.base_url}{path}' + (f'?{query}' if query else '')
+        request = Request(url, data=body or None, method=method)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urlopen(request, timeout=60) as response:
+                return response.status, decode(response.read())
+        except HTTPError as e:
+            return e.code, decode(e.read())
+
+    async def request(self, method, path, data=None, form=False, query='', token=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.send, method, path, data, form, query, token)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+@contextmanager
+def live_server(host='localhost'):
+    """Runs Django's threaded test server for the duration; yields its URL."""
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, host]):
+        server = LiveServerThread(host, lambda application: application, port=0)
+        server.daemon = True
+        server.start()
+        server.is_ready.wait()
+        if server.error:
+            raise server.error
+        try:
+            yield f'http://{host}:{server.port}'
+        finally:
+            server.terminate()
+
+
+class Results:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.elapsed = 0.0
+
+    def record(self, flow, seconds, status_code, ok):
+        self.samples[flow].append(seconds)
+        if not ok:
+            self.errors[flow][status_code] += 1
+
+    def summary(self):
+        """{flow: {count, mean_ms, p50_ms, p95_ms, p99_ms, throughput, errors}}, plus 'total'."""
+        elapsed = self.elapsed or 1
+        report = {}
+        flows = [flow for flow in FLOWS if self.samples[flow]]
+        for flow in flows:
+            report[flow] = {
+                **summarize(self.samples[flow]),
+                'throughput': len(self.samples[flow]) / elapsed,
+                'errors': dict(self.errors[flow]),
+            }
+        everything = [sample for flow in flows for sample in self.samples[flow]]
+        if everything:
+            report['total'] = {
+                **summarize(everything),
+                'throughput': len(everything) / elapsed,
+                'errors': dict(sum((self.errors[flow] for flow in flows), Counter())),
+            }
+        return report
+
+
+class LoadTest:
+    def __init__(self, transport, riders, concurrency=10, iterations=100, seed=0):
+        self.transport = transport
+        self.riders = riders
+        self.concurrency = concurrency
+        self.iterations = iterations
+        self.seed = seed
+        self.results = Results()
+        self.started = 0
+        self.now = timezone.now()
+        self.tokens = {}
+
+    async def run(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self.virtual_user(random.Random(f'{self.seed}:{user}')) for user in range(self.concurrency)
+        ))
+        self.results.elapsed = time.perf_counter() - start
+        return self.results
+
+    async def virtual_user(self, rng):
+        while self.started < self.iterations:
+            self.started += 1
+            await self.iteration(self.started, rng)
+
+    async def step(self, flow, expected, method, path, data=None, form=False, query='', token=None):
+        start = time.perf_counter()
+        status_code, body = await self.transport.request(method, path, data, form, query, token)
+        ok = status_code == expected
+        self.results.record(flow, time.perf_counter() - start, status_code, ok)
+        return body if ok else None
+
+    async def login(self, user):
+        # Like the app, a driver logs in once and reuses the access token
+        if user['id'] not in self.tokens:
+            tokens = await self.step('login', 200, 'POST', '/api/token/', {
+                'username': user['username'], 'password': PASSWORD,
+            })
+            if not tokens:
+                return None
+            self.tokens[user['id']] = tokens['access']
+        return self.tokens[user['id']]
+
+    def registration(self, kind, n):
+        return {
+            'username': f'lt_{kind}_{self.seed}_{n}',
+            'email': f'lt_{kind}_{self.seed}_{n}@load.test',
+            'phone': f'7{n:09d}',
+            'password': PASSWORD,
+            'user_type': kind.upper(),
+        }
+
+    async def iteration(self, n, rng):
+        customer = await self.step('register', 201, 'POST', '/api/users/', self.registration('customer', n), form=True)
+        driver = await self.step('register', 201, 'POST', '/api/users/', self.registration('driver', n), form=True)
+        if not (customer and driver):
+            return
+        auto = await self.step('create_auto', 201, 'POST', '/api/autos/create/', {
+            'driver_id': driver['id'], 'license_plate': f'LTN-{self.seed}-{n}',
+        })
+        if not auto:
+            return
+
+        start_loc, dest_loc = rng.sample(LOCATION_CODES, 2)
+        # Seconds off the minute, so a seeded rider never already has a
+        # booking at exactly this time
+        ride_time = self.now + timedelta(days=1, minutes=n, seconds=7)
+        slot = await self.step('create_slot', 201, 'POST', '/api/slots/create/', {
+            'creator_id': customer['id'],
+            'max_capacity': 4,
+            'ride_time': ride_time.isoformat(),
+            'start_loc': start_loc,
+            'dest_loc': dest_loc,
+        })
+        if not slot:
+            return
+        # The slot is offered to the driver of the auto at the head of the queue
+        token = await self.login(slot['auto_details']['driver_details'])
+        if not token:
+            return
+        if not await self.step('accept', 200, 'PUT', f"/api/slots/{slot['id']}/accept/", token=token):
+            return
+        await self.step('join', 201, 'POST', f"/api/slots/{slot['id']}/join/", {
+            'user_id': rng.choice(self.riders),
+        })
+        await self.step('list', 200, 'GET', '/api/slots/', query='page_size=20')
+
+
+def regressions(report, baseline, tolerance=0.2):
+    """Flows whose p95 latency rose, or throughput fell, by more than tolerance."""
+    found = []
+    for flow, before in baseline.items():
+        after = report.get(flow)
+        if not after:
+            continue
+        if after['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{flow}: p95 {after['p95_ms']:.1f}ms, baseline {before['p95_ms']:.1f}ms")
+        if after['throughput'] < before['throughput'] * (1 - tolerance):
+            found.append(f"{flow}: {after['throughput']:.1f} req/s, baseline {before['throughput']:.1f} req/s")
+    return found
+
+
+def format_report(report):
+    lines = [f"{'flow':<12} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}"]
+    for flow, stats in report.items():
+        lines.append(
+            f"{flow:<12} {stats['count']:>6} {sum(stats['errors'].values()):>6} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['throughput']:>8.1f}"
+        )
+    return '\n'.join(lines)
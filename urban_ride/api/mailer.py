@@ -0,0 +1,194 @@
+"""
+Background email delivery over pooled SMTP connections.
+
+Requests only enqueue messages. Worker threads drain the queue in batches and
+send each batch over one authenticated connection, which is kept open and
+reused by later batches instead of paying connect, STARTTLS and login for
+every message. A message that fails is retried once on its own; the rest
+of its batch still goes out.
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnectionPool:
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 size=2, timeout=10, max_idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _discard(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            # Servers drop idle sessions; don't hand out one that is likely dead
+            if time.monotonic() - last_used > self.max_idle:
+                self._discard(server)
+                continue
+            return server
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception:
+                self._discard(server)
+                raise
+            self._idle.put((server, time.monotonic()))
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(server)
+
+
+class MailDispatcher:
+    def __init__(self, pool, workers=2, batch_size=20):
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, message):
+        self._ensure_started()
+        self._queue.put(message)
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'mail-dispatcher-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            messages = batch[:-1] if stop else batch
+            try:
+                if messages:
+                    self._deliver(messages)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _deliver(self, messages):
+        for message in messages:
+            # The pool hands the same connection back for the next message. A
+            # failure discards it, since the server may have dropped it, and
+            # the message is retried once on a fresh one.
+            for attempt in range(1, 3):
+                try:
+                    with self.pool.connection() as server:
+                        server.send_message(message)
+                    break
+                except Exception:
+                    logger.exception('Error sending email to %s (attempt %d)', message['To'], attempt)
+
+    def flush(self, timeout=None):
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks, timeout
+            )
+
+    def shutdown(self, timeout=None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        self.pool.close()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_mail_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                workers = settings.OTP_EMAIL_WORKERS
+                pool = SMTPConnectionPool(
+                    host=settings.EMAIL_HOST,
+                    port=settings.EMAIL_PORT,
+                    username=settings.EMAIL_HOST_USER,
+                    password=settings.EMAIL_HOST_PASSWORD,
+                    use_tls=settings.EMAIL_USE_TLS,
+                    size=workers,
+                    timeout=getattr(settings, 'EMAIL_TIMEOUT', None) or 10,
+                )
+                _dispatcher = MailDispatcher(pool, workers=workers,
+                                             batch_size=settings.OTP_EMAIL_BATCH_SIZE)
+    return _dispatcher
+
+
+def reset_mail_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown(timeout=5)
+
+
+@receiver(setting_changed)
+def reset_on_email_settings_change(setting, **kwargs):
+    if setting.startswith(('EMAIL_', 'OTP_EMAIL_')):
+        reset_mail_dispatcher()
@@ -0,0 +1,80 @@
+import random
+
+from django.contrib import admin
+from django.contrib.admin import AdminSite
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+
+from api.benchmarks import format_stats, measure, scratch_database
+from api.loadtest import seed
+from api.admin import SlotAdmin
+from api.models import Auto, Slot, SlotParticipant, User
+
+
+# The admin classes as they were before api/admin.py was made to scale
+class OldSlotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at')
+    search_fields = ('id',)
+
+
+class OldSlotParticipantAdmin(admin.ModelAdmin):
+    list_display = ('id', 'slot', 'user', 'status', 'convenience_fee', 'paid', 'joined_at')
+    search_fields = ('id', 'status')
+
+
+class OldAutoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'driver', 'license_plate', 'status')
+    search_fields = ('id', 'license_plate', 'status')
+
+
+class StockDateHierarchySlotAdmin(SlotAdmin):
+    # Django's date_hierarchy tag, which lists the days with rides through SELECT DISTINCT
+    change_list_template = None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark admin changelist pages before and after select_related, indexed search and estimated counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=100000)
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--drivers', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=10, help='Page loads per changelist')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with scratch_database(), override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=10000):
+            seed(options['customers'], options['drivers'], options['slots'], rng=random.Random(options['seed']))
+            superuser = User.objects.create(username='bench_admin', email='bench_admin@bench.local',
+                                            is_staff=True, is_superuser=True)
+            plate = Auto.objects.order_by('id').values_list('license_plate', flat=True).first()
+            self.stdout.write(f'{Slot.objects.count()} slots, {SlotParticipant.objects.count()} participants')
+
+            old_site = AdminSite(name='bench_old')
+            pages = [
+                ('slots', Slot, [('before', OldSlotAdmin), ('stock date hierarchy', StockDateHierarchySlotAdmin)]),
+                ('participants', SlotParticipant, [('before', OldSlotParticipantAdmin)]),
+                ('autos', Auto, [('before', OldAutoAdmin)]),
+                ('autos, search', Auto, [('before', OldAutoAdmin)], {'q': plate}),
+            ]
+            factory = RequestFactory()
+            for label, model, variants, *params in pages:
+                params = params[0] if params else {}
+                versions = [(version, admin_class(model, old_site)) for version, admin_class in variants]
+                for version, model_admin in versions + [('after', admin.site._registry[model])]:
+                    def load():
+                        request = factory.get('/admin/', params)
+                        request.user = superuser
+                        response = model_admin.changelist_view(request)
+                        response.render()
+                        assert response.status_code == 200, response.status_code
+
+                    with CaptureQueriesContext(connection) as queries:
+                        load()
+                    name = f'{label}, {version}'
+                    self.stdout.write(format_stats(name, measure(load, options['requests'])))
+                    database_ms = sum(float(query['time']) for query in queries) * 1000
+                    self.stdout.write(f"{'':<28} {len(queries)} queries, {database_ms:.1f}ms in the database per page")
@@ -0,0 +1,75 @@
+import asyncio
+import importlib
+import random
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from api.asgi_testing import http_request
+from api.benchmarks import bulk_seed_slots, scratch_database, seed_fleet, summarize
+from api.models import Slot
+
+
+def load_urlconf():
+    import api.urls
+    import urban_ride.urls
+    importlib.reload(api.urls)
+    importlib.reload(urban_ride.urls)
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = 'Compare sync DRF and async read endpoints through the ASGI handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Keep the response cache on (measures cache hits)')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            auto, creator = seed_fleet()
+            bulk_seed_slots(options['slots'], auto, creator, random.Random(7))
+            slot_ids = list(Slot.objects.values_list('id', flat=True))
+
+            caches = {} if options['with_cache'] else {
+                'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            }
+            for mode in (False, True):
+                with override_settings(ASYNC_READ_ENDPOINTS=mode, **caches):
+                    load_urlconf()
+                    stats, rps = asyncio.run(self.run(get_asgi_application(), slot_ids, options))
+                label = 'async views' if mode else 'sync DRF views'
+                self.stdout.write(
+                    f"{label:<16} {rps:8.1f} req/s  p50={stats['p50_ms']:.1f}ms "
+                    f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms"
+                )
+            load_urlconf()
+
+    async def run(self, application, slot_ids, options):
+        rng = random.Random(11)
+        remaining = options['requests']
+        samples = []
+
+        async def client():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                if rng.random() < 0.5:
+                    path, query = '/api/slots/', 'page_size=20'
+                else:
+                    path, query = f'/api/slots/{rng.choice(slot_ids)}/', ''
+                start = time.perf_counter()
+                status, _, _ = await http_request(application, path, query)
+                samples.append(time.perf_counter() - start)
+                assert status == 200, status
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - start
+        return summarize(samples), len(samples) / elapsed
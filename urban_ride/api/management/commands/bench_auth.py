@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.authentication import ClaimsJWTAuthentication, ClaimsRefreshToken, reset_token_cache
+from api.benchmarks import format_stats, measure, scratch_database
+from api.models import User
+
+
+def whoami_view(authentication_class):
+    class WhoAmI(APIView):
+        authentication_classes = [authentication_class]
+        permission_classes = [IsAuthenticated]
+
+        def get(self, request):
+            return Response({'id': request.user.pk, 'username': request.user.username})
+
+    return WhoAmI.as_view()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark authenticated requests with JWTAuthentication against ClaimsJWTAuthentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--ttl', type=int, default=30, help='AUTH_CLAIMS_CACHE_TTL for the claims runs')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with scratch_database(), override_settings(AUTH_CLAIMS_CACHE_TTL=options['ttl']):
+            users = User.objects.bulk_create(
+                User(username=f'auth{i}', email=f'auth{i}@bench.local', phone=f'9{i:09d}', user_type='CUSTOMER')
+                for i in range(options['users'])
+            )
+            requests = [
+                factory.get('/whoami/', HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+                for user in users
+            ]
+
+            for label, authentication_class in (
+                ('JWTAuthentication', JWTAuthentication),
+                ('ClaimsJWTAuthentication', ClaimsJWTAuthentication),
+            ):
+                reset_token_cache()
+                view = whoami_view(authentication_class)
+                sent = iter(range(options['requests']))
+
+                def request():
+                    response = view(requests[next(sent) % len(requests)])
+                    assert response.status_code == 200, response.data
+
+                queries = []
+
+                def count(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count):
+                    start = time.perf_counter()
+                    stats = measure(request, options['requests'])
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(format_stats(label, stats))
+                self.stdout.write(
+                    f"{'':<28} {options['requests'] / elapsed:.0f} requests/s, "
+                    f"{len(queries) / options['requests']:.3f} queries per request"
+                )
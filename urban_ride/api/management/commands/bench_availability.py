@@ -0,0 +1,65 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.availability import actual_counts, reconcile
+from api.benchmarks import (
+    bulk_seed_slots, format_stats, measure, scratch_database, seed_fleet,
+)
+from api.models import RouteAvailability, Slot, hour_bucket
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the route availability summary against aggregating slots per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma separated table sizes to measure at')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--hours', type=int, default=24, help='Hours ahead shown on the home screen')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+
+        with scratch_database():
+            auto, creator = seed_fleet()
+            seeded = 0
+            for size in sizes:
+                # bulk_create skips the signals, so build the summary the way
+                # the reconciliation job would
+                bulk_seed_slots(size - seeded, auto, creator, rng)
+                seeded = size
+                start = time.perf_counter()
+                counts = reconcile()
+                self.stdout.write(
+                    f'reconcile @ {size} slots: {time.perf_counter() - start:.2f}s, '
+                    f'{RouteAvailability.objects.count()} rows ({counts})'
+                )
+
+                since = hour_bucket(timezone.now())
+                until = since + timedelta(hours=options['hours'])
+
+                def aggregate():
+                    actual_counts(Slot.objects.filter(ride_time__gte=since, ride_time__lt=until))
+
+                def summary():
+                    list(RouteAvailability.objects.upcoming(since, until))
+
+                self.stdout.write(format_stats(f'aggregate @ {size}', measure(aggregate, options['repeat'])))
+                self.stdout.write(format_stats(f'summary @ {size}', measure(summary, options['repeat'])))
+
+                def accept():
+                    slot = Slot.objects.filter(status='PENDING_DRIVER').only(*(
+                        'id', 'status', 'start_loc', 'dest_loc', 'ride_time', 'max_capacity', 'current_capacity'
+                    )).first()
+                    slot.status = 'OPEN'
+                    slot.save(update_fields=['status'])
+
+                self.stdout.write(format_stats(f'accept + delta @ {size}', measure(accept, options['repeat'])))
+
+            self.stdout.write(f'plan: {RouteAvailability.objects.upcoming(since, until).explain()}')
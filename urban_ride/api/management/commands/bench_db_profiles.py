@@ -0,0 +1,126 @@
+import io
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, F
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.benchmarks import format_stats, scratch_database, seed_fleet, summarize
+from api.models import Slot, User
+
+
+def variants(settings_dict, threads):
+    """(label, settings_dict overrides) for the configured database's vendor."""
+    options = {key: value for key, value in settings_dict['OPTIONS'].items() if key != 'pool'}
+    if connection.vendor == 'sqlite':
+        return [
+            # What DATABASES held before the profiles: rollback journal,
+            # deferred transactions, sqlite3's 5 second timeout
+            ('sqlite, django defaults', {'OPTIONS': {'init_command': 'PRAGMA journal_mode=DELETE'}}),
+            ('sqlite, tuned profile', {'OPTIONS': settings_dict['OPTIONS']}),
+        ]
+    return [
+        ('postgres, connection per request', {'CONN_MAX_AGE': 0, 'OPTIONS': options}),
+        ('postgres, persistent', {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': options}),
+        ('postgres, pooled', {'CONN_MAX_AGE': 0, 'OPTIONS': {**options, 'pool': {'max_size': threads}}}),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent slot joins under the database profiles of the configured backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent joining clients')
+        parser.add_argument('--slots', type=int, default=20)
+        parser.add_argument('--riders', type=int, default=400, help='Joins per run, spread over the slots')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as tmp:
+            # The clients run on their own threads and connections, so an
+            # SQLite scratch database has to be a file
+            name = os.path.join(tmp, 'bench.sqlite3') if connection.vendor == 'sqlite' else None
+            with scratch_database(name=name), override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+            ):
+                settings_dict = connection.settings_dict
+                configured = {key: settings_dict.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+                try:
+                    for run, (label, overrides) in enumerate(variants(settings_dict, options['threads'])):
+                        connection.close()
+                        settings_dict.update(overrides)
+                        self.run(run, label, options)
+                finally:
+                    connection.close()
+                    settings_dict.update(configured)
+
+    def seed(self, run, options):
+        auto, creator = seed_fleet(prefix=f'bench{run}')
+        ride_time = timezone.now() + timedelta(days=1)
+        seats = -(-options['riders'] // options['slots'])
+        slots = [
+            Slot.objects.create(
+                auto=auto, creator=creator, max_capacity=seats + 1, current_capacity=1, fare=100,
+                status='OPEN', ride_time=ride_time + timedelta(minutes=i), start_loc='IITJ', dest_loc='Paota',
+            ).pk
+            for i in range(options['slots'])
+        ]
+        password = make_password('bench')
+        riders = User.objects.bulk_create(
+            User(username=f'bench{run}_joiner{i}', email=f'bench{run}_joiner{i}@bench.local',
+                 phone=f'9{i:09d}', user_type='CUSTOMER', password=password)
+            for i in range(options['riders'])
+        )
+        return [(slots[i % len(slots)], rider.pk) for i, rider in enumerate(riders)]
+
+    def run(self, run, label, options):
+        pairs = self.seed(run, options)
+        # The connection that seeded must not hold the file open in the old mode
+        connection.close()
+        shares = [pairs[i::options['threads']] for i in range(options['threads'])]
+
+        def join_all(share):
+            client = APIClient()
+            results = []
+            try:
+                for slot_id, user_id in share:
+                    start = time.perf_counter()
+                    response = client.post(
+                        reverse('slot-join', kwargs={'pk': slot_id}),
+                        {'user_id': user_id, 'convenience_fee': '10.00'},
+                    )
+                    results.append((time.perf_counter() - start, response.status_code))
+            finally:
+                connection.close()
+            return results
+
+        # The join view prints the errors it turns into 500s
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as pool:
+                results = [result for share in pool.map(join_all, shares) for result in share]
+            elapsed = time.perf_counter() - start
+
+        statuses = Counter(code for _, code in results)
+        self.stdout.write(format_stats(label, summarize([seconds for seconds, _ in results])))
+        self.stdout.write(
+            f"{'':<28} {len(results) / elapsed:.1f} joins/s, "
+            + ', '.join(f'{count} x {code}' for code, count in sorted(statuses.items()))
+        )
+
+        overbooked = Slot.objects.filter(auto__license_plate=f'BENCH{run}-0001').annotate(
+            joined=Count('participants')
+        ).exclude(current_capacity=F('joined') + 1)
+        if overbooked.exists():
+            raise CommandError(f'{label}: current_capacity out of step with participants')
@@ -0,0 +1,95 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.benchmarks import format_stats, measure, scratch_database, seed_fleet, summarize
+from api.dispatch import OfferDispatcher, TimerWheel, respond_to_offer
+from api.ingestion import ingest_slots
+from api.models import Auto, AutoQueue, DispatchOffer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark driver offer timers: a timer wheel against polling every offer, then expiry and re-offer throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timers', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Outstanding offers held in memory')
+        parser.add_argument('--offers', type=int, default=5000, help='Offers expired through the database')
+        parser.add_argument('--declines', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        timeout = settings.DISPATCH_OFFER_TIMEOUT
+        for count in options['timers']:
+            deadlines = {key: rng.uniform(0, timeout) for key in range(count)}
+            self.timers(count, deadlines, timeout)
+        with scratch_database():
+            self.expiry(options['offers'], options['declines'], rng)
+
+    def timers(self, count, deadlines, timeout):
+        # Polling: every tick checks the deadline of every outstanding offer
+        pending = dict(deadlines)
+        polled, fired = [], 0
+        for now in range(timeout + 2):
+            start = time.perf_counter()
+            due = [key for key, deadline in pending.items() if deadline <= now]
+            for key in due:
+                del pending[key]
+            polled.append(time.perf_counter() - start)
+            fired += len(due)
+
+        wheel = TimerWheel(resolution=1.0, size=settings.DISPATCH_WHEEL_SIZE)
+        start = time.perf_counter()
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+        scheduling = time.perf_counter() - start
+        ticks, wheel_fired = [], 0
+        for now in range(timeout + 2):
+            start = time.perf_counter()
+            wheel_fired += len(wheel.advance(now))
+            ticks.append(time.perf_counter() - start)
+        assert fired == wheel_fired == count, (fired, wheel_fired, count)
+
+        self.stdout.write(format_stats(f'poll tick @ {count}', summarize(polled)))
+        self.stdout.write(format_stats(f'wheel tick @ {count}', summarize(ticks)))
+        self.stdout.write(f"{'':<28} scheduling {scheduling / count * 1e6:.2f}us per offer")
+
+    def expiry(self, offers, declines, rng):
+        auto, creator = seed_fleet('dispatch')
+        autos = Auto.objects.bulk_create(
+            (Auto(driver=auto.driver, license_plate=f'DSP-{i:07d}', status='AVAILABLE')
+             for i in range(2 * offers + declines)),
+            batch_size=10000,
+        )
+        AutoQueue.objects.bulk_create((AutoQueue(auto=auto) for auto in autos), batch_size=10000)
+        ride_time = (timezone.now() + timedelta(days=1)).isoformat()
+        start = time.perf_counter()
+        ingest_slots([{'creator_id': creator.id, 'ride_time': ride_time} for _ in range(offers + declines)])
+        self.stdout.write(f'booked and offered {offers + declines} slots in {time.perf_counter() - start:.2f}s')
+
+        outstanding = iter(DispatchOffer.objects.filter(status='OFFERED').select_related('slot')[:declines])
+
+        def decline():
+            with transaction.atomic():
+                assert respond_to_offer(next(outstanding).slot, accept=False)
+        self.stdout.write(format_stats('decline + re-offer', measure(decline, declines)))
+
+        now = timezone.now()
+        dispatcher = OfferDispatcher(clock=lambda: now)
+        dispatcher.tick()
+        now += timedelta(seconds=settings.DISPATCH_OFFER_TIMEOUT + 1)
+        start = time.perf_counter()
+        dispatcher.tick()
+        elapsed = time.perf_counter() - start
+        totals = dispatcher.totals
+        self.stdout.write(
+            f"expire + re-offer: {totals['expired']} offers in {elapsed:.2f}s "
+            f"({totals['expired'] / elapsed:,.0f} offers/s), {totals['reoffered']} re-offered, "
+            f"{totals['cancelled']} cancelled"
+        )
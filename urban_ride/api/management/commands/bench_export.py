@@ -0,0 +1,74 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api.benchmarks import bulk_seed_slots, scratch_database, seed_fleet
+from api.exports import export_cursor, export_lines, export_rows
+from api.models import Slot, SlotParticipant, User
+from api.serializers import SlotParticipantSerializer
+
+
+class Command(BaseCommand):
+    help = 'Peak memory and throughput of the streaming export as the participants table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000',
+                            help='Comma separated participant counts to measure at')
+        parser.add_argument('--serializer-limit', type=int, default=10000,
+                            help='Largest size to also run through the list serializer')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+
+        # The rows are seeded just before each export, export them without waiting out the lag
+        with scratch_database(), override_settings(EXPORT_SAFETY_LAG=0):
+            auto, creator = seed_fleet()
+            riders = User.objects.bulk_create(
+                User(username=f'export_rider{i}', email=f'export_rider{i}@bench.local',
+                     phone=f'{i:010d}', user_type='CUSTOMER')
+                for i in range(4)
+            )
+            seeded = 0
+            for size in sizes:
+                # Four riders per slot, so size / 4 slots
+                bulk_seed_slots((size - seeded) // 4, auto, creator, rng)
+                new_slots = Slot.objects.filter(participants__isnull=True).values_list('id', flat=True)
+                SlotParticipant.objects.bulk_create(
+                    (SlotParticipant(slot_id=slot_id, user=rider, status='JOINED', convenience_fee=10)
+                     for slot_id in new_slots.iterator() for rider in riders),
+                    batch_size=5000,
+                )
+                seeded = SlotParticipant.objects.count()
+
+                for format_name in ('ndjson', 'csv'):
+                    self.report(f'export {format_name}', seeded, lambda: self.drain(
+                        export_lines('participants', format_name,
+                                     export_rows('participants', 0, export_cursor('participants')))
+                    ))
+                if seeded <= options['serializer_limit']:
+                    self.report('list serializer', seeded, lambda: len(
+                        SlotParticipantSerializer(SlotParticipant.objects.select_related('slot', 'user'), many=True).data
+                    ))
+
+    def drain(self, lines):
+        written = 0
+        for line in lines:
+            written += len(line)
+        return written
+
+    def report(self, label, rows, fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{label:<16} {rows:>8} rows  {elapsed:6.2f}s  '
+            f'{rows / elapsed:9.0f} rows/s  peak {peak / 1024 / 1024:7.1f} MiB'
+        )
@@ -0,0 +1,101 @@
+import io
+import os
+import tempfile
+import time
+
+from cloudinary import CloudinaryResource
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.benchmarks import format_stats, measure, scratch_database
+from api.images import FileSystemImageStorage, _image_url, get_image_uploader, image_url
+from api.models import User
+
+
+class SlowFileSystemImageStorage(FileSystemImageStorage):
+    """Stores like FileSystemImageStorage after a simulated upload round trip."""
+    delay = 0
+
+    def save(self, public_id, data):
+        time.sleep(self.delay)
+        return super().save(public_id, data)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark registration with staged profile image uploads and memoized image URLs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=40)
+        parser.add_argument('--width', type=int, default=3000)
+        parser.add_argument('--height', type=int, default=2000)
+        parser.add_argument('--upload-ms', type=float, default=250,
+                            help='Simulated storage round trip per rendition')
+        parser.add_argument('--urls', type=int, default=100000, help='URLs built in the URL comparison')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        SlowFileSystemImageStorage.delay = options['upload_ms'] / 1000
+        photo = io.BytesIO()
+        Image.effect_noise((options['width'], options['height']), 64).convert('RGB').save(photo, 'JPEG', quality=90)
+        photo = photo.getvalue()
+
+        with tempfile.TemporaryDirectory() as tmp, scratch_database(), override_settings(
+            MEDIA_ROOT=os.path.join(tmp, 'media'),
+            PROFILE_IMAGE_STAGING_DIR=os.path.join(tmp, 'staging'),
+            PROFILE_IMAGE_STORAGE=f'{__name__}.SlowFileSystemImageStorage',
+        ):
+            self.compare_registration(photo, options['users'])
+        self.compare_urls(options['urls'])
+
+    def compare_registration(self, photo, users):
+        client = APIClient()
+        uploader = get_image_uploader()
+        sent = iter(range(users * 2))
+
+        def register(inline):
+            i = next(sent)
+            response = client.post(reverse('user-list'), {
+                'username': f'img{i}', 'email': f'img{i}@bench.local', 'password': 'bench',
+                'user_type': 'CUSTOMER', 'phone': f'9{i:09d}',
+                'image': io.BytesIO(photo),
+            }, format='multipart')
+            assert response.status_code == 201, response.data
+            if inline:
+                # What the request would cost with the processing and upload kept in it
+                assert uploader.flush(timeout=60)
+
+        self.stdout.write(
+            f"{len(photo)} byte {'x'.join(map(str, Image.open(io.BytesIO(photo)).size))} JPEG per registration"
+        )
+        self.stdout.write(format_stats('register, inline upload', measure(lambda: register(True), users)))
+        stats = measure(lambda: register(False), users)
+        start = time.perf_counter()
+        assert uploader.flush(timeout=600)
+        drained = time.perf_counter() - start
+        self.stdout.write(format_stats('register, staged', stats))
+        self.stdout.write(f"{'':<28} workers caught up {drained:.2f}s after the last response")
+
+        stored = [user.image for user in User.objects.exclude(image=None)]
+        sizes = [os.path.getsize(uploader.storage.files.path(f'{image.public_id}.{image.format}')) for image in stored]
+        self.stdout.write(f"{'':<28} {len(stored)} images stored, {sum(sizes) / len(sizes):.0f} bytes on average")
+
+    def compare_urls(self, count):
+        with override_settings(PROFILE_IMAGE_STORAGE='api.images.CloudinaryImageStorage'):
+            # A page of slots renders the same few hundred users over and over
+            images = [
+                CloudinaryResource(f'profile_images/processed/{i % 500:032x}', format='jpg', version=1700000000,
+                                   type='upload', resource_type='image')
+                for i in range(count)
+            ]
+            for image in images[:5]:
+                assert image_url(image) == image.url
+            _image_url.cache_clear()
+            self.stdout.write(format_stats(
+                f'{count} urls, rebuilt', measure(lambda: [image.url for image in images], 3)
+            ))
+            self.stdout.write(format_stats(
+                f'{count} urls, memoized', measure(lambda: [image_url(image) for image in images], 3)
+            ))
@@ -0,0 +1,98 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.benchmarks import format_stats, scratch_database, seed_fleet, summarize
+from api.lifecycle import LifecycleScheduler
+from api.models import Auto, Slot
+
+
+class Command(BaseCommand):
+    help = 'Drive the lifecycle scheduler over many scheduled slots on a simulated clock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=100000)
+        parser.add_argument('--hours', type=int, default=24,
+                            help='Window the ride times are spread over')
+        parser.add_argument('--pending-share', type=float, default=0.2,
+                            help='Fraction of slots never accepted by a driver')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            for mode in ('steady', 'backlog'):
+                Auto.objects.all().delete()
+                start = timezone.now()
+                self.seed(random.Random(options['seed']), start, mode, options)
+                end = start + timedelta(hours=options['hours'], seconds=settings.SLOT_RIDE_DURATION + 1)
+                if mode == 'steady':
+                    self.steady(start, end)
+                else:
+                    self.backlog(end)
+
+    def seed(self, rng, start, prefix, options):
+        fleet_auto, creator = seed_fleet(prefix)
+        driver = fleet_auto.driver
+        count = options['slots']
+        pending = int(count * options['pending_share'])
+        autos = Auto.objects.bulk_create(
+            (Auto(driver=driver, license_plate=f'{prefix}-{i:07d}', status='QUEUED' if i < pending else 'BOOKED')
+             for i in range(count)),
+            batch_size=10000,
+        )
+        window = options['hours'] * 3600
+        Slot.objects.bulk_create(
+            (Slot(
+                auto=auto,
+                creator=creator,
+                max_capacity=4,
+                current_capacity=rng.randint(1, 4),
+                fare=100,
+                status='PENDING_DRIVER' if i < pending else rng.choice(['OPEN', 'BOOKED']),
+                ride_time=start + timedelta(seconds=rng.randint(60, window)),
+            ) for i, auto in enumerate(autos)),
+            batch_size=10000,
+        )
+
+    def steady(self, start, end):
+        """Real-time operation: the clock advances to each wake-up the scheduler asks for."""
+        now = start
+        scheduler = LifecycleScheduler(clock=lambda: now)
+        tick_samples = []
+        began = time.perf_counter()
+        while now < end:
+            tick_began = time.perf_counter()
+            delay = scheduler.tick()
+            tick_samples.append(time.perf_counter() - tick_began)
+            now += timedelta(seconds=delay)
+        wall = time.perf_counter() - began
+        simulated = (end - start).total_seconds()
+        self.stdout.write(format_stats('steady tick', summarize(tick_samples)))
+        self.stdout.write(
+            f'steady: {simulated / 3600:.1f}h simulated in {wall:.1f}s wall '
+            f'({simulated / wall:,.0f}x real time), {self.describe(scheduler)}'
+        )
+
+    def backlog(self, end):
+        """Worker was down for the whole window: everything is due at once."""
+        scheduler = LifecycleScheduler(clock=lambda: end)
+        began = time.perf_counter()
+        scheduler.tick()
+        wall = time.perf_counter() - began
+        handled = scheduler.totals['expired'] + scheduler.totals['finalized']
+        self.stdout.write(
+            f'backlog: {handled} slots in {wall:.1f}s ({handled / wall:,.0f} slots/s), '
+            f'{self.describe(scheduler)}'
+        )
+
+    def describe(self, scheduler):
+        totals = scheduler.totals
+        left = Slot.objects.filter(status__in=('PENDING_DRIVER', 'OPEN', 'BOOKED')).count()
+        return (
+            f"expired {totals['expired']}, finalized {totals['finalized']}, "
+            f"recycled {totals['recycled']} autos, {left} slots still active"
+        )
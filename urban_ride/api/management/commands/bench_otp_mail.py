@@ -0,0 +1,53 @@
+import smtplib
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.auth_views import build_otp_email
+from api.fakesmtp import FakeSMTPServer
+from api.mailer import MailDispatcher, SMTPConnectionPool
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request SMTP sessions with the pooled background dispatcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--handshake-ms', type=float, default=20,
+                            help='Simulated server delay for greeting and AUTH')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        server = FakeSMTPServer(handshake_delay=options['handshake_ms'] / 1000).start()
+        messages = [build_otp_email(f'rider{i}@bench.local', '123456') for i in range(count)]
+        try:
+            start = time.perf_counter()
+            for message in messages:
+                with smtplib.SMTP('127.0.0.1', server.port) as session:
+                    session.login('bench', 'bench')
+                    session.send_message(message)
+            self.report('connection per message', count, time.perf_counter() - start, server)
+
+            server.connections = server.logins = 0
+            pool = SMTPConnectionPool('127.0.0.1', server.port, 'bench', 'bench',
+                                      use_tls=False, size=options['workers'])
+            dispatcher = MailDispatcher(pool, workers=options['workers'],
+                                        batch_size=options['batch_size'])
+            start = time.perf_counter()
+            for message in messages:
+                dispatcher.submit(message)
+            enqueued = time.perf_counter() - start
+            dispatcher.flush()
+            self.report('pooled dispatcher', count, time.perf_counter() - start, server)
+            self.stdout.write(f'{"":<24} request-side enqueue cost {enqueued / count * 1e6:.1f}us/message')
+            dispatcher.shutdown()
+        finally:
+            server.stop()
+
+    def report(self, label, count, elapsed, server):
+        self.stdout.write(
+            f'{label:<24} {count / elapsed:9.1f} msgs/s  '
+            f'connections={server.connections} logins={server.logins}'
+        )
@@ -0,0 +1,109 @@
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.benchmarks import format_stats, scratch_database, summarize
+
+
+class Command(BaseCommand):
+    help = 'Benchmark registration and bulk import throughput with password hashing inline and on 1..N worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent registering clients')
+        parser.add_argument('--registrations', type=int, default=96, help='Registrations per run')
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--import-rows', type=int, default=400)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        self.stdout.write(f'{os.cpu_count()} cores')
+        counts = [0] + sorted({1, *(2 ** i for i in range(8) if 2 ** i <= options['max_workers']),
+                               options['max_workers']})
+        with tempfile.TemporaryDirectory() as tmp:
+            # Clients run on their own threads and connections, so an SQLite
+            # scratch database has to be a file
+            name = os.path.join(tmp, 'bench.sqlite3') if connection.vendor == 'sqlite' else None
+            with scratch_database(name=name), override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                PASSWORD_HASHING_QUEUE_SIZE=options['threads'],
+            ):
+                for run, workers in enumerate(counts):
+                    with override_settings(PASSWORD_HASHING_WORKERS=workers):
+                        self.register(run, workers, options)
+                for run, workers in enumerate(sorted({0, options['max_workers']})):
+                    self.bulk_import(run, workers, options['import_rows'], tmp)
+
+    def register(self, run, workers, options):
+        label = f'register, {workers} workers' if workers else 'register, inline'
+        sent = iter(range(options['registrations']))
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def client_loop(_):
+            client = APIClient()
+            results = []
+            try:
+                while True:
+                    with lock:
+                        i = next(sent, None)
+                    if i is None:
+                        return results
+                    start = time.perf_counter()
+                    response = client.post(reverse('user-list'), {
+                        'username': f'reg{run}_{i}', 'email': f'reg{run}_{i}@bench.local', 'password': 'bench-pass',
+                        'user_type': 'CUSTOMER', 'phone': f'9{i:09d}',
+                    })
+                    assert response.status_code == 201, response.data
+                    results.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        def probe():
+            # A cheap request sharing the server with the sign-ups
+            client = APIClient()
+            latencies = []
+            try:
+                while not done.is_set():
+                    start = time.perf_counter()
+                    client.get(reverse('auto-list'))
+                    latencies.append(time.perf_counter() - start)
+                    time.sleep(0.01)
+            finally:
+                connection.close()
+            return latencies
+
+        with ThreadPoolExecutor(options['threads'] + 1) as pool:
+            probing = pool.submit(probe)
+            start = time.perf_counter()
+            samples = [s for share in pool.map(client_loop, range(options['threads'])) for s in share]
+            elapsed = time.perf_counter() - start
+            done.set()
+            probed = probing.result()
+
+        self.stdout.write(format_stats(label, summarize(samples)))
+        self.stdout.write(f"{'':<28} {len(samples) / elapsed:.1f} registrations/s")
+        self.stdout.write(format_stats('  GET /api/autos/ meanwhile', summarize(probed)))
+
+    def bulk_import(self, run, workers, rows, tmp):
+        path = os.path.join(tmp, f'import{run}.csv')
+        with open(path, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(['username', 'email', 'phone', 'user_type', 'password'])
+            for i in range(rows):
+                writer.writerow([f'imp{run}_{i}', f'imp{run}_{i}@bench.local', f'8{i:09d}', 'CUSTOMER', f'pass{i}'])
+        start = time.perf_counter()
+        call_command('import_users', path, '--workers', str(workers), stdout=io.StringIO())
+        elapsed = time.perf_counter() - start
+        label = f'import_users, {workers} workers' if workers else 'import_users, inline'
+        self.stdout.write(f'{label:<28} {rows} users in {elapsed:.2f}s, {rows / elapsed:.1f} users/s')
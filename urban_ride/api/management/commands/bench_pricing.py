@@ -0,0 +1,66 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.pricing import LOCATION_CODES, quote, quote_batch
+from api.views import PricingViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compare pricing quotes one at a time against one vectorized batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,10000',
+                            help='Comma separated batch sizes to measure at')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        view = PricingViewSet.as_view({'post': 'quotes'})
+        factory = APIRequestFactory()
+
+        for size in sorted(int(size) for size in options['sizes'].split(',')):
+            items = list(self.synthetic_quotes(rng, size))
+            parsed = [dict(item, ride_time=timezone.datetime.fromisoformat(item['ride_time'])) for item in items]
+
+            single = self.timed(lambda: [
+                quote(item['start_loc'], item['dest_loc'], item['ride_time'], item['seats'])
+                for item in parsed
+            ])
+            batch = self.timed(lambda: quote_batch(items))
+            single_http = self.timed(lambda: [self.post(view, factory, [item]) for item in items[:1000]])
+            single_http *= size / min(size, 1000)
+            batch_http = self.timed(lambda: self.post(view, factory, items))
+
+            self.stdout.write(
+                f'{size:>6} quotes  quote() loop {single * 1000:9.2f}ms  '
+                f'quote_batch {batch * 1000:8.2f}ms ({single / batch:5.1f}x)  '
+                f'API singles {single_http * 1000:9.2f}ms  API batch {batch_http * 1000:8.2f}ms '
+                f'({single_http / batch_http:5.1f}x)'
+            )
+
+    def synthetic_quotes(self, rng, count):
+        start = timezone.now()
+        for _ in range(count):
+            start_loc, dest_loc = rng.sample(LOCATION_CODES, 2)
+            yield {
+                'start_loc': start_loc,
+                'dest_loc': dest_loc,
+                'ride_time': (start + timedelta(minutes=rng.randint(0, 7 * 24 * 60))).isoformat(),
+                'seats': rng.randint(1, 4),
+            }
+
+    def post(self, view, factory, items):
+        response = view(factory.post('/api/pricing/quotes/', {'quotes': items}, format='json'))
+        response.render()
+        assert response.status_code == 200, response.data
+        return response
+
+    def timed(self, fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
@@ -0,0 +1,41 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import modify_settings, override_settings, setup_test_environment
+from django.urls import reverse
+
+from api.benchmarks import bulk_seed_slots, format_stats, measure, scratch_database, seed_fleet
+
+MODES = (
+    ('not installed', modify_settings(MIDDLEWARE={'remove': 'api.profiling.ProfilingMiddleware'})),
+    ('sampling off', override_settings(PROFILING_SAMPLE_RATE=0.0)),
+    ('sample 1%', override_settings(PROFILING_SAMPLE_RATE=0.01)),
+    ('sample all', override_settings(PROFILING_SAMPLE_RATE=1.0)),
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure the request overhead of the profiling middleware at different sample rates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with scratch_database(), override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        ):
+            auto, creator = seed_fleet()
+            bulk_seed_slots(options['slots'], auto, creator, random.Random(3))
+            paths = [reverse('slot-search'), reverse('route-availability')]
+
+            for label, mode in MODES:
+                with mode:
+                    # A new client loads the middleware chain under this mode
+                    client = Client()
+                    for path in paths:
+                        client.get(path)
+                        stats = measure(lambda: client.get(path), options['repeat'])
+                        self.stdout.write(format_stats(f'{label} {path}', stats))
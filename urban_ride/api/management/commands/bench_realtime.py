@@ -0,0 +1,58 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.asgi_testing import WebsocketCommunicator
+from api.realtime import WEBSOCKET_PATH, get_hub, route_topic, websocket_application
+
+
+class Command(BaseCommand):
+    help = 'Connect many idle WebSocket subscribers and measure memory and fan-out latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=10000)
+        parser.add_argument('--hot-share', type=float, default=0.1,
+                            help='Fraction of subscribers watching the route that gets published to')
+        parser.add_argument('--messages', type=int, default=20)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        total = options['subscribers']
+        hot = int(total * options['hot_share'])
+        hub = get_hub()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        clients = []
+        for i in range(total):
+            query = 'route=IITJ-Paota' if i < hot else f'slot={i}'
+            client = WebsocketCommunicator(websocket_application, WEBSOCKET_PATH, query)
+            await client.connect()
+            clients.append(client)
+        connected = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'connected {total} subscribers in {connected:.2f}s, '
+            f'{memory / total / 1024:.1f} KiB traced per subscriber'
+        )
+
+        topic = route_topic('IITJ', 'Paota')
+        latencies = []
+        for i in range(options['messages']):
+            start = time.perf_counter()
+            hub.publish(topic, {'event': 'slot.updated', 'slot': {'id': i}})
+            await asyncio.gather(*(client.receive_json(timeout=10) for client in clients[:hot]))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        self.stdout.write(
+            f'fan-out to {hot} subscribers: p50={latencies[len(latencies) // 2] * 1000:.2f}ms '
+            f'max={latencies[-1] * 1000:.2f}ms'
+        )
+
+        await asyncio.gather(*(client.disconnect(timeout=10) for client in clients))
+        self.stdout.write(f'subscribers left on hot topic: {hub.subscriber_count(topic)}')
@@ -0,0 +1,108 @@
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.benchmarks import format_stats, scratch_database, seed_fleet, summarize
+from api.matching import RouteIndex, get_matching_engine, reset_matching_engine
+from api.models import Slot, User
+
+
+class Command(BaseCommand):
+    help = 'Replay synthetic ride requests through the matcher and count the autos it saves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--hours', type=int, default=24,
+                            help='Spread of requested ride times')
+        parser.add_argument('--window', type=int, default=15,
+                            help='Matching window in minutes')
+        parser.add_argument('--capacity', type=int, default=4)
+        parser.add_argument('--db-requests', type=int, default=2000,
+                            help='Requests to replay end to end against a scratch database, 0 to skip')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.replay_in_memory(rng, options)
+        if options['db_requests']:
+            self.replay_against_database(rng, options)
+
+    def synthetic_requests(self, rng, count, hours, start):
+        locations = [code for code, _ in Slot.LOCATIONS]
+        for _ in range(count):
+            start_loc, dest_loc = rng.sample(locations, 2)
+            yield start_loc, dest_loc, start + timedelta(seconds=rng.randint(0, hours * 3600))
+
+    def replay_in_memory(self, rng, options):
+        """Index lookups and seat bookkeeping only, no database."""
+        routes = defaultdict(RouteIndex)
+        window = options['window'] * 60
+        next_slot_id = 0
+        autos = 0
+        samples = []
+
+        start = timezone.now()
+        for start_loc, dest_loc, ride_time in self.synthetic_requests(
+            rng, options['requests'], options['hours'], start
+        ):
+            timestamp = ride_time.timestamp()
+            began = time.perf_counter()
+            route = routes[(start_loc, dest_loc)]
+            candidates = route.candidates(timestamp, window, limit=1)
+            if candidates:
+                route.take_seats(candidates[0].slot_id)
+            else:
+                next_slot_id += 1
+                autos += 1
+                route.upsert(next_slot_id, timestamp, options['capacity'] - 1)
+            samples.append(time.perf_counter() - began)
+
+        self.report('in-memory match', samples, options['requests'], autos)
+        largest = max(len(route) for route in routes.values())
+        self.stdout.write(f'open slots left in the largest route index: {largest}')
+
+    def replay_against_database(self, rng, options):
+        """join_best() end to end, including the seat reservation."""
+        count = options['db_requests']
+        with scratch_database():
+            reset_matching_engine()
+            auto, _ = seed_fleet()
+            riders = User.objects.bulk_create(
+                User(username=f'match_rider{i}', email=f'match_rider{i}@bench.local',
+                     phone=f'{i:010d}', user_type='CUSTOMER')
+                for i in range(count)
+            )
+            engine = get_matching_engine()
+            engine.ensure_loaded()
+
+            autos = 0
+            samples = []
+            start = timezone.now() + timedelta(hours=1)
+            requests = self.synthetic_requests(rng, count, options['hours'], start)
+            for rider, (start_loc, dest_loc, ride_time) in zip(riders, requests):
+                began = time.perf_counter()
+                participant = engine.join_best(rider, start_loc, dest_loc, ride_time, options['window'])
+                if participant is None:
+                    # Stands in for create_slot_from_queue without draining a queue
+                    autos += 1
+                    Slot.objects.create(
+                        auto=auto, creator=rider, max_capacity=options['capacity'],
+                        current_capacity=1, fare=100, status='OPEN',
+                        ride_time=ride_time, start_loc=start_loc, dest_loc=dest_loc,
+                    )
+                samples.append(time.perf_counter() - began)
+            reset_matching_engine()
+
+        self.report('database match', samples, count, autos)
+
+    def report(self, label, samples, requests, autos):
+        self.stdout.write(format_stats(label, summarize(samples)))
+        saved = requests - autos
+        self.stdout.write(
+            f'{label}: {requests} requests used {autos} autos, '
+            f'{saved} saved ({saved / requests:.1%}) against one auto per request'
+        )
@@ -0,0 +1,69 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import format_stats, measure, scratch_database
+from api.fast_serializers import compile_serializer
+from api.loadtest import seed
+from api.renderers import FastJSONRenderer
+from api.serializers import SlotSerializer
+from api.views import slot_detail_queryset
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the compiled read serializers and orjson against DRF serializers and JSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=10000)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--drivers', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs over every slot')
+        parser.add_argument('--requests', type=int, default=200, help='List pages requested per mode')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with scratch_database(), override_settings(
+            # No response cache, so every request renders
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        ):
+            seed(options['customers'], options['drivers'], options['slots'], rng=random.Random(options['seed']))
+            slots = list(slot_detail_queryset(SlotSerializer()).order_by('id'))
+            self.stdout.write(
+                f"{len(slots)} slots, {sum(len(slot.participants.all()) for slot in slots)} participants"
+            )
+            self.compare_serializers(slots, options['repeat'])
+            self.compare_requests(options['requests'], options['page_size'])
+
+    def compare_serializers(self, slots, repeat):
+        drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        expected = drf_renderer.render(SlotSerializer(slots, many=True).data)
+        if fast_renderer.render(compile_serializer(SlotSerializer()).many(slots)) != expected:
+            raise CommandError('compiled output differs from SlotSerializer')
+        self.stdout.write(f'{len(expected)} bytes, identical')
+
+        stages = {
+            'drf serialize': lambda: SlotSerializer(slots, many=True).data,
+            'compiled serialize': lambda: compile_serializer(SlotSerializer()).many(slots),
+            'drf serialize+render': lambda: drf_renderer.render(SlotSerializer(slots, many=True).data),
+            'compiled+orjson': lambda: fast_renderer.render(compile_serializer(SlotSerializer()).many(slots)),
+        }
+        for label, stage in stages.items():
+            self.stdout.write(format_stats(label, measure(stage, repeat)))
+
+    def compare_requests(self, requests, page_size):
+        client = Client()
+        pages = {}
+        for fast in (False, True):
+            with override_settings(FAST_READ_SERIALIZERS=fast):
+                def page():
+                    response = client.get('/api/slots/', {'page_size': page_size})
+                    pages[fast] = response.content
+                label = f"GET /api/slots/ {'fast' if fast else 'drf'}"
+                self.stdout.write(format_stats(label, measure(page, requests)))
+        if pages[False] != pages[True]:
+            raise CommandError('fast list page differs from the DRF one')
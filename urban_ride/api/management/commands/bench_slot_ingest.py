@@ -0,0 +1,99 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmarks import scratch_database, seed_fleet
+from api.models import Auto, AutoQueue, Slot, User
+from api.views import SlotBulkCreateView, SlotCreateView
+
+
+class Command(BaseCommand):
+    help = 'Compare creating slots one request at a time against one bulk request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=10000)
+        parser.add_argument('--ndjson', action='store_true',
+                            help='Send the bulk request as NDJSON instead of a JSON array')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        count = options['slots']
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+
+        with scratch_database():
+            auto, creator = seed_fleet()
+            rows = list(self.synthetic_rows(rng, count, creator.id))
+
+            self.queue_autos(auto.driver, count, 'ONE')
+            view = SlotCreateView.as_view()
+            elapsed, queries = self.timed(lambda: [
+                self.expect_created(view(factory.post('/api/slots/create/', row, format='json')))
+                for row in rows
+            ])
+            self.report('per-request /slots/create/', count, elapsed, queries)
+
+            self.queue_autos(auto.driver, count, 'BULK')
+            view = SlotBulkCreateView.as_view()
+            if options['ndjson']:
+                body = '\n'.join(json.dumps(row) for row in rows)
+                request = factory.post('/api/slots/bulk/', body, content_type='application/x-ndjson')
+            else:
+                request = factory.post('/api/slots/bulk/', rows, format='json')
+            force_authenticate(request, user=User(username='bench_admin', is_staff=True))
+            elapsed, queries = self.timed(lambda: self.expect_created(view(request), created=count))
+            self.report('bulk /slots/bulk/', count, elapsed, queries)
+
+            self.stdout.write(f'slots stored: {Slot.objects.count()}')
+
+    def synthetic_rows(self, rng, count, creator_id):
+        locations = [code for code, _ in Slot.LOCATIONS]
+        start = timezone.now() + timedelta(days=1)
+        for _ in range(count):
+            start_loc, dest_loc = rng.sample(locations, 2)
+            yield {
+                'creator_id': creator_id,
+                'ride_time': (start + timedelta(minutes=rng.randint(0, 90 * 24 * 60))).isoformat(),
+                'start_loc': start_loc,
+                'dest_loc': dest_loc,
+                'max_capacity': 4,
+            }
+
+    def queue_autos(self, driver, count, prefix):
+        autos = Auto.objects.bulk_create(
+            Auto(driver=driver, license_plate=f'{prefix}-{i:06d}', status='AVAILABLE')
+            for i in range(count)
+        )
+        AutoQueue.objects.bulk_create(AutoQueue(auto=auto) for auto in autos)
+
+    def expect_created(self, response, created=None):
+        assert response.status_code == 201, response.data
+        if created is not None:
+            assert len(response.data['created']) == created, response.data['errors'][:5]
+
+    def timed(self, fn):
+        # Counted with a wrapper: the debug query log is capped at 9000 entries
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        return elapsed, queries
+
+    def report(self, label, count, elapsed, queries):
+        self.stdout.write(
+            f'{label:<28} {count} slots in {elapsed:7.2f}s  '
+            f'{count / elapsed:8.0f} slots/s  {queries} queries'
+        )
@@ -0,0 +1,57 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import (
+    bulk_seed_slots, format_stats, measure, scratch_database, seed_fleet,
+)
+from api.models import Slot
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the slot search query as the slots table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma separated table sizes to measure at')
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--drop-index', action='store_true',
+                            help='Measure without slot_search_idx for comparison')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+        locations = [code for code, _ in Slot.LOCATIONS]
+
+        with scratch_database():
+            if options['drop_index']:
+                with connection.schema_editor() as editor:
+                    index = next(index for index in Slot._meta.indexes if index.name == 'slot_search_idx')
+                    editor.remove_index(Slot, index)
+
+            auto, creator = seed_fleet()
+            seeded = 0
+            for size in sizes:
+                bulk_seed_slots(size - seeded, auto, creator, rng)
+                seeded = size
+
+                def search():
+                    start_loc, dest_loc = rng.sample(locations, 2)
+                    after = timezone.now() + timedelta(hours=rng.randint(0, 60 * 24))
+                    list(Slot.objects.search(
+                        start_loc=start_loc,
+                        dest_loc=dest_loc,
+                        ride_time_after=after,
+                        ride_time_before=after + timedelta(hours=2),
+                    ).order_by('ride_time', 'id')[:50])
+
+                stats = measure(search, options['repeat'])
+                self.stdout.write(format_stats(f'search @ {size} slots', stats))
+
+            query = Slot.objects.search(start_loc='IITJ', dest_loc='Paota',
+                                        ride_time_after=timezone.now())
+            self.stdout.write(f'plan: {query.explain()}')
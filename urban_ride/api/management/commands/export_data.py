@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.exports import DATASETS, FORMATS, export_cursor, export_lines, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream slots, participants or ride history to a file or stdout as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', dest='export_format')
+        parser.add_argument('--since', type=int, default=0,
+                            help='Only rows with an id above this, e.g. the cursor of the last export')
+        parser.add_argument('--output', help='File to write; stdout when left out')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        dataset = options['dataset']
+        cursor = export_cursor(dataset, options['since'])
+        rows = export_rows(dataset, options['since'], cursor, options['chunk_size'])
+        lines = export_lines(dataset, options['export_format'], rows)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        # stderr so it never ends up inside an export piped from stdout
+        self.stderr.write(f'cursor: {cursor}')
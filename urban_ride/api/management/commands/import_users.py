@@ -0,0 +1,85 @@
+import csv
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from api.hashing import PasswordHashingPool
+from api.models import User
+
+REQUIRED_COLUMNS = ('username', 'email', 'phone', 'user_type', 'password')
+OPTIONAL_COLUMNS = ('college', 'address')
+
+
+class Command(BaseCommand):
+    help = 'Create users from a CSV file, hashing their passwords in parallel on worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help=f"CSV with the columns {', '.join(REQUIRED_COLUMNS + OPTIONAL_COLUMNS)}; "
+                                         'the last two may be left out, and a blank password makes it unusable')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Hashing processes; PASSWORD_HASHING_WORKERS when left out, 0 hashes inline')
+
+    def handle(self, *args, **options):
+        workers = settings.PASSWORD_HASHING_WORKERS if options['workers'] is None else options['workers']
+        pool = PasswordHashingPool(workers)
+        user_types = {value for value, _ in User.USER_TYPES}
+        seen_usernames, seen_emails = set(), set()
+        created = skipped = 0
+        try:
+            with open(options['path'], newline='') as source:
+                reader = csv.DictReader(source)
+                missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+                if missing:
+                    raise CommandError(f"missing columns: {', '.join(missing)}")
+
+                rows = enumerate(reader, start=2)
+                while batch := list(islice(rows, options['batch_size'])):
+                    valid = []
+                    for line, row in batch:
+                        error = self.check_row(row, user_types, seen_usernames, seen_emails)
+                        if error:
+                            self.stderr.write(f'line {line}: {error}')
+                            skipped += 1
+                            continue
+                        seen_usernames.add(row['username'])
+                        seen_emails.add(row['email'])
+                        valid.append((line, row))
+
+                    usernames = [row['username'] for _, row in valid]
+                    emails = [row['email'] for _, row in valid]
+                    taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+                    taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+                    new = []
+                    for line, row in valid:
+                        if row['username'] in taken_usernames or row['email'] in taken_emails:
+                            self.stderr.write(f'line {line}: username or email already taken')
+                            skipped += 1
+                        else:
+                            new.append(row)
+
+                    passwords = pool.map(make_password, [row['password'] or None for row in new])
+                    User.objects.bulk_create(
+                        User(
+                            username=row['username'], email=row['email'], phone=row['phone'],
+                            user_type=row['user_type'], password=password,
+                            college=row.get('college') or None, address=row.get('address') or None,
+                        )
+                        for row, password in zip(new, passwords)
+                    )
+                    created += len(new)
+        finally:
+            pool.shutdown()
+        self.stdout.write(f'{created} users imported, {skipped} skipped')
+
+    def check_row(self, row, user_types, seen_usernames, seen_emails):
+        for column in REQUIRED_COLUMNS[:-1]:
+            if not row.get(column):
+                return f'{column} is blank'
+        if row['user_type'] not in user_types:
+            return f"unknown user_type {row['user_type']!r}"
+        if row['username'] in seen_usernames or row['email'] in seen_emails:
+            return 'duplicate of an earlier row'
+        return None
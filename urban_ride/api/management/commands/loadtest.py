@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from api.benchmarks import scratch_database
+from api.loadtest import (
+    ASGITransport, HTTPTransport, LoadTest, format_report, live_server, regressions, seed,
+)
+
+
+class Command(BaseCommand):
+    help = 'Seed a scratch database and load test register, auto, slot, accept, join and list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', choices=('asgi', 'live'), default='asgi',
+                            help='In-process ASGI application, or HTTP to the live test server')
+        parser.add_argument('--concurrency', type=int, default=10, help='Virtual users')
+        parser.add_argument('--iterations', type=int, default=200, help='Flows run in total')
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--drivers', type=int, default=100)
+        parser.add_argument('--slots', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json-out', help='Write the report to this file')
+        parser.add_argument('--baseline', help='Fail when worse than the report in this file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95/throughput regression against --baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if options['drivers'] < 2:
+            raise CommandError('--drivers must be at least 2')
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as tmp:
+            # Requests run on their own threads, each with its own connection,
+            # so an SQLite scratch database has to be a file
+            name = os.path.join(tmp, 'loadtest.sqlite3') if connection.vendor == 'sqlite' else None
+            with scratch_database(name=name), override_settings(
+                # Keep the shared file cache of the configured settings out of it
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+            ):
+                riders = seed(options['customers'], options['drivers'], options['slots'],
+                              rng=random.Random(options['seed']))
+                self.stdout.write(
+                    f"seeded {options['customers']} riders, {options['drivers']} drivers, "
+                    f"{options['slots']} slots"
+                )
+                report = self.run(riders, options)
+
+        self.stdout.write(format_report(report))
+        if options['json_out']:
+            with open(options['json_out'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                found = regressions(report, json.load(f), options['tolerance'])
+            if found:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(found))
+            self.stdout.write('no regressions against baseline')
+
+    def run(self, riders, options):
+        def load_test(transport):
+            test = LoadTest(transport, riders, options['concurrency'], options['iterations'], options['seed'])
+            try:
+                return asyncio.run(test.run()).summary()
+            finally:
+                transport.close()
+
+        if options['transport'] == 'live':
+            with live_server() as url:
+                return load_test(HTTPTransport(url, options['concurrency']))
+        return load_test(ASGITransport())
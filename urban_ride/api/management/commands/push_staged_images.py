@@ -0,0 +1,21 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from api.images import get_image_uploader, staged_uploads
+
+
+class Command(BaseCommand):
+    help = 'Process and push profile image uploads left staged by a worker process that stopped'
+
+    def handle(self, *args, **options):
+        newest = {}
+        for user_id, path in staged_uploads():
+            if user_id in newest:
+                os.remove(newest[user_id])
+            newest[user_id] = path
+
+        uploader = get_image_uploader()
+        for user_id, path in newest.items():
+            uploader.process(user_id, path)
+        self.stdout.write(f'{len(newest)} staged uploads pushed')
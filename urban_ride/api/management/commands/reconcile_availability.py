@@ -0,0 +1,41 @@
+import signal
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.availability import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-route availability summary from the slots table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Reconcile once and exit, e.g. from cron')
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Seconds between runs (default AVAILABILITY_RECONCILE_INTERVAL)')
+
+    def reconcile(self):
+        since = timezone.now() - timedelta(hours=settings.AVAILABILITY_KEEP_HOURS)
+        counts = reconcile(since=since)
+        self.stdout.write(
+            f"created {counts['created']}, updated {counts['updated']}, "
+            f"deleted {counts['deleted']} rows"
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.reconcile()
+            return
+
+        interval = options['interval'] or settings.AVAILABILITY_RECONCILE_INTERVAL
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        self.stdout.write('availability reconciler running')
+        while not stop.is_set():
+            self.reconcile()
+            stop.wait(interval)
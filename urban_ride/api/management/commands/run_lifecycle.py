@@ -0,0 +1,36 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api.lifecycle import LifecycleScheduler
+
+
+class Command(BaseCommand):
+    help = 'Expire unaccepted slots, finalize finished rides and return their autos to the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process everything due now and exit, e.g. from cron')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--refresh-interval', type=int, default=None,
+                            help='Seconds between schedule reloads from the database')
+        parser.add_argument('--max-sleep', type=float, default=None,
+                            help='Upper bound on the idle wait between ticks, in seconds')
+
+    def handle(self, *args, **options):
+        scheduler = LifecycleScheduler(options['batch_size'], options['refresh_interval'])
+        if options['once']:
+            scheduler.tick()
+        else:
+            stop = threading.Event()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stop.set())
+            self.stdout.write('lifecycle worker running')
+            scheduler.run(stop, options['max_sleep'])
+
+        totals = scheduler.totals
+        self.stdout.write(
+            f"expired {totals['expired']}, finalized {totals['finalized']}, "
+            f"recycled {totals['recycled']} autos"
+        )
@@ -0,0 +1,230 @@
+"""
+Ride matching: pool riders into existing open slots before spending an auto.
+
+Each process keeps an in-memory index per (start_loc, dest_loc) route: a list
+of (ride_time, slot_id) kept sorted, plus the free seats of each slot.
+Finding the candidates around a rider's preferred time is a binary search
+followed by a scan of the slots inside the window. The index is only a
+shortlist; seats are always reserved through Slot.objects.reserve_seat, so a
+stale entry costs a retry, never an overbooking. Signals keep the index
+current for writes made by this process and it is rebuilt from the database
+every MATCHING_INDEX_TTL seconds to pick up everyone else's.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, models, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Slot, SlotParticipant
+from .pricing import quote_slot
+from .realtime import publish_slot_update
+
+
+class SlotEntry:
+    __slots__ = ('slot_id', 'ride_time', 'free_seats', 'creator_id')
+
+    def __init__(self, slot_id, ride_time, free_seats, creator_id=None):
+        self.slot_id = slot_id
+        self.ride_time = ride_time
+        self.free_seats = free_seats
+        self.creator_id = creator_id
+
+
+class RouteIndex:
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def upsert(self, slot_id, ride_time, free_seats, creator_id=None):
+        entry = self._entries.get(slot_id)
+        if entry is not None and entry.ride_time != ride_time:
+            self.remove(slot_id)
+            entry = None
+        if entry is None:
+            bisect.insort(self._keys, (ride_time, slot_id))
+            self._entries[slot_id] = SlotEntry(slot_id, ride_time, free_seats, creator_id)
+        else:
+            entry.free_seats = free_seats
+
+    def remove(self, slot_id):
+        entry = self._entries.pop(slot_id, None)
+        if entry is not None:
+            index = bisect.bisect_left(self._keys, (entry.ride_time, slot_id))
+            del self._keys[index]
+
+    def take_seats(self, slot_id, seats=1):
+        entry = self._entries.get(slot_id)
+        if entry is not None:
+            entry.free_seats -= seats
+            if entry.free_seats <= 0:
+                self.remove(slot_id)
+
+    def candidates(self, ride_time, window, seats=1, exclude_creator=None, limit=5, now=None):
+        """
+        Slots leaving within window seconds of ride_time, and not before now,
+        with enough free seats, closest departure first and, on ties, the
+        fuller slot first so riders are packed into as few autos as possible.
+        """
+        low = ride_time - window
+        if now is not None:
+            # Departed slots stay indexed until the next rebuild
+            low = max(low, now)
+        low = bisect.bisect_left(self._keys, (low,))
+        high = bisect.bisect_right(self._keys, (ride_time + window, float('inf')))
+        matches = []
+        for _, slot_id in self._keys[low:high]:
+            entry = self._entries[slot_id]
+            if entry.free_seats < seats:
+                continue
+            if exclude_creator is not None and entry.creator_id == exclude_creator:
+                continue
+            matches.append(entry)
+        matches.sort(key=lambda entry: (abs(entry.ride_time - ride_time), entry.free_seats))
+        return matches[:limit]
+
+
+class MatchingEngine:
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._routes = defaultdict(RouteIndex)
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.rebuild()
+
+    def rebuild(self):
+        rows = Slot.objects.filter(
+            status='OPEN',
+            ride_time__gte=timezone.now(),
+            current_capacity__lt=models.F('max_capacity'),
+        ).values_list('id', 'start_loc', 'dest_loc', 'ride_time', 'max_capacity',
+                      'current_capacity', 'creator_id')
+        routes = defaultdict(RouteIndex)
+        for slot_id, start_loc, dest_loc, ride_time, max_capacity, current_capacity, creator_id in rows:
+            routes[(start_loc, dest_loc)].upsert(
+                slot_id, ride_time.timestamp(), max_capacity - current_capacity, creator_id
+            )
+        with self._lock:
+            self._routes = routes
+            self._loaded_at = time.monotonic()
+
+    def slot_changed(self, slot_id):
+        if not self.loaded:
+            return
+        # Re-read the row: the saved instance may carry a stale capacity or
+        # an unparsed ride_time
+        row = Slot.objects.filter(pk=slot_id).values_list(
+            'start_loc', 'dest_loc', 'ride_time', 'max_capacity', 'current_capacity',
+            'creator_id', 'status',
+        ).first()
+        with self._lock:
+            # A slot may have moved route; drop it everywhere before re-adding
+            for route in self._routes.values():
+                route.remove(slot_id)
+            if row is None:
+                return
+            start_loc, dest_loc, ride_time, max_capacity, current_capacity, creator_id, slot_status = row
+            free_seats = max_capacity - current_capacity
+            if slot_status == 'OPEN' and free_seats > 0:
+                self._routes[(start_loc, dest_loc)].upsert(
+                    slot_id, ride_time.timestamp(), free_seats, creator_id
+                )
+
+    def slot_removed(self, slot_id):
+        with self._lock:
+            for route in self._routes.values():
+                route.remove(slot_id)
+
+    def seat_taken(self, slot_id, seats=1):
+        if not self.loaded:
+            return
+        with self._lock:
+            for route in self._routes.values():
+                route.take_seats(slot_id, seats)
+
+    def candidates(self, start_loc, dest_loc, ride_time, window_minutes, exclude_creator=None):
+        self.ensure_loaded()
+        with self._lock:
+            route = self._routes.get((start_loc, dest_loc))
+            if route is None:
+                return []
+            return route.candidates(ride_time.timestamp(), window_minutes * 60,
+                                    exclude_creator=exclude_creator, now=time.time())
+
+    def join_best(self, user, start_loc, dest_loc, ride_time, window_minutes):
+        """
+        Joins user to the best ranked open slot and returns the participant,
+        or None when no candidate had a seat left. The convenience fee is
+        quoted as for any other join.
+        """
+        for entry in self.candidates(start_loc, dest_loc, ride_time, window_minutes, exclude_creator=user.id):
+            try:
+                with transaction.atomic():
+                    slot = Slot.objects.filter(pk=entry.slot_id).first()
+                    if slot is None:
+                        self.slot_removed(entry.slot_id)
+                        continue
+                    # As for joins, one booking per ride time
+                    if SlotParticipant.objects.filter(
+                        user=user,
+                        slot__ride_time=slot.ride_time,
+                        slot__status__in=['OPEN', 'PENDING_DRIVER'],
+                    ).exists():
+                        continue
+                    if not Slot.objects.reserve_seat(slot.pk):
+                        # Full or no longer open; the index was stale
+                        self.slot_removed(slot.pk)
+                        continue
+                    # Priced at the occupancy the slot will have once this rider is in
+                    participant = SlotParticipant.objects.create(
+                        slot=slot,
+                        user=user,
+                        status='JOINED',
+                        convenience_fee=quote_slot(slot, seats=slot.current_capacity + 1)['convenience_fee'],
+                    )
+                    publish_slot_update(entry.slot_id, 'slot.joined', user=user.id)
+                    return participant
+            except IntegrityError:
+                # Already a participant of this slot; try the next one
+                continue
+        return None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_matching_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MatchingEngine(ttl=settings.MATCHING_INDEX_TTL)
+    return _engine
+
+
+def reset_matching_engine():
+    global _engine
+    with _engine_lock:
+        _engine = None
+
+
+@receiver(setting_changed)
+def reset_on_matching_settings_change(setting, **kwargs):
+    if setting == 'MATCHING_INDEX_TTL':
+        reset_matching_engine()
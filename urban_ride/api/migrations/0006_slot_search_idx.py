@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_slot_creator'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['status', 'start_loc', 'dest_loc', 'ride_time'], name='slot_search_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_slot_search_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='autoqueue',
+            index=models.Index(fields=['created_at', 'id'], name='auto_queue_fifo_idx'),
+        ),
+    ]
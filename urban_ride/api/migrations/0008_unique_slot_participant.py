@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+def remove_duplicate_participants(apps, schema_editor):
+    SlotParticipant = apps.get_model('api', 'SlotParticipant')
+    keep = (
+        SlotParticipant.objects.values('slot_id', 'user_id')
+        .annotate(first_id=models.Min('id'))
+        .values_list('first_id', flat=True)
+    )
+    SlotParticipant.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_auto_queue_fifo_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_participants, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='slotparticipant',
+            constraint=models.UniqueConstraint(fields=('slot', 'user'), name='unique_slot_participant'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:34
+
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+
+
+def build_summary(apps, schema_editor):
+    Slot = apps.get_model('api', 'Slot')
+    RouteAvailability = apps.get_model('api', 'RouteAvailability')
+    rows = Slot.objects.filter(status='OPEN').annotate(
+        hour=TruncHour('ride_time', tzinfo=timezone.utc)
+    ).order_by().values('start_loc', 'dest_loc', 'hour').annotate(
+        open_slots=Count('id'),
+        free_seats=Sum(F('max_capacity') - F('current_capacity')),
+    )
+    RouteAvailability.objects.bulk_create(RouteAvailability(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_slot_lifecycle_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_loc', models.CharField(choices=[('IITJ', 'IIT Jodhpur'), ('NIFTJ', 'NIFT Jodhpur'), ('Paota', 'Paota'), ('Ratanada', 'Ratanada'), ('Sardarpura', 'Sardarpura')], max_length=10)),
+                ('dest_loc', models.CharField(choices=[('IITJ', 'IIT Jodhpur'), ('NIFTJ', 'NIFT Jodhpur'), ('Paota', 'Paota'), ('Ratanada', 'Ratanada'), ('Sardarpura', 'Sardarpura')], max_length=10)),
+                ('hour', models.DateTimeField()),
+                ('open_slots', models.IntegerField(default=0)),
+                ('free_seats', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'route_availability',
+                'indexes': [models.Index(fields=['hour'], name='route_availability_hour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='routeavailability',
+            constraint=models.UniqueConstraint(fields=('start_loc', 'dest_loc', 'hour'), name='unique_route_hour'),
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
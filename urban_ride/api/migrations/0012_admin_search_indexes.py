@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='phone',
+            field=models.CharField(db_index=True, max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['ride_time'], name='slot_ride_time_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispatchOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('OFFERED', 'Offered'), ('ACCEPTED', 'Accepted'), ('DECLINED', 'Declined'), ('EXPIRED', 'Expired')], default='OFFERED', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('responded_at', models.DateTimeField(blank=True, null=True)),
+                ('auto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='api.auto')),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='api.slot')),
+            ],
+            options={
+                'db_table': 'dispatch_offers',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='dispatch_offer_due_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dispatchoffer',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'OFFERED')), fields=('slot',), name='one_open_offer_per_slot'),
+        ),
+    ]
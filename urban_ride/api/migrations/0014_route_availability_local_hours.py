@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:10
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def rebuild_summary(apps, schema_editor):
+    # Rows used to be bucketed by UTC hour; rebuild them by local hour
+    Slot = apps.get_model('api', 'Slot')
+    RouteAvailability = apps.get_model('api', 'RouteAvailability')
+    RouteAvailability.objects.all().delete()
+    rows = Slot.objects.filter(status='OPEN').annotate(
+        hour=TruncHour('ride_time', tzinfo=timezone.get_default_timezone())
+    ).order_by().values('start_loc', 'dest_loc', 'hour').annotate(
+        open_slots=Count('id'),
+        free_seats=Sum(F('max_capacity') - F('current_capacity')),
+    )
+    RouteAvailability.objects.bulk_create(RouteAvailability(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_dispatch_offers'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_route_availability_local_hours'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='slotparticipant',
+            name='unique_slot_participant',
+        ),
+        migrations.AddConstraint(
+            model_name='slotparticipant',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELLED'), _negated=True), fields=('slot', 'user'), name='unique_slot_participant'),
+        ),
+    ]
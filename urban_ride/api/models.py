@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from cloudinary_storage.storage import MediaCloudinaryStorage
 from cloudinary.models import CloudinaryField
 
@@ -26,12 +27,14 @@ class User(AbstractUser):
     username = models.CharField(max_length=30, unique=True)
     password = models.CharField(max_length=128)
     email = models.EmailField(unique=True)
-    phone = models.CharField(max_length=15)
+    phone = models.CharField(max_length=15, db_index=True)
     user_type = models.CharField(max_length=10, choices=USER_TYPES)
     created_at = models.DateTimeField(auto_now_add=True)
     college = models.CharField(max_length=100, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     image = CloudinaryField('image', folder='profile_images', blank=True, null=True)
+    # Carried in access tokens; bumping it revokes every token issued before
+    token_version = models.PositiveIntegerField(default=0)
 
     REQUIRED_FIELDS = ['email', 'phone', 'user_type']
 
@@ -55,6 +58,55 @@ class Auto(models.Model):
     class Meta:
         db_table = 'autos'
 
+class SlotQuerySet(models.QuerySet):
+    def with_details(self, auto=True, creator=True, participants=True):
+        # Loads everything SlotSerializer renders in a fixed number of queries:
+        # one for slots (with auto, driver and creator joined) and one for the
+        # participants of all slots (with their users joined). Nested
+        # participant slot_details render the parent's auto and creator, so
+        # participants pull both joins in.
+        related = []
+        if auto or participants:
+            related.append('auto__driver')
+        if creator or participants:
+            related.append('creator')
+
+        queryset = self.select_related(*related) if related else self
+        if participants:
+            queryset = queryset.prefetch_related(
+                models.Prefetch(
+                    'participants',
+                    queryset=SlotParticipant.objects.select_related('user'),
+                )
+            )
+        return queryset
+
+    def search(self, start_loc=None, dest_loc=None, ride_time_after=None,
+               ride_time_before=None, seats=1):
+        # Equality on status/start_loc/dest_loc plus a ride_time range is served
+        # by slot_search_idx; the free seat check is applied to the index hits.
+        queryset = self.filter(status='OPEN', current_capacity__lte=models.F('max_capacity') - seats)
+        if start_loc:
+            queryset = queryset.filter(start_loc=start_loc)
+        if dest_loc:
+            queryset = queryset.filter(dest_loc=dest_loc)
+        if ride_time_after:
+            queryset = queryset.filter(ride_time__gte=ride_time_after)
+        if ride_time_before:
+            queryset = queryset.filter(ride_time__lte=ride_time_before)
+        return queryset
+
+    def reserve_seat(self, pk, seats=1):
+        # Check and increment in one conditional UPDATE so concurrent joins can
+        # never overbook; returns False when the slot is closed or full.
+        reserved = self.filter(
+            pk=pk, status='OPEN', current_capacity__lte=models.F('max_capacity') - seats
+        ).update(current_capacity=models.F('current_capacity') + seats) == 1
+        if reserved:
+            # update() skips post_save, so keep the route summary in step here
+            RouteAvailability.objects.seats_taken(pk, seats)
+        return reserved
+
 class Slot(models.Model):
     STATUS_CHOICES = (
         ('PENDING_DRIVER', 'Pending Driver'),
@@ -83,8 +135,26 @@ class Slot(models.Model):
     start_loc = models.CharField(max_length=10, choices=LOCATIONS, default='IITJ')
     dest_loc = models.CharField(max_length=10, choices=LOCATIONS, default='Paota')
 
+    objects = SlotQuerySet.as_manager()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # post_init only fires for new instances; its receivers keep the state
+        # a slot was loaded with, which a refresh replaces
+        models.signals.post_init.send(sender=self.__class__, instance=self)
+
     class Meta:
         db_table = 'slots'
+        indexes = [
+            models.Index(fields=['status', 'start_loc', 'dest_loc', 'ride_time'], name='slot_search_idx'),
+            # Lifecycle scheduler: active slots by status coming due by ride_time
+            models.Index(fields=['status', 'ride_time'], name='slot_lifecycle_idx'),
+            # Admin date hierarchy: min/max and the drill-down by ride_time alone
+            models.Index(fields=['ride_time'], name='slot_ride_time_idx'),
+        ]
+
+# A slot in one of these still holds its auto
+ACTIVE_SLOT_STATUSES = ('PENDING_DRIVER', 'OPEN', 'BOOKED')
 
 class SlotParticipant(models.Model):
     STATUS_CHOICES = (
@@ -102,10 +172,211 @@ class SlotParticipant(models.Model):
 
     class Meta:
         db_table = 'slot_participants'
+        constraints = [
+            # A rider who cancelled can join the same slot again
+            models.UniqueConstraint(fields=['slot', 'user'], condition=~models.Q(status='CANCELLED'),
+                                    name='unique_slot_participant'),
+        ]
+
+def hour_bucket(ride_time):
+    """
+    The start of the local (TIME_ZONE) hour ride_time falls in, the hour
+    pricing charges demand for.
+    """
+    local = timezone.localtime(ride_time, timezone.get_default_timezone())
+    return local.replace(minute=0, second=0, microsecond=0)
+
+class RouteAvailabilityQuerySet(models.QuerySet):
+    def add(self, start_loc, dest_loc, ride_time, open_slots=0, free_seats=0):
+        """
+        Adds open_slots and free_seats (either may be negative) to the row for
+        the route and hour of ride_time, creating it if needed.
+        """
+        if not (open_slots or free_seats):
+            return
+        key = {'start_loc': start_loc, 'dest_loc': dest_loc, 'hour': hour_bucket(ride_time)}
+        delta = {
+            'open_slots': models.F('open_slots') + open_slots,
+            'free_seats': models.F('free_seats') + free_seats,
+        }
+        if self.filter(**key).update(**delta):
+            return
+        try:
+            with transaction.atomic():
+                self.create(**key, open_slots=open_slots, free_seats=free_seats)
+        except IntegrityError:
+            # Someone else created the row between our UPDATE and INSERT
+            self.filter(**key).update(**delta)
+
+    def seats_taken(self, slot_id, seats=1):
+        route = Slot.objects.filter(pk=slot_id).values_list('start_loc', 'dest_loc', 'ride_time').first()
+        if route:
+            self.add(*route, free_seats=-seats)
+
+    def upcoming(self, since, until, start_loc=None, dest_loc=None):
+        # A range on hour is served by route_availability_hour_idx, or with
+        # a route by the unique (start_loc, dest_loc, hour) index
+        queryset = self.filter(hour__gte=since, hour__lt=until, open_slots__gt=0)
+        if start_loc:
+            queryset = queryset.filter(start_loc=start_loc)
+        if dest_loc:
+            queryset = queryset.filter(dest_loc=dest_loc)
+        return queryset.order_by('hour', 'start_loc', 'dest_loc')
+
+class RouteAvailability(models.Model):
+    """
+    Open slots and the free seats in them per route and hour of ride_time,
+    kept in step with Slot by api.availability.
+    """
+    start_loc = models.CharField(max_length=10, choices=Slot.LOCATIONS)
+    dest_loc = models.CharField(max_length=10, choices=Slot.LOCATIONS)
+    hour = models.DateTimeField()
+    open_slots = models.IntegerField(default=0)
+    free_seats = models.IntegerField(default=0)
+
+    objects = RouteAvailabilityQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'route_availability'
+        constraints = [
+            models.UniqueConstraint(fields=['start_loc', 'dest_loc', 'hour'], name='unique_route_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='route_availability_hour_idx'),
+        ]
+
+class AutoQueueQuerySet(models.QuerySet):
+    def pop(self):
+        """
+        Removes the auto that has waited longest from the queue and returns it,
+        or None when the queue is empty. Call inside transaction.atomic().
+        """
+        # skip_locked lets concurrent workers move on to the next head instead
+        # of waiting on a row someone else is dispatching. The delete's row
+        # count is the actual claim, so backends without row locks (SQLite)
+        # still hand every auto out exactly once.
+        head = self.select_for_update(skip_locked=True, of=('self',)).select_related('auto').filter(
+            auto__isnull=False
+        ).order_by('created_at', 'id')
+        while True:
+            entry = head.first()
+            if entry is None:
+                return None
+            deleted, _ = self.filter(pk=entry.pk).delete()
+            if deleted:
+                return entry.auto
+
+    def pop_many(self, count):
+        """
+        Removes up to count autos from the head of the queue with one locking
+        query and returns them oldest first. Call inside transaction.atomic().
+        """
+        head = self.select_for_update(skip_locked=True, of=('self',)).select_related('auto').filter(
+            auto__isnull=False
+        ).order_by('created_at', 'id')
+        while True:
+            entries = list(head[:count])
+            if not entries:
+                return []
+            # As in pop(), the delete's row count is the claim. If another
+            # worker took some of these first, roll back to the savepoint and
+            # read the head again.
+            with transaction.atomic():
+                deleted, _ = self.filter(pk__in=[entry.pk for entry in entries]).delete()
+                if deleted == len(entries):
+                    return [entry.auto for entry in entries]
+                transaction.set_rollback(True)
+
+    def pop_each(self, excludes):
+        """
+        pop() for each set of auto ids in excludes, with one locking query for
+        all of them: returns a list holding, for each set, the oldest queued
+        auto not in it, or None once the queue has none left. Call inside
+        transaction.atomic().
+        """
+        head = self.select_for_update(skip_locked=True, of=('self',)).select_related('auto').filter(
+            auto__isnull=False
+        ).order_by('created_at', 'id')
+        # Enough of the head that every set finds an auto, unless the queue
+        # itself runs out
+        window = len(excludes) + max((len(exclude) for exclude in excludes), default=0)
+        while True:
+            entries = list(head[:window])
+            taken, autos = set(), []
+            for exclude in excludes:
+                entry = next((entry for entry in entries
+                              if entry.pk not in taken and entry.auto_id not in exclude), None)
+                if entry is not None:
+                    taken.add(entry.pk)
+                autos.append(entry.auto if entry else None)
+            if not taken:
+                return autos
+            # As in pop_many(), the delete's row count is the claim
+            with transaction.atomic():
+                deleted, _ = self.filter(pk__in=taken).delete()
+                if deleted == len(taken):
+                    return autos
+                transaction.set_rollback(True)
+
+    def requeue(self, auto_ids):
+        """
+        Returns whichever of auto_ids are BOOKED or QUEUED but no longer hold
+        an active slot to AVAILABLE and the tail of the queue. Returns how
+        many. Call inside transaction.atomic(), after the slot writes.
+        """
+        auto_ids = set(Auto.objects.select_for_update(of=('self',)).filter(
+            pk__in=set(auto_ids), status__in=('BOOKED', 'QUEUED'),
+        ).values_list('id', flat=True))
+        # Looked up per auto through the auto_id index rather than as a NOT IN
+        # over every active slot
+        auto_ids -= set(Slot.objects.filter(
+            auto_id__in=auto_ids, status__in=ACTIVE_SLOT_STATUSES
+        ).values_list('auto_id', flat=True))
+        if not auto_ids:
+            return 0
+        Auto.objects.filter(pk__in=auto_ids).update(status='AVAILABLE')
+        queued = set(self.filter(auto_id__in=auto_ids).values_list('auto_id', flat=True))
+        self.bulk_create(AutoQueue(auto_id=auto_id) for auto_id in sorted(auto_ids - queued))
+        return len(auto_ids)
 
 class AutoQueue(models.Model):
     auto = models.ForeignKey(Auto, on_delete=models.CASCADE, related_name='auto_queue', default=None, null=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
 
+    objects = AutoQueueQuerySet.as_manager()
+
     class Meta:
         db_table = 'auto_queue'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='auto_queue_fifo_idx'),
+        ]
+
+class DispatchOffer(models.Model):
+    """
+    A slot offered to the driver of its auto, open until expires_at. A slot
+    has at most one OFFERED offer at a time; the ones before it record which
+    autos already declined or let it lapse (see api/dispatch.py).
+    """
+    STATUS_CHOICES = (
+        ('OFFERED', 'Offered'),
+        ('ACCEPTED', 'Accepted'),
+        ('DECLINED', 'Declined'),
+        ('EXPIRED', 'Expired'),
+    )
+
+    slot = models.ForeignKey(Slot, on_delete=models.CASCADE, related_name='offers')
+    auto = models.ForeignKey(Auto, on_delete=models.CASCADE, related_name='offers')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='OFFERED')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    responded_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'dispatch_offers'
+        constraints = [
+            models.UniqueConstraint(fields=['slot'], condition=models.Q(status='OFFERED'), name='one_open_offer_per_slot'),
+        ]
+        indexes = [
+            # Timer reloads: outstanding offers by deadline
+            models.Index(fields=['status', 'expires_at'], name='dispatch_offer_due_idx'),
+        ]
@@ -0,0 +1,41 @@
+"""
+Login OTP store.
+
+OTPs live in the default cache, which is shared by every worker process, so
+an OTP issued by one worker can be verified by any other.
+"""
+import random
+
+from django.core.cache import cache
+
+OTP_TIMEOUT = 300
+
+
+def generate_otp():
+    return str(random.randint(100000, 999999))
+
+
+def otp_key(email):
+    return f'login_otp_{email}'
+
+
+def issue_otp(email):
+    otp = generate_otp()
+    cache.set(otp_key(email), otp, timeout=OTP_TIMEOUT)
+    return otp
+
+
+def check_otp(email, otp):
+    """
+    Returns None when otp is valid, and consumes it so it cannot be replayed;
+    otherwise returns the error message to show.
+    """
+    stored_otp = cache.get(otp_key(email))
+    if not stored_otp:
+        return 'OTP expired'
+    if otp != stored_otp:
+        return 'Invalid OTP'
+    if not cache.delete(otp_key(email)):
+        # Another worker consumed it between our get and delete
+        return 'OTP expired'
+    return None
@@ -0,0 +1,46 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class InvalidRow:
+    """Stands in for an NDJSON line that is not valid JSON."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON into a list, one item per non-blank line.
+
+    Lines are decoded one at a time from the request stream, but every row is
+    kept in the returned list, so memory still grows with the upload. A view
+    bounds that by putting max_rows in its parser context: reading stops one
+    row past it, which is enough for the view to refuse the upload. A line
+    that fails to decode becomes an InvalidRow so the view can report it
+    against its row number instead of rejecting the entire upload.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_rows = parser_context.get('max_rows')
+        rows = []
+        for line in iter(stream.readline, b''):
+            if max_rows is not None and len(rows) > max_rows:
+                break
+            try:
+                line = line.decode(encoding).strip()
+            except UnicodeDecodeError as e:
+                raise ParseError(f'NDJSON parse error - {e}')
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(InvalidRow(f'Invalid JSON - {e}'))
+        return rows
@@ -0,0 +1,140 @@
+"""
+Fare and convenience-fee pricing.
+
+A slot's fare is what the whole auto costs for the trip: a base fare plus a
+per-km rate over the route's distance, scaled by demand at the hour it
+leaves. Riders split the fare by occupied seats, and each one pays a
+convenience fee of PRICING_FEE_RATE of their share, never less than
+PRICING_MIN_FEE. Fuller autos therefore mean lower fees per rider.
+
+Everything is computed with NumPy over arrays of (start, dest, hour, seats),
+so quoting a batch of thousands costs a few vector operations rather than a
+Python loop per quote. quote() runs the same code on arrays of length one.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Slot
+
+LOCATION_CODES = tuple(code for code, _ in Slot.LOCATIONS)
+LOCATION_INDEX = {code: index for index, code in enumerate(LOCATION_CODES)}
+
+# Road distance in km between Slot.LOCATIONS, rows and columns in the same
+# order as LOCATION_CODES: IITJ, NIFTJ, Paota, Ratanada, Sardarpura
+DISTANCE_KM = np.array([
+    [0.0, 4.5, 20.0, 18.5, 22.0],
+    [4.5, 0.0, 16.5, 15.0, 18.5],
+    [20.0, 16.5, 0.0, 5.5, 4.0],
+    [18.5, 15.0, 5.5, 0.0, 3.5],
+    [22.0, 18.5, 4.0, 3.5, 0.0],
+])
+
+# Fare multiplier by local hour of ride_time: night surcharge, then the
+# morning and evening rush
+DEMAND_BY_HOUR = np.array([
+    1.25, 1.25, 1.25, 1.25, 1.25, 1.1,
+    1.0, 1.1, 1.3, 1.4, 1.2, 1.0,
+    1.0, 1.0, 1.0, 1.0, 1.1, 1.3,
+    1.4, 1.3, 1.1, 1.0, 1.1, 1.2,
+])
+
+
+def price_arrays(start, dest, hour, seats):
+    """
+    Vectorized core. start and dest are indexes into LOCATION_CODES, hour the
+    local hour (0-23) and seats the occupied seats; all equal-length integer
+    arrays. Returns fare, fare_per_seat and convenience_fee arrays rounded to
+    paise.
+    """
+    fare = (settings.PRICING_BASE_FARE + settings.PRICING_PER_KM * DISTANCE_KM[start, dest]) * DEMAND_BY_HOUR[hour]
+    fare_per_seat = fare / seats
+    fee = np.maximum(settings.PRICING_FEE_RATE * fare_per_seat, settings.PRICING_MIN_FEE)
+    return {
+        'fare': np.round(fare, 2),
+        'fare_per_seat': np.round(fare_per_seat, 2),
+        'convenience_fee': np.round(fee, 2),
+    }
+
+
+def local_hour(ride_time, tz):
+    if timezone.is_naive(ride_time):
+        return ride_time.hour
+    return ride_time.astimezone(tz).hour
+
+
+def to_decimal(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def quote(start_loc, dest_loc, ride_time, seats=1):
+    prices = price_arrays(
+        np.array([LOCATION_INDEX[start_loc]]),
+        np.array([LOCATION_INDEX[dest_loc]]),
+        np.array([local_hour(ride_time, timezone.get_default_timezone())]),
+        np.array([seats]),
+    )
+    return {name: to_decimal(values[0]) for name, values in prices.items()}
+
+
+def quote_slot(slot, seats=None):
+    """Quote for slot's route and time, at its current occupancy by default."""
+    return quote(slot.start_loc, slot.dest_loc, slot.ride_time,
+                 seats if seats is not None else slot.current_capacity)
+
+
+def quote_batch(items):
+    """
+    Quotes a list of {'start_loc', 'dest_loc', 'ride_time', 'seats'} dicts as
+    they arrive in a request body; seats is an integer from 1 to
+    PRICING_MAX_SEATS. Raises ValueError naming the first bad item. Returns
+    a list of {'fare', 'fare_per_seat', 'convenience_fee'} dicts in the same
+    order.
+    """
+    if len(items) > settings.PRICING_MAX_BATCH:
+        raise ValueError(f"At most {settings.PRICING_MAX_BATCH} quotes per request")
+
+    count = len(items)
+    start = np.empty(count, dtype=np.intp)
+    dest = np.empty(count, dtype=np.intp)
+    hour = np.empty(count, dtype=np.intp)
+    seats = np.empty(count, dtype=np.int64)
+    max_seats = settings.PRICING_MAX_SEATS
+    # Demand follows the service's own clock (TIME_ZONE), as the route
+    # availability summary does, whatever time zone is activated
+    tz = timezone.get_default_timezone()
+    # Parsing is the only per-item Python work; pricing below is vectorized
+    for index, item in enumerate(items):
+        try:
+            start[index] = LOCATION_INDEX[item['start_loc']]
+            dest[index] = LOCATION_INDEX[item['dest_loc']]
+            ride_time = item['ride_time']
+            if isinstance(ride_time, str):
+                ride_time = parse_datetime(ride_time)
+            if ride_time is None:
+                raise ValueError
+            hour[index] = local_hour(ride_time, tz)
+            item_seats = item.get('seats', 1)
+            # Whole numbers only: int() would truncate 1.5, and bool is an int
+            if type(item_seats) is not int:
+                raise TypeError
+            seats[index] = item_seats
+        except (AttributeError, KeyError, OverflowError, TypeError, ValueError):
+            raise ValueError(
+                f"quotes[{index}] needs a valid start_loc, dest_loc, ride_time and seats"
+            ) from None
+        if not 1 <= seats[index] <= max_seats:
+            raise ValueError(f"quotes[{index}] seats must be between 1 and {max_seats}")
+
+    prices = price_arrays(start, dest, hour, seats)
+    return [
+        {'fare': fare, 'fare_per_seat': fare_per_seat, 'convenience_fee': fee}
+        for fare, fare_per_seat, fee in zip(
+            prices['fare'].tolist(),
+            prices['fare_per_seat'].tolist(),
+            prices['convenience_fee'].tolist(),
+        )
+    ]
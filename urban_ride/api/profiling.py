@@ -0,0 +1,291 @@
+"""
+Sampled request profiling, served as Prometheus metrics.
+
+ProfilingMiddleware profiles PROFILING_SAMPLE_RATE of requests (0, the
+default, turns it off). For each sampled request it records, per view:
+
+- wall time through the rest of the middleware chain and the view
+- number and total time of database queries
+- time spent producing serializer .data, or in compiled serializers
+- response size, for non-streaming responses
+
+Statements run at least PROFILING_N_PLUS_ONE_THRESHOLD times with different
+parameters in one request are logged as a likely N+1 and counted. Timings
+are also returned in a Server-Timing header.
+
+A request that is not sampled costs one random() call. The query and
+serializer hooks are only installed once something is sampled, and then
+only do work while a sampled request is in progress (tracked in a
+ContextVar, so async views and their sync_to_async database calls are
+covered too).
+
+Histograms live in the process, like the realtime hub: with several
+workers each serves its own /api/metrics/, and Prometheus adds them up.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import StreamingHttpResponse
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+_install_lock = threading.Lock()
+_serializer_hook_installed = False
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        # sql -> [executions, distinct parameter sets seen]
+        self.statements = defaultdict(lambda: [0, set()])
+
+    def record_query(self, sql, params, elapsed):
+        self.query_count += 1
+        self.query_time += elapsed
+        entry = self.statements[sql]
+        entry[0] += 1
+        # Only enough distinct parameter sets to tell repeats from a loop
+        if len(entry[1]) < 2:
+            entry[1].add(repr(params))
+
+    def repeated_statements(self, threshold):
+        return [
+            (sql, count) for sql, (count, params) in self.statements.items()
+            if count >= threshold and len(params) > 1
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, params, time.perf_counter() - start)
+
+
+def timed(render):
+    """Counts render's time as serializer time while a sampled request runs."""
+    @functools.wraps(render)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return render(*args, **kwargs)
+        # Serializers nested through .data are counted once, at the outermost
+        profile.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - start
+    return wrapper
+
+
+def timed_data(fget):
+    return property(timed(fget))
+
+
+def install():
+    """Hooks this thread's database connections and serializer .data."""
+    global _serializer_hook_installed
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+    if not _serializer_hook_installed:
+        with _install_lock:
+            if not _serializer_hook_installed:
+                BaseSerializer.data = timed_data(BaseSerializer.data.fget)
+                _serializer_hook_installed = True
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            label_text = format_labels(labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series[-2]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series[-2]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = defaultdict(int)
+
+    def inc(self, labels, amount=1):
+        self.series[labels] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{format_labels(labels)}}} {value}')
+        return lines
+
+
+LABEL_NAMES = ('view', 'method')
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(LABEL_NAMES, labels))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Histogram('urban_ride_request_duration_seconds', 'Wall time per sampled request.', DURATION_BUCKETS)
+        self.queries = Histogram('urban_ride_db_queries', 'Database queries per sampled request.', QUERY_BUCKETS)
+        self.query_time = Histogram('urban_ride_db_duration_seconds', 'Database time per sampled request.', DURATION_BUCKETS)
+        self.serializer_time = Histogram(
+            'urban_ride_serializer_duration_seconds', 'Serializer time per sampled request.', DURATION_BUCKETS
+        )
+        self.response_size = Histogram('urban_ride_response_size_bytes', 'Response body size per sampled request.', SIZE_BUCKETS)
+        self.n_plus_one = Counter('urban_ride_n_plus_one_total', 'Statements repeated with different parameters in one request.')
+
+    def observe(self, labels, wall_time, profile, size):
+        with self.lock:
+            self.requests.observe(labels, wall_time)
+            self.queries.observe(labels, profile.query_count)
+            self.query_time.observe(labels, profile.query_time)
+            self.serializer_time.observe(labels, profile.serializer_time)
+            if size is not None:
+                self.response_size.observe(labels, size)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.requests, self.queries, self.query_time,
+                           self.serializer_time, self.response_size, self.n_plus_one):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def reset_registry():
+    global _registry
+    _registry = MetricsRegistry()
+
+
+def sampled():
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def view_labels(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else 'unresolved', request.method)
+
+
+def finish(request, response, profile, wall_time):
+    labels = view_labels(request)
+    size = None if isinstance(response, StreamingHttpResponse) else len(response.content)
+    registry = get_registry()
+    registry.observe(labels, wall_time, profile, size)
+
+    for sql, count in profile.repeated_statements(settings.PROFILING_N_PLUS_ONE_THRESHOLD):
+        with registry.lock:
+            registry.n_plus_one.inc(labels)
+        logger.warning('Possible N+1 in %s %s: %d executions of %s', labels[1], labels[0], count, sql)
+
+    response['Server-Timing'] = (
+        f'app;dur={wall_time * 1000:.1f}, '
+        f'db;dur={profile.query_time * 1000:.1f};desc="{profile.query_count} queries", '
+        f'serialize;dur={profile.serializer_time * 1000:.1f}'
+    )
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not sampled():
+            return self.get_response(request)
+
+        install()
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finish(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not sampled():
+            return await self.get_response(request)
+
+        # Database work happens on the request's sync thread, so hook the
+        # connections there
+        await sync_to_async(install)()
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        finish(request, response, profile, time.perf_counter() - start)
+        return response
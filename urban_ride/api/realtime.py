@@ -0,0 +1,208 @@
+"""
+Real-time slot updates over WebSockets.
+
+Clients connect to /ws/slots/ on the ASGI entry point and subscribe to a slot
+("slot": 12) or a route ("route": "IITJ→Paota"), either in the query string
+(?slot=12&route=IITJ-Paota) or with {"action": "subscribe", ...} messages.
+Writes publish a small state delta after their transaction commits.
+
+The default hub fans messages out inside one process, which is enough for a
+single uvicorn worker. With several workers set REALTIME_HUB to a class with
+the same publish/subscribe/unsubscribe interface that relays through a broker.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Slot
+
+WEBSOCKET_PATH = '/ws/slots/'
+ROUTE_SEPARATORS = ('→', '->', '-', ':')
+
+
+class Subscriber:
+    def __init__(self, loop, max_pending=100):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.topics = set()
+
+    def deliver(self, message):
+        # Runs on the subscriber's loop; a client that stops reading loses its
+        # oldest deltas rather than growing memory without bound
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class InProcessHub:
+    def __init__(self):
+        self._topics = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, subscriber):
+        with self._lock:
+            self._topics[topic].add(subscriber)
+        subscriber.topics.add(topic)
+
+    def unsubscribe(self, topic, subscriber):
+        with self._lock:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._topics[topic]
+        subscriber.topics.discard(topic)
+
+    def subscriber_count(self, topic):
+        return len(self._topics.get(topic, ()))
+
+    def publish(self, topic, message):
+        # Safe to call from sync views running in worker threads
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.deliver, message)
+        return len(subscribers)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = import_string(settings.REALTIME_HUB)()
+    return _hub
+
+
+def slot_topic(slot_id):
+    return f'slot:{slot_id}'
+
+
+def route_topic(start_loc, dest_loc):
+    return f'route:{start_loc}:{dest_loc}'
+
+
+def parse_route(route):
+    for separator in ROUTE_SEPARATORS:
+        if separator in route:
+            start_loc, dest_loc = (part.strip() for part in route.split(separator, 1))
+            return route_topic(start_loc, dest_loc)
+    raise ValueError(f'Invalid route: {route}')
+
+
+def topics_from(payload):
+    topics = []
+    if payload.get('slot') is not None:
+        topics.append(slot_topic(int(payload['slot'])))
+    if payload.get('route'):
+        topics.append(parse_route(payload['route']))
+    return topics
+
+
+DELTA_FIELDS = ('id', 'status', 'current_capacity', 'max_capacity', 'start_loc', 'dest_loc')
+
+
+def publish_slot_update(slot_id, event, **extra):
+    """
+    Publishes the slot's current state to its slot and route topics once the
+    surrounding transaction commits.
+    """
+    def publish():
+        state = Slot.objects.filter(pk=slot_id).values(*DELTA_FIELDS).first()
+        if state is None:
+            return
+        message = {'event': event, 'slot': state, **extra}
+        hub = get_hub()
+        hub.publish(slot_topic(slot_id), message)
+        hub.publish(route_topic(state['start_loc'], state['dest_loc']), message)
+    transaction.on_commit(publish, robust=True)
+
+
+def publish_slot_updates(slot_ids, event):
+    """
+    publish_slot_update() for many slots, such as a bulk insert, reading
+    their state in one query once the transaction commits.
+    """
+    slot_ids = list(slot_ids)
+
+    def publish():
+        hub = get_hub()
+        for state in Slot.objects.filter(pk__in=slot_ids).values(*DELTA_FIELDS).iterator():
+            message = {'event': event, 'slot': state}
+            hub.publish(slot_topic(state['id']), message)
+            hub.publish(route_topic(state['start_loc'], state['dest_loc']), message)
+    transaction.on_commit(publish, robust=True)
+
+
+async def send_json(send, payload):
+    await send({'type': 'websocket.send', 'text': json.dumps(payload, default=str)})
+
+
+async def handle_client_message(text, subscriber, hub, send):
+    try:
+        payload = json.loads(text)
+        topics = topics_from(payload)
+    except (ValueError, TypeError, AttributeError):
+        await send_json(send, {'error': 'Invalid message'})
+        return
+
+    action = payload.get('action', 'subscribe')
+    if action not in ('subscribe', 'unsubscribe'):
+        await send_json(send, {'error': f'Unknown action: {action}'})
+        return
+    for topic in topics:
+        getattr(hub, action)(topic, subscriber)
+    await send_json(send, {'event': f'{action}d', 'topics': sorted(subscriber.topics)})
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+    try:
+        initial_topics = topics_from(query)
+    except ValueError:
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+
+    await send({'type': 'websocket.accept'})
+    hub = get_hub()
+    subscriber = Subscriber(asyncio.get_running_loop())
+    for topic in initial_topics:
+        hub.subscribe(topic, subscriber)
+
+    receiving = asyncio.ensure_future(receive())
+    delivering = asyncio.ensure_future(subscriber.queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiving, delivering}, return_when=asyncio.FIRST_COMPLETED)
+            if delivering in done:
+                await send_json(send, delivering.result())
+                delivering = asyncio.ensure_future(subscriber.queue.get())
+            if receiving in done:
+                event = receiving.result()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                if event.get('text') is not None:
+                    await handle_client_message(event['text'], subscriber, hub, send)
+                receiving = asyncio.ensure_future(receive())
+    finally:
+        receiving.cancel()
+        delivering.cancel()
+        for topic in list(subscriber.topics):
+            hub.unsubscribe(topic, subscriber)
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Selects ?format=ndjson for streaming views. Data rendered through a
+    plain Response (errors, mostly) becomes a single JSON line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, default=str) + '\n').encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Selects ?format=csv for streaming views. A dict rendered through a plain
+    Response becomes a header row of its keys and one row of its values.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if isinstance(data, dict):
+            writer.writerow(data.keys())
+            writer.writerow(data.values())
+        return buffer.getvalue().encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson. Produces the same bytes as JSONRenderer for API
+    payloads: compact separators, raw UTF-8, U+2028/U+2029 escaped, and
+    anything orjson does not handle itself (Decimal, datetime, lazy strings)
+    converted by DRF's encoder. The exceptions are floats below 1e-4 or from
+    1e16 up, which orjson writes without an exponent. Money is a DecimalField
+    with two places, so nothing the API renders comes near either bound.
+
+    Indented output (?indent= through the Accept header), non-compact or
+    ASCII-only settings, and payloads orjson refuses (non-string keys,
+    integers past 64 bits) go through JSONRenderer.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
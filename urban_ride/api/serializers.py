@@ -1,28 +1,92 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.utils import timezone
-from .models import Auto, Slot, User, SlotParticipant, AutoQueue
-from django.contrib.auth.hashers import make_password
+from .models import Auto, Slot, User, SlotParticipant, AutoQueue, RouteAvailability
+from .pricing import quote
+from django.core.files.uploadedfile import UploadedFile
+from .hashing import hash_password
+from .images import check_image, image_url, schedule_image_upload
 
-class UserSerializer(serializers.ModelSerializer):
+def parse_field_list(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+class SparseFieldsetMixin:
+    """
+    Lets GET clients trim the payload with query parameters.
+
+    ?fields=a,b keeps only the listed top level fields. ?expand=a,b renders only
+    the listed Meta.expandable_fields; without it every expandable field is
+    rendered, so existing clients see the same payload. Nested serializers are
+    never trimmed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+
+        params = request.query_params
+        if 'fields' in params:
+            allowed = parse_field_list(params['fields'])
+            for name in list(self.fields):
+                if name not in allowed:
+                    self.fields.pop(name)
+
+        if 'expand' in params:
+            expand = parse_field_list(params['expand'])
+            for name in getattr(self.Meta, 'expandable_fields', ()):
+                if name not in expand:
+                    self.fields.pop(name, None)
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     image_url = serializers.SerializerMethodField()
+    image_thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'phone', 'password', 'user_type', 
-                 'created_at', 'college', 'address', 'image', 'image_url')
-        read_only_fields = ('id', 'created_at', 'image_url')
+                 'created_at', 'college', 'address', 'image', 'image_url', 'image_thumbnail_url')
+        read_only_fields = ('id', 'created_at', 'image_url', 'image_thumbnail_url')
+
+    def validate_image(self, value):
+        if isinstance(value, UploadedFile):
+            try:
+                check_image(value)
+            except Exception:
+                raise serializers.ValidationError('Upload a valid image.')
+        return value
+
+    # Uploads are processed and pushed in the background (api/images.py);
+    # the user keeps their previous image until that finishes
+    def pop_image_upload(self, validated_data):
+        if isinstance(validated_data.get('image'), UploadedFile):
+            return validated_data.pop('image')
+        return None
 
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data.get('password'))
-        return super().create(validated_data)
+        validated_data['password'] = hash_password(validated_data.get('password'))
+        upload = self.pop_image_upload(validated_data)
+        user = super().create(validated_data)
+        if upload is not None:
+            schedule_image_upload(user.pk, upload)
+        return user
+
+    def update(self, instance, validated_data):
+        upload = self.pop_image_upload(validated_data)
+        user = super().update(instance, validated_data)
+        if upload is not None:
+            schedule_image_upload(user.pk, upload)
+        return user
 
     def get_image_url(self, obj):
-        if obj.image:
-            return obj.image.url
-        return None
+        return image_url(obj.image)
+
+    def get_image_thumbnail_url(self, obj):
+        return image_url(obj.image, 'thumbnail')
 
-class AutoSerializer(serializers.ModelSerializer):
+class AutoSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     driver_details = UserSerializer(source='driver', read_only=True)
     driver_id = serializers.IntegerField(write_only=True, required=False)
     
@@ -30,6 +94,7 @@ class AutoSerializer(serializers.ModelSerializer):
         model = Auto
         fields = ('id', 'driver', 'driver_id', 'driver_details', 'license_plate', 'status')
         read_only_fields = ('id', 'driver', 'driver_details', 'status')
+        expandable_fields = ('driver_details',)
 
     def validate_driver_id(self, value):
         try:
@@ -51,7 +116,7 @@ class AutoSlotSerializer(serializers.ModelSerializer):
 
 
 
-class SlotSerializer(serializers.ModelSerializer):
+class SlotSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     auto_details = AutoSlotSerializer(source='auto', read_only=True)
     participants_count = serializers.IntegerField(source='current_capacity', read_only=True)
     creator_details = UserSerializer(source='creator', read_only=True)
@@ -64,10 +129,15 @@ class SlotSerializer(serializers.ModelSerializer):
                  'dest_loc', 'participants_count', 'creator', 'creator_details',
                  'participants')
         read_only_fields = ('id', 'current_capacity', 'created_at', 'participants')
+        expandable_fields = ('auto_details', 'creator_details', 'participants')
+        # Priced from route and ride_time in validate() when left out
+        extra_kwargs = {'fare': {'required': False}}
 
     def get_participants(self, obj):
-        participants = SlotParticipant.objects.filter(slot=obj)
-        return SlotParticipantSerializer(participants, many=True).data
+        # obj.participants.all() hits the prefetch cache when the queryset was
+        # built with Slot.objects.with_details(), and each participant's slot
+        # points back at obj, so nested slot_details reuse its joined rows.
+        return SlotParticipantSerializer(obj.participants.all(), many=True).data
 
     def validate_ride_time(self, value):
         from django.utils import timezone
@@ -91,9 +161,81 @@ class SlotSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     f"Invalid status transition from {current_status} to {new_status}"
                 )
+
+        if self.instance is None and 'fare' not in data:
+            data['fare'] = quote(
+                data.get('start_loc', Slot._meta.get_field('start_loc').default),
+                data.get('dest_loc', Slot._meta.get_field('dest_loc').default),
+                data['ride_time'],
+            )['fare']
+        return data
+
+
+class SlotSearchSerializer(serializers.Serializer):
+    start_loc = serializers.ChoiceField(choices=Slot.LOCATIONS, required=False)
+    dest_loc = serializers.ChoiceField(choices=Slot.LOCATIONS, required=False)
+    ride_time_after = serializers.DateTimeField(required=False)
+    ride_time_before = serializers.DateTimeField(required=False)
+    seats = serializers.IntegerField(min_value=1, default=1)
+
+    def validate(self, data):
+        after = data.get('ride_time_after')
+        before = data.get('ride_time_before')
+        if after and before and after > before:
+            raise serializers.ValidationError("ride_time_after must be before ride_time_before")
         return data
 
 
+class RouteAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RouteAvailability
+        fields = ['start_loc', 'dest_loc', 'hour', 'open_slots', 'free_seats']
+
+
+class RouteAvailabilityQuerySerializer(serializers.Serializer):
+    start_loc = serializers.ChoiceField(choices=Slot.LOCATIONS, required=False)
+    dest_loc = serializers.ChoiceField(choices=Slot.LOCATIONS, required=False)
+    hours = serializers.IntegerField(min_value=1, max_value=168, default=24)
+
+
+class RideMatchSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    start_loc = serializers.ChoiceField(choices=Slot.LOCATIONS)
+    dest_loc = serializers.ChoiceField(choices=Slot.LOCATIONS)
+    ride_time = serializers.DateTimeField()
+    window_minutes = serializers.IntegerField(min_value=0, max_value=180, default=15)
+
+
+class ConvenienceFeeSerializer(serializers.Serializer):
+    slot_id = serializers.IntegerField(required=False)
+    participant_id = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if 'slot_id' not in data and 'participant_id' not in data:
+            raise serializers.ValidationError("slot_id or participant_id is required")
+        return data
+
+
+class BoundedListField(serializers.ListField):
+    """A ListField that checks max_length before validating any item, not after."""
+
+    def to_internal_value(self, data):
+        if self.max_length is not None and isinstance(data, list) and len(data) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+        return super().to_internal_value(data)
+
+
+class QuoteBatchSerializer(serializers.Serializer):
+    # DRF only checks that each item is an object; the fields in it are
+    # checked by pricing.quote_batch in one pass
+    quotes = BoundedListField(child=serializers.DictField(), allow_empty=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['quotes'].max_length = settings.PRICING_MAX_BATCH
+        return fields
+
+
 class SlotParticipantSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
     slot_details = serializers.SerializerMethodField()
@@ -105,15 +247,16 @@ class SlotParticipantSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'joined_at', 'slot', 'user', 'status')
 
     def get_slot_details(self, obj):
+        slot = obj.slot
         return {
-            'id': obj.slot.id,
-            'fare': obj.slot.fare,
-            'ride_time': obj.slot.ride_time,
-            'start_loc': obj.slot.start_loc,
-            'dest_loc': obj.slot.dest_loc,
-            'status': obj.slot.status,
-            'creator': UserSerializer(obj.slot.creator).data,
-            'auto': AutoSlotSerializer(obj.slot.auto).data
+            'id': slot.id,
+            'fare': slot.fare,
+            'ride_time': slot.ride_time,
+            'start_loc': slot.start_loc,
+            'dest_loc': slot.dest_loc,
+            'status': slot.status,
+            'creator': UserSerializer(slot.creator).data,
+            'auto': AutoSlotSerializer(slot.auto).data
         }
 
     def validate(self, data):
@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import authentication, availability
+from .matching import get_matching_engine
+from .models import Auto, Slot, SlotParticipant, User
+from .slot_cache import invalidate_slot, invalidate_slot_dependencies
+
+
+@receiver([post_save, post_delete], sender=Slot)
+def slot_changed(sender, instance, **kwargs):
+    invalidate_slot(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=SlotParticipant)
+def participant_changed(sender, instance, **kwargs):
+    invalidate_slot(instance.slot_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Auto)
+def slot_dependency_changed(sender, instance, **kwargs):
+    invalidate_slot_dependencies()
+
+
+@receiver(post_save, sender=Slot)
+def index_slot(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_matching_engine().slot_changed(instance.pk), robust=True)
+
+
+@receiver(post_delete, sender=Slot)
+def unindex_slot(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_matching_engine().slot_removed(instance.pk), robust=True)
+
+
+@receiver(post_save, sender=SlotParticipant)
+def index_seat_taken(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: get_matching_engine().seat_taken(instance.slot_id), robust=True)
+
+
+@receiver(post_init, sender=Slot)
+def remember_slot_state(sender, instance, **kwargs):
+    availability.remember(instance)
+
+
+@receiver(post_save, sender=Slot)
+def update_availability(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        availability.slot_saved(instance, created)
+
+
+@receiver(post_delete, sender=Slot)
+def remove_availability(sender, instance, **kwargs):
+    availability.slot_deleted(instance)
+
+
+@receiver(pre_save, sender=User)
+def check_token_claims(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        authentication.remember_revoking_change(instance, update_fields)
+
+
+@receiver(post_save, sender=User)
+def revoke_stale_tokens(sender, instance, raw=False, **kwargs):
+    if not raw:
+        authentication.revoke_if_changed(instance)
@@ -0,0 +1,137 @@
+"""
+Versioned read-through cache for slot responses.
+
+Cached payloads are keyed by version counters instead of being deleted on
+writes: every slot has its own version, all slot lists share one, and any
+user or auto change bumps a dependency version that every key includes.
+A write only has to bump counters, and stale entries simply stop being
+addressed and expire. The key doubles as the response ETag, so a client
+revalidating an unchanged slot gets a 304 without any DB or serializer work.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+SLOT_LIST_VERSION_KEY = 'slots:list:version'
+SLOT_DEPS_VERSION_KEY = 'slots:deps:version'
+
+
+def slot_version_key(slot_id):
+    return f'slots:{slot_id}:version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 0 so a counter that was evicted
+        # never comes back at a value older entries are still stored under
+        cache.add(key, time.time_ns())
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns())
+
+
+def bump_now_and_on_commit(*keys):
+    # Bumping again once the transaction commits stops a concurrent reader
+    # from caching pre-commit rows under the already bumped version
+    def bump():
+        for key in keys:
+            bump_version(key)
+    bump()
+    transaction.on_commit(bump, robust=True)
+
+
+def invalidate_slot(slot_id):
+    bump_now_and_on_commit(slot_version_key(slot_id), SLOT_LIST_VERSION_KEY)
+
+
+def invalidate_slot_dependencies():
+    bump_now_and_on_commit(SLOT_DEPS_VERSION_KEY)
+
+
+def query_fingerprint(request):
+    query = sorted(request.query_params.lists())
+    return hashlib.md5(repr((request.path, query)).encode()).hexdigest()
+
+
+def detail_key(slot_id, request):
+    return 'slots:detail:{}:{}:{}:{}'.format(
+        slot_id,
+        get_version(slot_version_key(slot_id)),
+        get_version(SLOT_DEPS_VERSION_KEY),
+        query_fingerprint(request),
+    )
+
+
+def list_key(request):
+    return 'slots:list:{}:{}:{}'.format(
+        get_version(SLOT_LIST_VERSION_KEY),
+        get_version(SLOT_DEPS_VERSION_KEY),
+        query_fingerprint(request),
+    )
+
+
+def etag_for(key):
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+
+def is_not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def add_validators(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def cached_response(request, key, render):
+    """
+    Serves the payload cached under key, calling render() on a miss. render
+    must return a DRF Response; only 200s are cached.
+    """
+    etag = etag_for(key)
+    if is_not_modified(request, etag):
+        return add_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+    data = cache.get(key)
+    if data is not None:
+        return add_validators(Response(data), etag)
+
+    response = render()
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    cache.set(key, response.data, settings.SLOT_CACHE_TIMEOUT)
+    return add_validators(response, etag)
+
+
+async def acached_response(request, key, render):
+    """
+    Async twin of cached_response; render is a coroutine function.
+    """
+    etag = etag_for(key)
+    if is_not_modified(request, etag):
+        return add_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+    data = await cache.aget(key)
+    if data is not None:
+        return add_validators(Response(data), etag)
+
+    response = await render()
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    await cache.aset(key, response.data, settings.SLOT_CACHE_TIMEOUT)
+    return add_validators(response, etag)
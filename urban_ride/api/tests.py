@@ -1,13 +1,83 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import struct
+import threading
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import zlib
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from importlib.util import find_spec
+from unittest import skipUnless
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User, Slot, SlotParticipant, Auto, AutoQueue
+from rest_framework_simplejwt.views import TokenObtainPairView
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from PIL import Image
+from .models import User, Slot, SlotParticipant, Auto, AutoQueue, DispatchOffer, RouteAvailability, hour_bucket
+from .fakesmtp import FakeSMTPServer
+from .mailer import get_mail_dispatcher
+from .auth_views import build_otp_email
+from .images import _image_url, get_image_uploader, image_url
+from .hashing import HashingUnavailable, PasswordHashingPool, get_hashing_pool
+from .authentication import ClaimsJWTAuthentication, reset_token_cache, revoke_tokens
+from .cache_backends import SQLiteCache
+from .db_backends.sqlite3.base import DatabaseWrapper as SQLiteProfileWrapper
+from .otp import issue_otp, check_otp
+from .asgi_testing import WebsocketCommunicator, http_request
+from .availability import actual_counts
+from .lifecycle import LifecycleScheduler
+from .dispatch import OfferDispatcher, TimerWheel, respond_to_offer
+from .ingestion import ingest_slots
+from .loadtest import ASGITransport, FLOWS, LoadTest, regressions, seed
+from .fast_serializers import compile_serializer
+from .profiling import ProfilingMiddleware, get_registry, reset_registry
+from .pricing import local_hour, quote, quote_slot, to_decimal
+from .renderers import FastJSONRenderer
+from .serializers import SlotSerializer
+from .matching import RouteIndex, get_matching_engine, reset_matching_engine
+from .realtime import WEBSOCKET_PATH, get_hub, route_topic, websocket_application
+from . import async_views
+from .views import AutoViewSet, SlotViewSet
 ''' AI GENERATED TEST CASES '''
 
+# The configured cache is a file shared with the running site (pending OTPs,
+# cached responses), so tests get a cache of their own in this process
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+@override_settings(CACHES=TEST_CACHES)
 class BaseTestCase(TestCase):
     def setUp(self):
+        # The test cache outlives each test; start every one empty
+        cache.clear()
+
         # Create test client
         self.client = APIClient()
 
@@ -237,3 +307,2566 @@ class PaymentAPITestCase(BaseTestCase):
         # Verify participant is marked as paid
         updated_participant = SlotParticipant.objects.get(id=self.slot_participant.id)
         self.assertTrue(updated_participant.paid)
+
+class SlotFixtureTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.auto = Auto.objects.create(
+            driver=self.driver_user,
+            license_plate='QC123',
+            status='BOOKED'
+        )
+        self.riders = [
+            User.objects.create_user(
+                username=f'rider{i}',
+                email=f'rider{i}@test.com',
+                password='testpass123',
+                user_type='CUSTOMER',
+                phone=f'90000000{i:02d}'
+            )
+            for i in range(3)
+        ]
+
+    def create_slots(self, count):
+        for _ in range(count):
+            slot = Slot.objects.create(
+                auto=self.auto,
+                creator=self.customer_user,
+                max_capacity=4,
+                current_capacity=1 + len(self.riders),
+                fare=100.00,
+                status='OPEN',
+                ride_time='2030-02-15T10:00:00Z'
+            )
+            for rider in self.riders:
+                SlotParticipant.objects.create(
+                    slot=slot,
+                    user=rider,
+                    status='JOINED',
+                    convenience_fee=10.00
+                )
+
+class SlotListQueryCountTestCase(SlotFixtureTestCase):
+    def test_slot_list_query_count_is_constant(self):
+        """
+        Test that listing slots costs the same number of queries for 2 or 20 slots
+        """
+        url = reverse('slot-list')
+
+        self.create_slots(2)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.create_slots(18)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 20)
+
+        participant = response.data['results'][0]['participants'][0]
+        self.assertEqual(participant['slot_details']['auto']['driver_details']['username'], 'driver')
+        self.assertEqual(participant['slot_details']['creator']['username'], 'customer')
+
+    def test_slot_detail_query_count(self):
+        """
+        Test that a single slot with nested participants is rendered in two queries
+        """
+        self.create_slots(1)
+        slot = Slot.objects.get()
+        url = reverse('slot-detail', kwargs={'pk': slot.id})
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['participants']), 3)
+
+class ListPaginationTestCase(SlotFixtureTestCase):
+    def test_slot_list_cursor_pagination(self):
+        """
+        Test that slot pages follow ride_time order and chain through next links
+        """
+        self.create_slots(5)
+        response = self.client.get(reverse('slot-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+        seen = [slot['id'] for slot in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(slot['id'] for slot in response.data['results'])
+        self.assertEqual(seen, sorted(Slot.objects.values_list('id', flat=True)))
+
+    def test_slot_list_summary_skips_nested_payloads(self):
+        """
+        Test that an empty ?expand= drops nested payloads and their queries
+        """
+        self.create_slots(3)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('slot-list'), {'expand': ''})
+        slot = response.data['results'][0]
+        self.assertNotIn('auto_details', slot)
+        self.assertNotIn('creator_details', slot)
+        self.assertNotIn('participants', slot)
+        self.assertEqual(slot['participants_count'], 4)
+
+        response = self.client.get(reverse('slot-list'), {'expand': 'creator_details'})
+        slot = response.data['results'][0]
+        self.assertIn('creator_details', slot)
+        self.assertNotIn('participants', slot)
+
+    def test_fields_whitelist(self):
+        """
+        Test that ?fields= keeps only the requested top level fields
+        """
+        self.create_slots(1)
+        response = self.client.get(reverse('slot-list'), {'fields': 'id,ride_time'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'ride_time'})
+
+        response = self.client.get(reverse('auto-list'), {'fields': 'id,license_plate'})
+        self.assertEqual(response.data['results'], [{'id': self.auto.id, 'license_plate': 'QC123'}])
+
+        response = self.client.get(reverse('user-list'), {'fields': 'username'})
+        self.assertIn({'username': 'rider0'}, response.data['results'])
+
+class SlotSearchAPITestCase(SlotFixtureTestCase):
+    def create_slot(self, **kwargs):
+        data = {
+            'auto': self.auto,
+            'creator': self.customer_user,
+            'max_capacity': 4,
+            'current_capacity': 1,
+            'fare': 100.00,
+            'status': 'OPEN',
+            'ride_time': '2030-02-15T10:00:00Z',
+            'start_loc': 'IITJ',
+            'dest_loc': 'Paota',
+        }
+        data.update(kwargs)
+        return Slot.objects.create(**data)
+
+    def test_search_filters_route_time_status_and_seats(self):
+        """
+        Test that search only returns open slots on the route, in the window, with seats
+        """
+        match = self.create_slot()
+        self.create_slot(dest_loc='Ratanada')
+        self.create_slot(status='PENDING_DRIVER')
+        self.create_slot(current_capacity=4)
+        self.create_slot(ride_time='2030-02-16T10:00:00Z')
+        tight = self.create_slot(current_capacity=3)
+
+        url = reverse('slot-search')
+        params = {
+            'start_loc': 'IITJ',
+            'dest_loc': 'Paota',
+            'ride_time_after': '2030-02-15T09:00:00Z',
+            'ride_time_before': '2030-02-15T11:00:00Z',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({slot['id'] for slot in response.data['results']}, {match.id, tight.id})
+
+        response = self.client.get(url, dict(params, seats=2))
+        self.assertEqual([slot['id'] for slot in response.data['results']], [match.id])
+
+    def test_search_rejects_bad_parameters(self):
+        """
+        Test that unknown locations and inverted windows are rejected
+        """
+        url = reverse('slot-search')
+        response = self.client.get(url, {'start_loc': 'Nowhere'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {
+            'ride_time_after': '2030-02-15T11:00:00Z',
+            'ride_time_before': '2030-02-15T09:00:00Z',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == 'sqlite', 'plan output is SQLite specific')
+    def test_search_uses_composite_index(self):
+        """
+        Test that the search query is planned on slot_search_idx
+        """
+        plan = Slot.objects.search(start_loc='IITJ', dest_loc='Paota',
+                                   ride_time_after='2030-02-15T09:00:00Z').explain()
+        self.assertIn('slot_search_idx', plan)
+
+class AutoDispatchQueueTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.autos = []
+        for i in range(3):
+            auto = Auto.objects.create(
+                driver=self.driver_user,
+                license_plate=f'FIFO{i}',
+                status='AVAILABLE'
+            )
+            AutoQueue.objects.create(auto=auto)
+            self.autos.append(auto)
+
+    def create_slot(self, **data):
+        payload = {'creator_id': self.customer_user.id, 'ride_time': '2030-02-15T10:00:00Z'}
+        payload.update(data)
+        return self.client.post(reverse('slot-create'), payload)
+
+    def test_slots_take_autos_oldest_first(self):
+        """
+        Test that slot creation dispatches autos in the order they were queued
+        """
+        dispatched = []
+        for _ in self.autos:
+            response = self.create_slot()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            dispatched.append(response.data['auto'])
+        self.assertEqual(dispatched, [auto.id for auto in self.autos])
+        self.assertFalse(AutoQueue.objects.exists())
+        self.assertEqual(set(Auto.objects.values_list('status', flat=True)), {'QUEUED'})
+
+        response = self.create_slot()
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_failed_slot_keeps_auto_queued(self):
+        """
+        Test that an invalid slot does not consume the auto at the head of the queue
+        """
+        response = self.create_slot(ride_time='2000-01-01T10:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(AutoQueue.objects.count(), 3)
+        self.assertEqual(AutoQueue.objects.pop(), self.autos[0])
+
+@override_settings(CACHES=TEST_CACHES)
+class AutoDispatchConcurrencyTestCase(TransactionTestCase):
+    workers = 8
+    autos = 40
+
+    def setUp(self):
+        self.creator = User.objects.create(
+            username='creator', email='creator@test.com',
+            phone='1234567890', user_type='CUSTOMER'
+        )
+        driver = User.objects.create(
+            username='driver', email='driver@test.com',
+            phone='0987654321', user_type='DRIVER'
+        )
+        for i in range(self.autos):
+            auto = Auto.objects.create(driver=driver, license_plate=f'STRESS{i}')
+            AutoQueue.objects.create(auto=auto)
+
+    def drain_queue(self):
+        client = APIClient()
+        created = []
+        try:
+            for _ in range(50 * self.autos):
+                response = client.post(reverse('slot-create'), {
+                    'creator_id': self.creator.id,
+                    'ride_time': '2030-02-15T10:00:00Z'
+                })
+                if response.status_code == status.HTTP_201_CREATED:
+                    created.append(response.data['auto'])
+                elif response.status_code == status.HTTP_404_NOT_FOUND:
+                    return created
+                # anything else is lock contention on this backend; retry
+            return created
+        finally:
+            connection.close()
+
+    def test_each_auto_dispatched_exactly_once(self):
+        """
+        Test that concurrent slot creation never hands the same auto out twice
+        """
+        # SQLite reports lock contention through the view's error print
+        with redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda _: self.drain_queue(), range(self.workers)))
+
+        dispatched = [auto_id for created in results for auto_id in created]
+        self.assertEqual(len(dispatched), self.autos)
+        self.assertEqual(len(set(dispatched)), self.autos)
+        self.assertFalse(AutoQueue.objects.exists())
+        self.assertEqual(
+            sorted(Slot.objects.values_list('auto_id', flat=True)),
+            sorted(dispatched)
+        )
+
+class SlotJoinTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.slot = Slot.objects.create(
+            auto=self.auto,
+            creator=self.customer_user,
+            max_capacity=2,
+            current_capacity=1,
+            fare=100.00,
+            status='OPEN',
+            ride_time='2030-02-15T10:00:00Z'
+        )
+
+    def join(self, user):
+        url = reverse('slot-join', kwargs={'pk': self.slot.id})
+        return self.client.post(url, {'user_id': user.id, 'convenience_fee': 10.00})
+
+    def test_join_reserves_a_seat(self):
+        """
+        Test that joining increments capacity and only touches current_capacity
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.join(self.riders[0])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_capacity, 2)
+
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "slots"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"fare"', updates[0])
+
+    def test_join_twice_is_rejected(self):
+        """
+        Test that a second join is rejected without taking another seat
+        """
+        self.slot.max_capacity = 4
+        self.slot.save()
+        self.assertEqual(self.join(self.riders[0]).status_code, status.HTTP_201_CREATED)
+
+        response = self.join(self.riders[0])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'You have already joined this slot')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_capacity, 2)
+
+    def test_cancelled_participant_can_rejoin(self):
+        """
+        Test that a rider whose participation was cancelled can join the slot again
+        """
+        SlotParticipant.objects.create(slot=self.slot, user=self.riders[0], status='CANCELLED', convenience_fee=10)
+        self.assertEqual(self.join(self.riders[0]).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(SlotParticipant.objects.filter(slot=self.slot).values_list('status', flat=True)),
+            ['CANCELLED', 'JOINED']
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SlotParticipant.objects.create(slot=self.slot, user=self.riders[0], status='JOINED', convenience_fee=10)
+
+    def test_join_full_slot_is_rejected(self):
+        """
+        Test that joining a full slot fails without changing capacity
+        """
+        self.assertEqual(self.join(self.riders[0]).status_code, status.HTTP_201_CREATED)
+        response = self.join(self.riders[1])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Slot is already full')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_capacity, 2)
+
+@override_settings(CACHES=TEST_CACHES)
+class SlotJoinConcurrencyTestCase(TransactionTestCase):
+    riders = 24
+    seats = 5
+
+    def setUp(self):
+        creator = User.objects.create(
+            username='creator', email='creator@test.com',
+            phone='1234567890', user_type='CUSTOMER'
+        )
+        driver = User.objects.create(
+            username='driver', email='driver@test.com',
+            phone='0987654321', user_type='DRIVER'
+        )
+        self.users = [
+            User.objects.create(
+                username=f'rider{i}', email=f'rider{i}@test.com',
+                phone='1111111111', user_type='CUSTOMER'
+            )
+            for i in range(self.riders)
+        ]
+        self.slot = Slot.objects.create(
+            auto=Auto.objects.create(driver=driver, license_plate='JOIN1', status='BOOKED'),
+            creator=creator,
+            max_capacity=self.seats + 1,
+            current_capacity=1,
+            fare=100.00,
+            status='OPEN',
+            ride_time='2030-02-15T10:00:00Z'
+        )
+
+    def join(self, user):
+        client = APIClient()
+        url = reverse('slot-join', kwargs={'pk': self.slot.id})
+        try:
+            for _ in range(200):
+                response = client.post(url, {'user_id': user.id, 'convenience_fee': 10.00})
+                # 500s are lock contention on this backend; retry
+                if response.status_code != status.HTTP_500_INTERNAL_SERVER_ERROR:
+                    return response.status_code
+        finally:
+            connection.close()
+
+    def test_parallel_joins_never_overbook(self):
+        """
+        Test that N parallel joins on a slot with K free seats admit exactly K riders
+        """
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(self.join, self.users))
+
+        self.assertEqual(results.count(status.HTTP_201_CREATED), self.seats)
+        self.assertEqual(results.count(status.HTTP_400_BAD_REQUEST), self.riders - self.seats)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_capacity, self.slot.max_capacity)
+        self.assertEqual(SlotParticipant.objects.filter(slot=self.slot).count(), self.seats)
+
+class OTPEmailTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.smtp = FakeSMTPServer().start()
+        self.addCleanup(self.smtp.stop)
+        override = self.settings(
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='noreply@urbanride.test',
+            EMAIL_HOST_PASSWORD='secret',
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def request_otp(self, email):
+        return self.client.post(reverse('request-otp'), {'email': email})
+
+    def test_otp_is_emailed_and_verifies(self):
+        """
+        Test that the OTP is delivered in the background and can be verified
+        """
+        response = self.request_otp('customer@test.com')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(get_mail_dispatcher().flush(timeout=5))
+
+        _, rcpt_tos, message = self.smtp.messages[0]
+        self.assertEqual(rcpt_tos, ['customer@test.com'])
+        body = message.get_payload()[0].get_payload()
+        otp = body.split('login is: ')[1][:6]
+
+        response = self.client.post(reverse('verify-otp'), {'email': 'customer@test.com', 'otp': otp})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['username'], 'customer')
+
+    def test_connections_are_reused_across_requests(self):
+        """
+        Test that a burst of OTP requests shares pooled, already authenticated connections
+        """
+        for _ in range(3):
+            for email in ('customer@test.com', 'driver@test.com'):
+                self.assertEqual(self.request_otp(email).status_code, status.HTTP_200_OK)
+            self.assertTrue(get_mail_dispatcher().flush(timeout=5))
+
+        self.assertEqual(len(self.smtp.messages), 6)
+        self.assertLessEqual(self.smtp.logins, get_mail_dispatcher().workers)
+
+    def test_refused_recipient_does_not_drop_the_rest_of_the_batch(self):
+        """
+        Test that one failing message is retried alone while the others in its batch are delivered
+        """
+        self.smtp.rejected.add('driver@test.com')
+        batch = [build_otp_email(email, '123456') for email in ('customer@test.com', 'driver@test.com', 'admin@test.com')]
+        with self.assertLogs('api.mailer', 'ERROR') as logs:
+            get_mail_dispatcher()._deliver(batch)
+
+        self.assertEqual([rcpt_tos for _, rcpt_tos, _ in self.smtp.messages],
+                         [['customer@test.com'], ['admin@test.com']])
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('driver@test.com', logs.output[0])
+
+    def test_unknown_user_sends_nothing(self):
+        """
+        Test that no email is queued for an unknown address
+        """
+        response = self.request_otp('nobody@test.com')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(get_mail_dispatcher().flush(timeout=5))
+        self.assertEqual(self.smtp.messages, [])
+
+class SQLiteCacheTestCase(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = SQLiteCache(os.path.join(tmp.name, 'cache.sqlite3'), {})
+
+    def test_basic_operations(self):
+        """
+        Test set/get/add/delete/incr semantics
+        """
+        self.cache.set('a', {'x': 1})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.assertFalse(self.cache.add('a', 2))
+        self.assertTrue(self.cache.add('b', 2))
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': {'x': 1}, 'b': 2})
+        self.assertEqual(self.cache.incr('b', 3), 5)
+        self.assertTrue(self.cache.delete('b'))
+        self.assertFalse(self.cache.has_key('b'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('b')
+
+    def test_expiry(self):
+        """
+        Test that expired entries are invisible and can be re-added
+        """
+        self.cache.set('a', 1, timeout=0.05)
+        self.assertEqual(self.cache.get('a'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertFalse(self.cache.touch('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertEqual(self.cache.get('a'), 2)
+
+class SharedCacheOTPTestCase(BaseTestCase):
+    worker_script = (
+        'import sys, django; django.setup()\n'
+        'from api.otp import issue_otp, check_otp\n'
+        'if sys.argv[1] == "issue":\n'
+        '    print(issue_otp(sys.argv[2]))\n'
+        'else:\n'
+        '    print(check_otp(sys.argv[2], sys.argv[3]) or "OK")\n'
+    )
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        location = os.path.join(tmp.name, 'cache.sqlite3')
+        override = self.settings(CACHES={
+            'default': {'BACKEND': 'api.cache_backends.SQLiteCache', 'LOCATION': location}
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        self.worker_env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='urban_ride.settings',
+            CACHE_BACKEND='sqlite',
+            CACHE_LOCATION=location,
+        )
+        super().setUp()
+
+    def run_worker(self, *args):
+        result = subprocess.run(
+            [sys.executable, '-c', self.worker_script, *args],
+            cwd=settings.BASE_DIR, env=self.worker_env,
+            capture_output=True, text=True, check=True,
+        )
+        return result.stdout.strip()
+
+    def test_otp_issued_in_another_process_verifies_here(self):
+        """
+        Test that an OTP stored by another worker process verifies through the API
+        """
+        otp = self.run_worker('issue', 'customer@test.com')
+        response = self.client.post(reverse('verify-otp'), {'email': 'customer@test.com', 'otp': otp})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('verify-otp'), {'email': 'customer@test.com', 'otp': otp})
+        self.assertEqual(response.data['error'], 'OTP expired')
+
+    def test_otp_issued_here_verifies_in_another_process(self):
+        """
+        Test that an OTP stored here is seen, and consumed, by another worker process
+        """
+        otp = issue_otp('customer@test.com')
+        wrong_otp = '000000' if otp != '000000' else '111111'
+        self.assertEqual(self.run_worker('check', 'customer@test.com', wrong_otp), 'Invalid OTP')
+        self.assertEqual(self.run_worker('check', 'customer@test.com', otp), 'OK')
+        self.assertEqual(check_otp('customer@test.com', otp), 'OTP expired')
+
+class SlotResponseCacheTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_slots(1)
+        self.slot = Slot.objects.get()
+        self.detail_url = reverse('slot-detail', kwargs={'pk': self.slot.id})
+
+    def test_detail_is_served_from_cache(self):
+        """
+        Test that a repeated detail read skips the database
+        """
+        first = self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        """
+        Test that revalidating an unchanged slot returns 304 without a body
+        """
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_join_invalidates_detail_and_list(self):
+        """
+        Test that joining a slot changes its ETag and refreshes cached lists
+        """
+        self.slot.max_capacity = 6
+        self.slot.save()
+        etag = self.client.get(self.detail_url)['ETag']
+        list_etag = self.client.get(reverse('slot-list'))['ETag']
+
+        rider = User.objects.create(username='late', email='late@test.com',
+                                    phone='1', user_type='CUSTOMER')
+        response = self.client.post(reverse('slot-join', kwargs={'pk': self.slot.id}),
+                                    {'user_id': rider.id, 'convenience_fee': 10.00})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['current_capacity'], 5)
+        self.assertEqual(len(response.data['participants']), 4)
+
+        response = self.client.get(reverse('slot-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['current_capacity'], 5)
+
+    def test_accept_and_create_invalidate(self):
+        """
+        Test that driver acceptance and slot creation invalidate cached responses
+        """
+        self.slot.status = 'PENDING_DRIVER'
+        self.slot.save()
+        self.client.get(self.detail_url)
+        self.client.get(reverse('slot-list'))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.driver_token}')
+        response = self.client.patch(reverse('slot-accept', kwargs={'pk': self.slot.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.detail_url).data['status'], 'OPEN')
+        self.assertEqual(self.client.get(self.detail_url).data['auto_details']['id'], self.auto.id)
+
+        queued = Auto.objects.create(driver=self.driver_user, license_plate='CACHE2')
+        AutoQueue.objects.create(auto=queued)
+        response = self.client.post(reverse('slot-create'), {
+            'creator_id': self.customer_user.id, 'ride_time': '2030-03-15T10:00:00Z'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self.client.get(reverse('slot-list')).data['results']), 2)
+
+class RealtimeSlotUpdatesTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.loop.call_soon_threadsafe, self.loop.stop)
+
+        self.slot = Slot.objects.create(
+            auto=self.auto,
+            creator=self.customer_user,
+            max_capacity=4,
+            current_capacity=1,
+            fare=100.00,
+            status='PENDING_DRIVER',
+            ride_time='2030-02-15T10:00:00Z'
+        )
+
+    def run_async(self, coroutine, timeout=30):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def connect(self, query=''):
+        async def connect():
+            client = WebsocketCommunicator(websocket_application, WEBSOCKET_PATH, query)
+            accepted, _ = await client.connect()
+            self.assertTrue(accepted)
+            return client
+        return self.run_async(connect())
+
+    def test_slot_and_route_subscribers_receive_deltas(self):
+        """
+        Test that accept and join push deltas to slot and route subscribers only
+        """
+        slot_client = self.connect(f'slot={self.slot.id}')
+        route_client = self.connect('route=IITJ→Paota')
+        other_client = self.connect('route=IITJ-Ratanada')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.driver_token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('slot-accept', kwargs={'pk': self.slot.id}))
+        for client in (slot_client, route_client):
+            message = self.run_async(client.receive_json())
+            self.assertEqual(message['event'], 'slot.accepted')
+            self.assertEqual(message['slot']['status'], 'OPEN')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('slot-join', kwargs={'pk': self.slot.id}),
+                                        {'user_id': self.riders[0].id, 'convenience_fee': 10.00})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for client in (slot_client, route_client):
+            message = self.run_async(client.receive_json())
+            self.assertEqual(message['event'], 'slot.joined')
+            self.assertEqual(message['slot']['current_capacity'], 2)
+            self.assertEqual(message['user'], self.riders[0].id)
+
+        self.assertTrue(self.run_async(other_client.receive_nothing()))
+        for client in (slot_client, route_client, other_client):
+            self.run_async(client.disconnect())
+
+    def test_subscribe_and_unsubscribe_messages(self):
+        """
+        Test that clients can change subscriptions after connecting
+        """
+        client = self.connect()
+        self.run_async(client.send_json({'action': 'subscribe', 'slot': self.slot.id}))
+        self.assertEqual(self.run_async(client.receive_json()),
+                         {'event': 'subscribed', 'topics': [f'slot:{self.slot.id}']})
+
+        self.run_async(client.send_json({'action': 'unsubscribe', 'slot': self.slot.id}))
+        self.assertEqual(self.run_async(client.receive_json())['topics'], [])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.driver_token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('slot-accept', kwargs={'pk': self.slot.id}))
+        self.assertTrue(self.run_async(client.receive_nothing()))
+
+        self.run_async(client.send_json({'action': 'subscribe', 'route': 'nowhere'}))
+        self.assertEqual(self.run_async(client.receive_json()), {'error': 'Invalid message'})
+        self.run_async(client.disconnect())
+
+    def test_unknown_path_is_rejected(self):
+        """
+        Test that connections outside the slot updates path are closed
+        """
+        async def connect():
+            client = WebsocketCommunicator(websocket_application, '/ws/other/')
+            return await client.connect()
+        accepted, event = self.run_async(connect())
+        self.assertFalse(accepted)
+        self.assertEqual(event['code'], 4404)
+
+    def test_thousands_of_idle_subscribers(self):
+        """
+        Test fan-out to a hot route while thousands of other subscribers stay idle
+        """
+        hot, idle = 500, 2500
+
+        async def scenario():
+            clients = []
+            for i in range(hot + idle):
+                query = 'route=IITJ-Paota' if i < hot else f'slot={100000 + i}'
+                client = WebsocketCommunicator(websocket_application, WEBSOCKET_PATH, query)
+                await client.connect()
+                clients.append(client)
+
+            delivered = await asyncio.get_running_loop().run_in_executor(
+                None, get_hub().publish, route_topic('IITJ', 'Paota'), {'event': 'ping'}
+            )
+            messages = await asyncio.gather(*(client.receive_json() for client in clients[:hot]))
+            quiet = await asyncio.gather(*(client.receive_nothing(0) for client in clients[hot:hot + 50]))
+            await asyncio.gather(*(client.disconnect() for client in clients))
+            return delivered, messages, quiet
+
+        delivered, messages, quiet = self.run_async(scenario(), timeout=120)
+        self.assertEqual(delivered, hot)
+        self.assertEqual(messages, [{'event': 'ping'}] * hot)
+        self.assertTrue(all(quiet))
+        self.assertEqual(get_hub().subscriber_count(route_topic('IITJ', 'Paota')), 0)
+
+class AsyncReadEndpointsTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_slots(3)
+        self.slot = Slot.objects.order_by('id').first()
+        self.factory = RequestFactory()
+
+    def assertSameResponse(self, sync_view, async_view, path, data=None, headers=None, **kwargs):
+        headers = headers or {}
+        sync_response = sync_view(self.factory.get(path, data, **headers), **kwargs)
+        sync_response.render()
+        async_response = async_to_sync(async_view)(self.factory.get(path, data, **headers), **kwargs)
+
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        for header in ('Content-Type', 'ETag', 'Cache-Control', 'Allow', 'Vary'):
+            self.assertEqual(async_response.get(header), sync_response.get(header), header)
+        return async_response
+
+    @override_settings(SLOT_CACHE_TIMEOUT=0)
+    def test_slot_list_matches_sync_view(self):
+        """
+        Test that the async slot list renders the same pages as the sync view
+        """
+        sync_view = SlotViewSet.as_view({'get': 'list'})
+        path = reverse('slot-list')
+        response = self.assertSameResponse(sync_view, async_views.slot_list, path, {'page_size': 2})
+        next_url = json.loads(response.content)['next']
+        response = self.assertSameResponse(sync_view, async_views.slot_list, path,
+                                           {'page_size': 2, 'cursor': next_url.split('cursor=')[1].split('&')[0]})
+        previous_url = json.loads(response.content)['previous']
+        self.assertSameResponse(sync_view, async_views.slot_list, path,
+                                {'page_size': 2, 'cursor': previous_url.split('cursor=')[1].split('&')[0]})
+        self.assertSameResponse(sync_view, async_views.slot_list, path, {'expand': '', 'fields': 'id,status'})
+        self.assertSameResponse(sync_view, async_views.slot_list, path, {'cursor': 'garbage'})
+
+    @override_settings(SLOT_CACHE_TIMEOUT=0)
+    def test_slot_detail_matches_sync_view(self):
+        """
+        Test that the async slot detail renders the same payload and errors
+        """
+        sync_view = SlotViewSet.as_view({'get': 'retrieve'})
+        path = reverse('slot-detail', kwargs={'pk': self.slot.id})
+        self.assertSameResponse(sync_view, async_views.slot_detail, path, pk=self.slot.id)
+        self.assertSameResponse(sync_view, async_views.slot_detail, '/api/slots/0/', pk=0)
+
+    def test_cached_and_not_modified_responses_match(self):
+        """
+        Test that async views share the sync views' cache entries and ETags
+        """
+        sync_view = SlotViewSet.as_view({'get': 'retrieve'})
+        path = reverse('slot-detail', kwargs={'pk': self.slot.id})
+        response = self.assertSameResponse(sync_view, async_views.slot_detail, path, pk=self.slot.id)
+
+        with self.assertNumQueries(0):
+            async_to_sync(async_views.slot_detail)(self.factory.get(path), pk=self.slot.id)
+        self.assertSameResponse(sync_view, async_views.slot_detail, path,
+                                headers={'HTTP_IF_NONE_MATCH': response['ETag']}, pk=self.slot.id)
+
+    def test_auto_list_matches_sync_view(self):
+        """
+        Test that the async auto list renders the same payload as the sync view
+        """
+        sync_view = AutoViewSet.as_view({'get': 'list'})
+        self.assertSameResponse(sync_view, async_views.auto_list, reverse('auto-list'))
+        self.assertSameResponse(sync_view, async_views.auto_list, reverse('auto-list'), {'fields': 'id'})
+
+class RideMatchTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_matching_engine()
+        self.addCleanup(reset_matching_engine)
+        self.near = self.open_slot('2030-02-15T10:00:00Z', current_capacity=2)
+        self.later = self.open_slot('2030-02-15T10:20:00Z', current_capacity=1)
+
+    def open_slot(self, ride_time, current_capacity=1, **kwargs):
+        return Slot.objects.create(
+            auto=self.auto,
+            creator=self.customer_user,
+            max_capacity=4,
+            current_capacity=current_capacity,
+            fare=100.00,
+            status='OPEN',
+            ride_time=ride_time,
+            **kwargs
+        )
+
+    def match(self, user, ride_time, **data):
+        payload = {
+            'user_id': user.id,
+            'start_loc': 'IITJ',
+            'dest_loc': 'Paota',
+            'ride_time': ride_time,
+            'window_minutes': 15,
+        }
+        payload.update(data)
+        return self.client.post(reverse('ride-match'), payload)
+
+    def test_rider_joins_closest_open_slot(self):
+        """
+        Test that a rider is pooled into the slot closest to their time instead of taking an auto
+        """
+        AutoQueue.objects.create(auto=Auto.objects.create(
+            driver=self.driver_user, license_plate='MATCH1', status='AVAILABLE'
+        ))
+        response = self.match(self.riders[0], '2030-02-15T10:05:00Z')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['matched'])
+        self.assertEqual(response.data['slot']['id'], self.near.id)
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.current_capacity, 3)
+        participant = SlotParticipant.objects.get(slot=self.near, user=self.riders[0])
+        self.assertEqual(participant.convenience_fee, quote_slot(self.near, seats=3)['convenience_fee'])
+        self.assertEqual(AutoQueue.objects.count(), 1)
+
+    def test_no_slot_in_window_creates_one(self):
+        """
+        Test that a rider outside every slot's window gets a new slot from the auto queue
+        """
+        queued = Auto.objects.create(driver=self.driver_user, license_plate='MATCH1', status='AVAILABLE')
+        AutoQueue.objects.create(auto=queued)
+
+        response = self.match(self.riders[0], '2030-02-15T12:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.data['matched'])
+        self.assertEqual(response.data['slot']['auto'], queued.id)
+        self.assertEqual(response.data['slot']['creator'], self.riders[0].id)
+
+        response = self.match(self.riders[1], '2030-02-15T14:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_creator_and_existing_participants_are_skipped(self):
+        """
+        Test that matching never puts a rider into a slot they created or already joined
+        """
+        SlotParticipant.objects.create(slot=self.near, user=self.riders[0], status='JOINED', convenience_fee=10.00)
+
+        response = self.match(self.riders[0], '2030-02-15T10:05:00Z')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['slot']['id'], self.later.id)
+
+        response = self.match(self.customer_user, '2030-02-15T10:05:00Z')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_departed_and_same_time_slots_are_skipped(self):
+        """
+        Test that matching skips slots that already left and slots at a time the rider is booked for
+        """
+        engine = get_matching_engine()
+        engine.ensure_loaded()
+        # Indexed by this process, so only the clamp to now keeps it out
+        with self.captureOnCommitCallbacks(execute=True):
+            self.open_slot(timezone.now() - timedelta(minutes=10))
+        response = self.match(self.riders[0], timezone.now().isoformat())
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        elsewhere = self.open_slot(self.near.ride_time, dest_loc='Ratanada')
+        SlotParticipant.objects.create(slot=elsewhere, user=self.riders[0], status='JOINED', convenience_fee=10.00)
+        response = self.match(self.riders[0], '2030-02-15T10:05:00Z')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['slot']['id'], self.later.id)
+
+    def test_stale_index_entry_falls_through(self):
+        """
+        Test that a slot filled behind the index's back is skipped rather than overbooked
+        """
+        get_matching_engine().ensure_loaded()
+        Slot.objects.filter(pk=self.near.pk).update(current_capacity=4)
+
+        response = self.match(self.riders[0], '2030-02-15T10:05:00Z')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['slot']['id'], self.later.id)
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.current_capacity, 4)
+
+    def test_index_follows_committed_changes(self):
+        """
+        Test that saved slots and joins update a loaded index without a rebuild
+        """
+        engine = get_matching_engine()
+        engine.ensure_loaded()
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.open_slot('2030-02-15T10:04:00Z', current_capacity=3)
+        added.refresh_from_db()
+        candidates = engine.candidates('IITJ', 'Paota', added.ride_time, 15)
+        self.assertEqual(candidates[0].slot_id, added.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotParticipant.objects.create(slot=added, user=self.riders[1], status='JOINED', convenience_fee=10.00)
+        candidates = engine.candidates('IITJ', 'Paota', added.ride_time, 15)
+        self.assertNotIn(added.id, [entry.slot_id for entry in candidates])
+
+    def test_route_index_ranks_by_gap_then_fullness(self):
+        """
+        Test that equally close slots are ranked fullest first
+        """
+        index = RouteIndex()
+        index.upsert(1, 1000, free_seats=3)
+        index.upsert(2, 1300, free_seats=1)
+        index.upsert(3, 700, free_seats=2)
+        index.upsert(4, 5000, free_seats=3)
+
+        ranked = [entry.slot_id for entry in index.candidates(1000, window=600)]
+        self.assertEqual(ranked, [1, 2, 3])
+        self.assertEqual([entry.slot_id for entry in index.candidates(1000, window=600, seats=2)], [1, 3])
+        self.assertEqual([entry.slot_id for entry in index.candidates(1000, window=600, now=1100)], [2])
+
+        index.take_seats(1, 3)
+        index.remove(3)
+        self.assertEqual([entry.slot_id for entry in index.candidates(1000, window=600)], [2])
+
+class PricingTestCase(SlotFixtureTestCase):
+    noon = '2030-02-15T06:30:00Z'  # 12:00 in Asia/Kolkata
+    rush = '2030-02-15T03:30:00Z'  # 09:00 in Asia/Kolkata
+
+    def test_quote_scales_with_distance_demand_and_occupancy(self):
+        """
+        Test that fares follow distance and demand and fees shrink as seats fill
+        """
+        midday = quote('IITJ', 'Paota', parse_datetime(self.noon), seats=1)
+        self.assertEqual(midday['fare'], Decimal('100.00'))
+        self.assertEqual(midday['convenience_fee'], Decimal('10.00'))
+
+        shared = quote('IITJ', 'Paota', parse_datetime(self.noon), seats=4)
+        self.assertEqual(shared['fare_per_seat'], Decimal('25.00'))
+        self.assertEqual(shared['convenience_fee'], Decimal('5.00'))
+
+        self.assertEqual(quote('IITJ', 'Paota', parse_datetime(self.rush))['fare'], Decimal('140.00'))
+        self.assertLess(quote('IITJ', 'NIFTJ', parse_datetime(self.noon))['fare'], midday['fare'])
+
+    def test_batch_endpoint_matches_single_quotes(self):
+        """
+        Test that a batch quote returns the same prices as quoting one at a time, in order
+        """
+        items = [
+            {'start_loc': start, 'dest_loc': dest, 'ride_time': ride_time, 'seats': seats}
+            for start, dest in [('IITJ', 'Paota'), ('Ratanada', 'NIFTJ'), ('Sardarpura', 'Paota')]
+            for ride_time in [self.noon, self.rush, '2030-02-15T20:00:00+05:30']
+            for seats in [1, 3]
+        ]
+        response = self.client.post(reverse('pricing-quotes'), {'quotes': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['quotes']), len(items))
+        for item, quoted in zip(items, response.data['quotes']):
+            single = quote(item['start_loc'], item['dest_loc'], parse_datetime(item['ride_time']), item['seats'])
+            self.assertEqual({name: to_decimal(value) for name, value in quoted.items()}, single)
+
+    def test_batch_endpoint_rejects_bad_items(self):
+        """
+        Test that an invalid item fails the whole batch and is named in the error
+        """
+        items = [
+            {'start_loc': 'IITJ', 'dest_loc': 'Paota', 'ride_time': self.noon},
+            {'start_loc': 'Mars', 'dest_loc': 'Paota', 'ride_time': self.noon},
+        ]
+        response = self.client.post(reverse('pricing-quotes'), {'quotes': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quotes[1]', response.data['error'])
+
+        for seats in (0, settings.PRICING_MAX_SEATS + 1, 10 ** 20, 1.5, True, '2'):
+            items[1] = {'start_loc': 'IITJ', 'dest_loc': 'Paota', 'ride_time': self.noon, 'seats': seats}
+            response = self.client.post(reverse('pricing-quotes'), {'quotes': items}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, seats)
+            self.assertIn('quotes[1]', response.data['error'])
+
+    @override_settings(PRICING_MAX_BATCH=2)
+    def test_batch_size_is_checked_before_the_items(self):
+        """
+        Test that a batch over PRICING_MAX_BATCH is refused on its length alone
+        """
+        response = self.client.post(reverse('pricing-quotes'), {'quotes': ['a', 'b', 'c']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['quotes'], ['Ensure this field has no more than 2 elements.'])
+
+    def test_slot_without_fare_is_priced(self):
+        """
+        Test that creating a slot without a fare prices it from route and time
+        """
+        AutoQueue.objects.create(auto=Auto.objects.create(
+            driver=self.driver_user, license_plate='PRICE1', status='AVAILABLE'
+        ))
+        response = self.client.post(reverse('slot-create'), {
+            'creator_id': self.customer_user.id, 'ride_time': self.rush,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.data['fare']), Decimal('140.00'))
+
+    def test_convenience_fee_and_join_use_occupancy(self):
+        """
+        Test that the fee endpoint and a join without a fee both price the rider's share
+        """
+        slot = Slot.objects.create(
+            auto=self.auto,
+            creator=self.customer_user,
+            max_capacity=4,
+            current_capacity=1,
+            fare=100.00,
+            status='OPEN',
+            ride_time=self.noon
+        )
+        slot.refresh_from_db()
+        url = reverse('payment-convenience-fee')
+        response = self.client.post(url, {'slot_id': slot.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_fee'], quote_slot(slot, seats=2)['convenience_fee'])
+        self.assertEqual(self.client.post(url, {}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'slot_id': 0}).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(reverse('slot-join', kwargs={'pk': slot.id}), {'user_id': self.riders[0].id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.data['convenience_fee']), Decimal('5.00'))
+
+class SlotBulkCreateTestCase(SlotFixtureTestCase):
+    ride_time = '2030-02-15T03:30:00Z'
+
+    def setUp(self):
+        super().setUp()
+        self.queued = self.queue_autos(3)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_token}')
+
+    def queue_autos(self, count):
+        autos = []
+        for _ in range(count):
+            auto = Auto.objects.create(
+                driver=self.driver_user,
+                license_plate=f'BULK{Auto.objects.count()}',
+                status='AVAILABLE'
+            )
+            AutoQueue.objects.create(auto=auto)
+            autos.append(auto)
+        return autos
+
+    def row(self, **data):
+        row = {'creator_id': self.customer_user.id, 'ride_time': self.ride_time}
+        row.update(data)
+        return row
+
+    def post(self, rows):
+        return self.client.post(reverse('slot-bulk-create'), rows, format='json')
+
+    def test_valid_rows_are_created_and_bad_rows_reported(self):
+        """
+        Test that bad rows are reported by index without stopping the valid ones
+        """
+        response = self.post([
+            self.row(),
+            self.row(participants=[self.riders[0].id, {'user_id': self.riders[1].id, 'convenience_fee': '7.50'}]),
+            self.row(start_loc='Mars'),
+            self.row(ride_time='2000-01-01T10:00:00Z'),
+            self.row(creator_id=0),
+            self.row(participants=[self.riders[2].id] * 4),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['row'] for row in response.data['created']], [0, 1])
+        self.assertEqual([row['auto'] for row in response.data['created']], [auto.id for auto in self.queued[:2]])
+        errors = {row['row']: row['errors'] for row in response.data['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5])
+        self.assertIn('start_loc', errors[2])
+        self.assertEqual(errors[3], {'ride_time': ['Ride time cannot be in the past']})
+        self.assertEqual(errors[4], {'creator_id': ['Invalid creator ID']})
+        self.assertIn('participants', errors[5])
+
+        priced, shared = (Slot.objects.get(pk=row['id']) for row in response.data['created'])
+        self.assertEqual(priced.status, 'PENDING_DRIVER')
+        self.assertEqual(priced.fare, Decimal('140.00'))
+        self.assertEqual(shared.current_capacity, 3)
+        fees = dict(shared.participants.values_list('user_id', 'convenience_fee'))
+        self.assertEqual(fees, {self.riders[0].id: Decimal('5.00'), self.riders[1].id: Decimal('7.50')})
+
+        self.assertEqual(AutoQueue.objects.count(), 1)
+        self.assertEqual(Auto.objects.get(pk=self.queued[0].pk).status, 'QUEUED')
+
+    def test_rows_beyond_the_queue_are_reported(self):
+        """
+        Test that rows left over when the auto queue empties fail with an auto error
+        """
+        response = self.post({'slots': [self.row() for _ in range(5)]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 3)
+        self.assertEqual(response.data['errors'], [
+            {'row': 3, 'errors': {'auto': ['No autos in queue']}},
+            {'row': 4, 'errors': {'auto': ['No autos in queue']}},
+        ])
+
+        response = self.post([self.row()])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_riders_cannot_be_double_booked(self):
+        """
+        Test that a rider booked elsewhere at the same time, or twice in the batch, is rejected
+        """
+        self.create_slots(1)
+        Slot.objects.update(ride_time=self.ride_time)
+        response = self.post([
+            self.row(participants=[self.riders[0].id]),
+            self.row(ride_time='2030-02-16T03:30:00Z', participants=[self.riders[1].id]),
+            self.row(ride_time='2030-02-16T03:30:00Z', participants=[self.riders[1].id]),
+        ])
+        self.assertEqual([row['row'] for row in response.data['created']], [1])
+        self.assertEqual([row['row'] for row in response.data['errors']], [0, 2])
+
+    def test_requires_an_admin(self):
+        """
+        Test that only admins can bulk create slots
+        """
+        self.client.credentials()
+        self.assertEqual(self.post([self.row()]).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        self.assertEqual(self.post([self.row()]).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Slot.objects.exists())
+        self.assertEqual(AutoQueue.objects.count(), 3)
+
+    def test_ndjson_stream(self):
+        """
+        Test that NDJSON uploads are parsed line by line and bad lines become row errors
+        """
+        body = '\n'.join([json.dumps(self.row()), '{not json', '', json.dumps(self.row())])
+        response = self.client.post(reverse('slot-bulk-create'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['row'] for row in response.data['created']], [0, 2])
+        self.assertEqual([row['row'] for row in response.data['errors']], [1])
+
+    @override_settings(SLOT_BULK_MAX_ROWS=2)
+    def test_ndjson_stops_reading_past_the_row_limit(self):
+        """
+        Test that an NDJSON upload over SLOT_BULK_MAX_ROWS is refused without parsing the rest of it
+        """
+        body = '\n'.join(json.dumps(self.row()) for _ in range(3)).encode() + b'\n\xff\n'
+        response = self.client.post(reverse('slot-bulk-create'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error': 'At most 2 slots per request'})
+        self.assertFalse(Slot.objects.exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """
+        Test that a chunk costs the same queries for 2 slots as for 20
+        """
+        self.queue_autos(20)
+        counts = []
+        for size in (2, 20):
+            rows = [self.row(participants=[self.riders[0].id]) for _ in range(size)]
+            for i, row in enumerate(rows):
+                row['ride_time'] = f'2030-03-{size:02d}T{i % 24:02d}:00:00Z'
+                row['start_loc'] = 'NIFTJ'
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(rows)
+            self.assertEqual(len(response.data['created']), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+@override_settings(EXPORT_SAFETY_LAG=0)
+class ExportTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_token}')
+
+    def export(self, dataset, **params):
+        response = self.client.get(reverse('export', kwargs={'dataset': dataset}), params)
+        body = b''.join(response.streaming_content).decode() if response.streaming else None
+        return response, body
+
+    def test_ndjson_export_streams_every_row(self):
+        """
+        Test that participants stream as one JSON object per line with fee and paid
+        """
+        self.create_slots(2)
+        response, body = self.export('participants')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['convenience_fee'], '10.00')
+        self.assertFalse(rows[0]['paid'])
+        self.assertEqual(response['X-Export-Cursor'], str(rows[-1]['id']))
+
+    def test_csv_export_and_since_cursor(self):
+        """
+        Test that a CSV export resumed from the cursor only contains newer rows
+        """
+        self.create_slots(1)
+        response, body = self.export('rides', format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_id', 'username'])
+        self.assertEqual(len(lines), 4)
+
+        cursor = response['X-Export-Cursor']
+        self.create_slots(1)
+        response, body = self.export('rides', format='csv', since=cursor)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(int(row['id']) > int(cursor) for row in rows))
+        self.assertEqual({row['username'] for row in rows}, {rider.username for rider in self.riders})
+
+    def test_cursor_holds_back_recent_rows(self):
+        """
+        Test that rows newer than the safety lag wait for the next export and the cursor never moves back
+        """
+        self.create_slots(1)
+        settled = Slot.objects.get()
+        Slot.objects.filter(pk=settled.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.create_slots(1)
+        with override_settings(EXPORT_SAFETY_LAG=60):
+            response, body = self.export('slots')
+            self.assertEqual(response['X-Export-Cursor'], str(settled.id))
+            self.assertEqual(len(body.splitlines()), 1)
+
+            latest = Slot.objects.order_by('-id').first().id
+            response, body = self.export('slots', since=latest)
+            self.assertEqual(response['X-Export-Cursor'], str(latest))
+            self.assertEqual(body, '')
+
+    def test_query_count_is_flat(self):
+        """
+        Test that exporting does not run queries per row
+        """
+        self.create_slots(1)
+        with CaptureQueriesContext(connection) as small:
+            self.export('slots')
+        self.create_slots(30)
+        with CaptureQueriesContext(connection) as large:
+            _, body = self.export('slots')
+        self.assertEqual(len(body.splitlines()), 31)
+        self.assertEqual(len(small), len(large))
+
+    def test_asgi_export_streams_without_buffering(self):
+        """
+        Test that under ASGI the export streams from an async iterator instead of being buffered
+        """
+        self.create_slots(40)
+        chunks = []
+        application = get_asgi_application()
+
+        async def send_chunks():
+            status_code, headers, body = await http_request(
+                application, '/api/exports/participants/',
+                headers=[(b'authorization', f'Bearer {self.admin_token}'.encode())],
+            )
+            chunks.append((status_code, body))
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            async_to_sync(send_chunks)()
+        status_code, body = chunks[0]
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(len(body.splitlines()), 120)
+        # Django warns when it has to consume a sync iterator up front
+        self.assertFalse([w for w in caught if 'synchronous iterators' in str(w.message)])
+
+    def test_export_requires_admin_and_valid_params(self):
+        """
+        Test that exports are admin only and reject unknown datasets and bad cursors
+        """
+        self.assertEqual(self.export('users')[0].status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.export('slots', since='abc')[0].status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        self.assertEqual(self.export('slots')[0].status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        """
+        Test that export_data writes the same rows and reports the cursor
+        """
+        self.create_slots(2)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('export_data', 'slots', '--format', 'csv', stdout=out, stderr=err)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertIn(f'cursor: {Slot.objects.order_by("-id").first().id}', err.getvalue())
+
+class SlotLifecycleTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.autos = [
+            Auto.objects.create(driver=self.driver_user, license_plate=f'LIFE{i}', status=auto_status)
+            for i, auto_status in enumerate(['QUEUED', 'BOOKED', 'BOOKED', 'BOOKED'])
+        ]
+
+    def slot(self, auto, slot_status, ride_time, created_at=None):
+        slot = Slot.objects.create(
+            auto=auto,
+            creator=self.customer_user,
+            max_capacity=4,
+            current_capacity=1,
+            fare=100.00,
+            status=slot_status,
+            ride_time=ride_time
+        )
+        if created_at:
+            Slot.objects.filter(pk=slot.pk).update(created_at=created_at)
+        return slot
+
+    def scheduler(self):
+        return LifecycleScheduler(clock=lambda: self.now)
+
+    def status_of(self, obj):
+        obj.refresh_from_db()
+        return obj.status
+
+    def test_tick_expires_finalizes_and_recycles(self):
+        """
+        Test that due slots move on and only autos with no active slot return to the queue
+        """
+        hour = timedelta(hours=1)
+        unaccepted = self.slot(self.autos[0], 'PENDING_DRIVER', self.now + hour, created_at=self.now - hour)
+        finished = self.slot(self.autos[1], 'OPEN', self.now - 2 * hour)
+        upcoming = self.slot(self.autos[2], 'OPEN', self.now + hour)
+        done = self.slot(self.autos[3], 'BOOKED', self.now - 2 * hour)
+        still_busy = self.slot(self.autos[3], 'OPEN', self.now + hour)
+
+        scheduler = self.scheduler()
+        scheduler.tick()
+        self.assertEqual(self.status_of(unaccepted), 'CANCELLED')
+        self.assertEqual(self.status_of(finished), 'FINALIZED')
+        self.assertEqual(self.status_of(done), 'FINALIZED')
+        self.assertEqual(self.status_of(upcoming), 'OPEN')
+        self.assertEqual(self.status_of(still_busy), 'OPEN')
+        self.assertEqual(scheduler.totals, {'expired': 1, 'finalized': 2, 'recycled': 2})
+
+        self.assertEqual([self.status_of(auto) for auto in self.autos], ['AVAILABLE', 'AVAILABLE', 'BOOKED', 'BOOKED'])
+        self.assertEqual(
+            sorted(AutoQueue.objects.values_list('auto_id', flat=True)),
+            [self.autos[0].id, self.autos[1].id]
+        )
+
+    def test_sleeps_until_next_due_slot(self):
+        """
+        Test that the worker wakes when the earliest slot is due and not before
+        """
+        finishing = self.slot(self.autos[1], 'OPEN', self.now - timedelta(seconds=settings.SLOT_RIDE_DURATION - 30))
+        scheduler = self.scheduler()
+        self.assertAlmostEqual(scheduler.tick(), 30, delta=1)
+        self.assertEqual(self.status_of(finishing), 'OPEN')
+
+        self.now += timedelta(seconds=30)
+        scheduler.tick()
+        self.assertEqual(self.status_of(finishing), 'FINALIZED')
+        self.assertEqual(len(scheduler), 0)
+
+    def test_slot_accepted_after_scheduling_is_left_alone(self):
+        """
+        Test that the UPDATE re-checks status so a stale schedule entry is harmless
+        """
+        pending = self.slot(self.autos[0], 'PENDING_DRIVER', self.now + timedelta(seconds=20))
+        scheduler = self.scheduler()
+        scheduler.tick()
+        Slot.objects.filter(pk=pending.pk).update(status='OPEN')
+
+        self.now += timedelta(seconds=20)
+        scheduler.tick()
+        self.assertEqual(self.status_of(pending), 'OPEN')
+        self.assertEqual(self.status_of(self.autos[0]), 'QUEUED')
+        self.assertFalse(AutoQueue.objects.exists())
+
+    def test_slot_cancelled_elsewhere_is_not_transitioned_again(self):
+        """
+        Test that a tick only reports and recycles the slots it moved itself
+        """
+        due = self.now + timedelta(seconds=20)
+        cancelled = self.slot(self.autos[1], 'PENDING_DRIVER', due)
+        unaccepted = self.slot(self.autos[0], 'PENDING_DRIVER', due)
+        scheduler = self.scheduler()
+        scheduler.tick()
+        Slot.objects.filter(pk=cancelled.pk).update(status='CANCELLED')
+
+        self.now += timedelta(seconds=20)
+        scheduler.tick()
+        self.assertEqual(self.status_of(unaccepted), 'CANCELLED')
+        self.assertEqual(scheduler.totals, {'expired': 1, 'finalized': 0, 'recycled': 1})
+        self.assertEqual(list(AutoQueue.objects.values_list('auto_id', flat=True)), [self.autos[0].id])
+        self.assertEqual(self.status_of(self.autos[1]), 'BOOKED')
+
+    def test_run_lifecycle_once(self):
+        """
+        Test that the management command processes everything due and reports totals
+        """
+        self.slot(self.autos[1], 'BOOKED', timezone.now() - timedelta(days=1))
+        out = io.StringIO()
+        call_command('run_lifecycle', '--once', stdout=out)
+        self.assertIn('finalized 1, recycled 1 autos', out.getvalue())
+
+
+class RouteAvailabilityTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ride_time = timezone.now() + timedelta(hours=2)
+        self.key = ('IITJ', 'Paota', hour_bucket(self.ride_time))
+
+    def slot(self, slot_status='OPEN', ride_time=None, **fields):
+        slot = Slot.objects.create(
+            auto=self.auto,
+            creator=self.customer_user,
+            max_capacity=fields.pop('max_capacity', 4),
+            current_capacity=1,
+            fare=100.00,
+            status=slot_status,
+            ride_time=ride_time or self.ride_time,
+            **fields
+        )
+        slot.refresh_from_db()
+        return slot
+
+    def summary(self):
+        return {
+            (row.start_loc, row.dest_loc, row.hour): (row.open_slots, row.free_seats)
+            for row in RouteAvailability.objects.exclude(open_slots=0, free_seats=0)
+        }
+
+    def assertInStep(self, expected):
+        self.assertEqual(self.summary(), expected)
+        self.assertEqual(actual_counts(Slot.objects.all()), expected)
+
+    def test_accept_join_and_cancel_update_summary(self):
+        """
+        Test that each slot transition adjusts its route and hour incrementally
+        """
+        slot = self.slot('PENDING_DRIVER')
+        self.assertInStep({})
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.driver_token}')
+        response = self.client.put(reverse('slot-accept', kwargs={'pk': slot.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertInStep({self.key: (1, 3)})
+
+        response = self.client.post(
+            reverse('slot-join', kwargs={'pk': slot.id}),
+            {'user_id': self.riders[0].id, 'convenience_fee': 10.00}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertInStep({self.key: (1, 2)})
+
+        other = self.slot(dest_loc='Ratanada', max_capacity=2)
+        other_key = ('IITJ', 'Ratanada', self.key[2])
+        self.assertInStep({self.key: (1, 2), other_key: (1, 1)})
+
+        slot.refresh_from_db()
+        slot.status = 'CANCELLED'
+        slot.save()
+        self.assertInStep({other_key: (1, 1)})
+
+        other.delete()
+        self.assertInStep({})
+
+    def test_moving_a_slot_moves_its_seats(self):
+        """
+        Test that a new ride_time takes the slot out of one hour and into another
+        """
+        slot = self.slot()
+        slot.ride_time += timedelta(hours=3)
+        slot.save()
+        self.assertInStep({('IITJ', 'Paota', hour_bucket(slot.ride_time)): (1, 3)})
+
+        # Deferred fields leave the old state unknown; the new row is rebuilt
+        deferred = Slot.objects.only('id', 'status').get(pk=slot.pk)
+        deferred.status = 'CANCELLED'
+        deferred.save()
+        self.assertInStep({})
+
+    def test_finalized_slots_leave_summary(self):
+        """
+        Test that the lifecycle worker's bulk UPDATEs are reflected too
+        """
+        ride_time = timezone.now() - timedelta(seconds=settings.SLOT_RIDE_DURATION + 60)
+        self.slot(ride_time=ride_time)
+        self.slot()
+        self.assertEqual(len(self.summary()), 2)
+
+        LifecycleScheduler().tick()
+        self.assertInStep({self.key: (1, 3)})
+
+    def test_hours_are_local(self):
+        """
+        Test that slots are bucketed by the local hour pricing uses, not the UTC hour
+        """
+        ride_time = parse_datetime('2030-02-15T09:10:00Z')  # 14:40 in Asia/Kolkata
+        self.assertEqual(hour_bucket(ride_time), parse_datetime('2030-02-15T14:00:00+05:30'))
+        self.assertEqual(timezone.localtime(hour_bucket(ride_time)).hour, local_hour(ride_time, timezone.get_default_timezone()))
+        # An activated time zone moves neither the bucket nor the priced hour
+        with timezone.override('UTC'):
+            self.assertEqual(hour_bucket(ride_time), parse_datetime('2030-02-15T14:00:00+05:30'))
+            self.assertEqual(quote('IITJ', 'Paota', parse_datetime('2030-02-15T03:30:00Z'))['fare'], Decimal('140.00'))
+
+        self.slot(ride_time=ride_time)
+        self.slot(ride_time=parse_datetime('2030-02-15T08:45:00Z'))  # 14:15
+        self.slot(ride_time=parse_datetime('2030-02-15T08:20:00Z'))  # 13:50
+        self.assertInStep({
+            ('IITJ', 'Paota', parse_datetime('2030-02-15T14:00:00+05:30')): (2, 6),
+            ('IITJ', 'Paota', parse_datetime('2030-02-15T13:00:00+05:30')): (1, 3),
+        })
+
+    def test_reconcile_repairs_drift_and_prunes(self):
+        """
+        Test that the reconciliation job rewrites rows to match the slots table
+        """
+        self.slot()
+        self.slot(start_loc='NIFTJ')
+        Slot.objects.filter(start_loc='NIFTJ').update(current_capacity=3)
+        RouteAvailability.objects.create(
+            start_loc='Paota', dest_loc='IITJ', hour=self.key[2], open_slots=5, free_seats=9
+        )
+        RouteAvailability.objects.create(
+            start_loc='IITJ', dest_loc='Paota', hour=self.key[2] - timedelta(days=1), open_slots=1, free_seats=1
+        )
+
+        out = io.StringIO()
+        call_command('reconcile_availability', '--once', stdout=out)
+        self.assertIn('created 0, updated 1, deleted 2 rows', out.getvalue())
+        self.assertInStep({self.key: (1, 3), ('NIFTJ', 'Paota', self.key[2]): (1, 1)})
+
+    def test_endpoint_is_one_query(self):
+        """
+        Test that the endpoint serves upcoming hours from the summary in one query
+        """
+        self.slot()
+        self.slot()
+        self.slot(start_loc='NIFTJ')
+        self.slot(ride_time=timezone.now() + timedelta(days=3))
+        url = reverse('route-availability')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['start_loc'], row['open_slots'], row['free_seats']) for row in response.data],
+            [('IITJ', 2, 6), ('NIFTJ', 1, 3)]
+        )
+
+        response = self.client.get(url, {'start_loc': 'IITJ', 'dest_loc': 'Paota', 'hours': 168})
+        self.assertEqual([row['open_slots'] for row in response.data], [2, 1])
+        self.assertEqual(self.client.get(url, {'hours': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(METRICS_TOKEN='scrape-me')
+class ProfilingMiddlewareTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_registry()
+        self.create_slots(3)
+
+    def metrics(self, token='scrape-me'):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.get(reverse('metrics'), **headers)
+
+    def test_unsampled_requests_are_not_recorded(self):
+        """
+        Test that with sampling off requests pass straight through
+        """
+        response = self.client.get(reverse('slot-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('view="slot-list"', self.metrics().content.decode())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_request_is_recorded(self):
+        """
+        Test that a sampled request reports queries, serializer time and size per view
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('slot-list'))
+        # The next request resets the query log CaptureQueriesContext reads
+        query_count = len(queries)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(f'desc="{query_count} queries"', response['Server-Timing'])
+
+        registry = get_registry()
+        labels = ('slot-list', 'GET')
+        self.assertEqual(registry.requests.series[labels][-2], 1)
+        self.assertEqual(registry.queries.series[labels][-1], query_count)
+        self.assertEqual(registry.response_size.series[labels][-1], len(response.content))
+        self.assertGreater(registry.serializer_time.series[labels][-1], 0)
+
+        body = self.metrics().content.decode()
+        self.assertIn('# TYPE urban_ride_request_duration_seconds histogram', body)
+        self.assertIn('urban_ride_request_duration_seconds_count{view="slot-list",method="GET"} 1', body)
+        self.assertIn(f'urban_ride_db_queries_sum{{view="slot-list",method="GET"}} {float(query_count)}', body)
+        self.assertIn('urban_ride_response_size_bytes_bucket{view="slot-list",method="GET",le="+Inf"} 1', body)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_repeated_statements_are_flagged(self):
+        """
+        Test that one statement run per id is reported as an N+1, and an IN query is not
+        """
+        def per_rider(request):
+            for rider in self.riders + [self.customer_user, self.driver_user]:
+                User.objects.get(pk=rider.pk)
+            return HttpResponse('ok')
+
+        def batched(request):
+            list(User.objects.filter(pk__in=[rider.pk for rider in self.riders]))
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/loop/')
+        with self.assertLogs('api.profiling', 'WARNING') as logs:
+            ProfilingMiddleware(per_rider)(request)
+        self.assertIn('5 executions of SELECT', logs.output[0])
+        self.assertEqual(get_registry().n_plus_one.series[('unresolved', 'GET')], 1)
+
+        with self.assertNoLogs('api.profiling', 'WARNING'):
+            ProfilingMiddleware(batched)(request)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_async_requests_are_profiled(self):
+        """
+        Test that queries run through sync_to_async under ASGI are counted
+        """
+        application = get_asgi_application()
+        result = async_to_sync(http_request)(application, '/api/slots/')
+        self.assertEqual(result[0], status.HTTP_200_OK)
+        headers = {name.lower(): value for name, value in result[1]}
+        timing = headers[b'server-timing'].decode()
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_metrics_token(self):
+        """
+        Test that scraping metrics requires the configured token, and is off without one
+        """
+        self.assertEqual(self.metrics(token=None).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.metrics(token='guess').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.metrics()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.metrics(token=None).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LoadTestSuiteTestCase(BaseTestCase):
+    def test_seed_and_run_every_flow(self):
+        """
+        Test that the load test seeds data and drives each flow end to end without errors
+        """
+        riders = seed(customers=10, drivers=4, slots=20, rng=random.Random(1))
+        self.assertEqual(len(riders), 10)
+        self.assertEqual(AutoQueue.objects.count(), 2)
+        self.assertEqual(Slot.objects.count(), 20)
+        self.assertEqual(
+            SlotParticipant.objects.count(),
+            sum(Slot.objects.values_list('current_capacity', flat=True)) - 20
+        )
+
+        test = LoadTest(ASGITransport(get_asgi_application()), riders, concurrency=2, iterations=2)
+        report = async_to_sync(test.run)().summary()
+        for flow in FLOWS:
+            self.assertEqual(report[flow]['errors'], {}, flow)
+        self.assertEqual(report['register']['count'], 4)
+        self.assertEqual(report['join']['count'], 2)
+        self.assertEqual(report['login']['count'], 2)
+        self.assertEqual(report['total']['count'], 16)
+        self.assertEqual(SlotParticipant.objects.filter(slot__creator__username__startswith='lt_customer').count(), 2)
+        # Each flow hands its auto to the queue and takes the head, so it stays level
+        self.assertEqual(AutoQueue.objects.count(), 2)
+
+    def test_regressions_against_baseline(self):
+        """
+        Test that slower p95 or lower throughput beyond the tolerance is reported
+        """
+        baseline = {'list': {'p95_ms': 10.0, 'throughput': 100.0}}
+        self.assertEqual(regressions({'list': {'p95_ms': 11.5, 'throughput': 85.0}}, baseline), [])
+        found = regressions({'list': {'p95_ms': 13.0, 'throughput': 70.0}}, baseline)
+        self.assertEqual(len(found), 2)
+        self.assertTrue(found[0].startswith('list: p95 13.0ms'))
+
+@override_settings(SLOT_CACHE_TIMEOUT=0)
+class FastReadSerializersTestCase(SlotFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_slots(3)
+        # Non-ASCII, a JSON-breaking line separator and blank optional fields
+        self.customer_user.college = 'Café\u2028"IIT" \\ Delhi'
+        self.customer_user.address = ''
+        self.customer_user.save()
+        # One slot with a seat left, for search
+        Slot.objects.filter(pk=Slot.objects.order_by('id').first().pk).update(
+            fare=Decimal('87.50'), current_capacity=3
+        )
+
+    def assertSameContent(self, path, data=None):
+        responses = []
+        for fast in (False, True):
+            with override_settings(FAST_READ_SERIALIZERS=fast):
+                responses.append(self.client.get(path, data))
+        drf, fast = responses
+        self.assertEqual(fast.status_code, drf.status_code)
+        self.assertEqual(fast['Content-Type'], drf['Content-Type'])
+        self.assertEqual(fast.content, drf.content)
+        return fast
+
+    def test_slot_endpoints_match_drf_bytes(self):
+        """
+        Test that the fast slot list, search and detail render the same bytes as DRF
+        """
+        response = self.assertSameContent(reverse('slot-list'), {'page_size': 2})
+        self.assertIn(b'Caf\xc3\xa9\\u2028\\"IIT\\" \\\\ Delhi', response.content)
+        cursor = json.loads(response.content)['next'].split('cursor=')[1].split('&')[0]
+        self.assertSameContent(reverse('slot-list'), {'page_size': 2, 'cursor': cursor})
+        self.assertSameContent(reverse('slot-list'), {'fields': 'id,fare,ride_time,participants'})
+        self.assertSameContent(reverse('slot-list'), {'expand': 'creator_details'})
+        self.assertSameContent(reverse('slot-list'), {'cursor': 'garbage'})
+        response = self.assertSameContent('/api/slots/search/', {'start_loc': 'IITJ'})
+        self.assertEqual(len(json.loads(response.content)['results']), 1)
+        slot = Slot.objects.order_by('id').first()
+        self.assertSameContent(reverse('slot-detail', kwargs={'pk': slot.id}))
+        self.assertSameContent(reverse('slot-detail', kwargs={'pk': 0}))
+
+    def test_auto_list_matches_drf_bytes(self):
+        """
+        Test that the fast auto list and detail render the same bytes as DRF
+        """
+        self.assertSameContent('/api/autos/')
+        self.assertSameContent('/api/autos/', {'fields': 'id,driver_details'})
+        self.assertSameContent(f'/api/autos/{self.auto.id}/')
+
+    def test_async_views_match_drf_bytes(self):
+        """
+        Test that the async views render the same bytes on the fast path
+        """
+        factory = RequestFactory()
+        slot = Slot.objects.order_by('id').first()
+        for view, path, kwargs in (
+            (async_views.slot_list, reverse('slot-list'), {}),
+            (async_views.slot_detail, reverse('slot-detail', kwargs={'pk': slot.id}), {'pk': slot.id}),
+            (async_views.auto_list, '/api/autos/', {}),
+        ):
+            contents = []
+            for fast in (False, True):
+                with override_settings(FAST_READ_SERIALIZERS=fast):
+                    contents.append(async_to_sync(view)(factory.get(path), **kwargs).content)
+            self.assertEqual(contents[1], contents[0], path)
+
+    def test_compiled_serializer_matches_serializer_data(self):
+        """
+        Test that a compiled plan renders like SlotSerializer, without extra queries
+        """
+        queryset = Slot.objects.with_details().order_by('id')
+        with CaptureQueriesContext(connection) as drf_queries:
+            expected = JSONRenderer().render(SlotSerializer(list(queryset.all()), many=True).data)
+        with CaptureQueriesContext(connection) as fast_queries:
+            plan = compile_serializer(SlotSerializer())
+            actual = FastJSONRenderer().render(plan.many(list(queryset.all())))
+        self.assertEqual(actual, expected)
+        self.assertEqual(len(fast_queries), len(drf_queries))
+        self.assertIs(compile_serializer(SlotSerializer()), plan)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        """
+        Test that FastJSONRenderer encodes like JSONRenderer, and falls back for what orjson refuses
+        """
+        data = {
+            'fare': Decimal('12.30'),
+            'when': timezone.now(),
+            'local': timezone.localtime(),
+            'text': 'a\u2028b\u2029c\x1fé\U0001f695',
+            'nested': [None, True, 1.5, 2 ** 40, {'empty': []}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render({1: 'a'}), JSONRenderer().render({1: 'a'}))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        indented = FastJSONRenderer().render(data, 'application/json; indent=2')
+        self.assertEqual(indented, JSONRenderer().render(data, 'application/json; indent=2'))
+
+@override_settings(CACHES=TEST_CACHES)
+class DatabaseProfileTestCase(TestCase):
+    def sqlite_wrapper(self, path, **options):
+        settings_dict = {
+            **connection.settings_dict,
+            'NAME': path,
+            'OPTIONS': {**settings.DATABASE_PROFILES['sqlite']['OPTIONS'], **options},
+        }
+        return SQLiteProfileWrapper(settings_dict, alias='profile_test')
+
+    def test_sqlite_profile_runs_init_command_and_begins_immediate(self):
+        """
+        Test that the SQLite profile puts the file in WAL mode and takes the write lock at BEGIN
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            db = self.sqlite_wrapper(os.path.join(tmp, 'profile.sqlite3'))
+            try:
+                with db.cursor() as cursor:
+                    self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+                    self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+                    self.assertEqual(
+                        cursor.execute('PRAGMA busy_timeout').fetchone()[0],
+                        settings.DATABASE_PROFILES['sqlite']['OPTIONS']['timeout'] * 1000,
+                    )
+                db.force_debug_cursor = True
+                db._start_transaction_under_autocommit()
+                self.assertEqual(db.queries_log[-1]['sql'], 'BEGIN IMMEDIATE')
+                db.connection.rollback()
+            finally:
+                db.close()
+
+    def test_sqlite_profile_rejects_unknown_transaction_mode(self):
+        """
+        Test that a misspelt transaction_mode fails at connect instead of running deferred
+        """
+        db = self.sqlite_wrapper(':memory:', transaction_mode='IMMEDIATELY')
+        with self.assertRaises(ImproperlyConfigured):
+            db.get_connection_params()
+
+    @skipUnless(find_spec('psycopg2') or find_spec('psycopg'), 'needs a PostgreSQL driver')
+    def test_connection_pool_reuses_and_bounds_connections(self):
+        """
+        Test that the pool hands back idle connections, rolls back open transactions and waits at max_size
+        """
+        from .db_backends.postgresql.base import TRANSACTION_IDLE, ConnectionPool
+
+        class FakeConnection:
+            closed = False
+
+            def __init__(self):
+                self.info = type('Info', (), {'transaction_status': TRANSACTION_IDLE})()
+                self.rollbacks = 0
+
+            def rollback(self):
+                self.rollbacks += 1
+                self.info.transaction_status = TRANSACTION_IDLE
+
+            def close(self):
+                self.closed = True
+
+        pool = ConnectionPool(max_size=2, timeout=0.1, max_idle=300, check=30)
+        first = pool.acquire(FakeConnection)
+        second = pool.acquire(FakeConnection)
+        self.assertIsNot(first, second)
+        with self.assertRaises(OperationalError):
+            pool.acquire(FakeConnection)
+
+        first.info.transaction_status = 'in transaction'
+        pool.release(first)
+        self.assertEqual(first.rollbacks, 1)
+        self.assertIs(pool.acquire(FakeConnection), first)
+
+        pool.release(second)
+        pool.close()
+        self.assertTrue(second.closed)
+
+@override_settings(AUTH_CLAIMS_CACHE_TTL=60)
+class ClaimsAuthenticationTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_token_cache()
+        self.addCleanup(reset_token_cache)
+        self.factory = RequestFactory()
+
+    def obtain(self, username='customer'):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': username, 'password': 'testpass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def authenticate(self, access):
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_user_comes_from_claims_and_cache(self):
+        """
+        Test that request.user is built from the token, with one query per cache miss
+        """
+        access = self.obtain()['access']
+        with self.assertNumQueries(1):
+            user = self.authenticate(access)
+        with self.assertNumQueries(0):
+            self.authenticate(access)
+        self.assertEqual(user.pk, self.customer_user.pk)
+        self.assertEqual(user.username, 'customer')
+        self.assertEqual(user.user_type, 'CUSTOMER')
+        self.assertFalse(user.is_staff)
+
+    def test_changing_claims_or_deactivating_revokes_tokens(self):
+        """
+        Test that saving a new user_type, password or is_active rejects earlier tokens at once
+        """
+        access = self.obtain()['access']
+        self.authenticate(access)
+        self.customer_user.user_type = 'DRIVER'
+        self.customer_user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+        access = self.obtain()['access']
+        self.assertEqual(self.authenticate(access).user_type, 'DRIVER')
+        self.customer_user.is_active = False
+        self.customer_user.save(update_fields=['is_active'])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    def test_unrelated_saves_keep_tokens(self):
+        """
+        Test that saving other fields, or a stale copy of the user, keeps the version current
+        """
+        access = self.obtain()['access']
+        stale = User.objects.get(pk=self.customer_user.pk)
+        self.customer_user.address = 'Hostel 4'
+        self.customer_user.save()
+        self.assertEqual(self.authenticate(access).pk, self.customer_user.pk)
+
+        revoke_tokens(self.customer_user.pk)
+        stale.college = 'IIT Jodhpur'
+        stale.save()
+        self.assertEqual(User.objects.get(pk=stale.pk).token_version, 1)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    @override_settings(AUTH_CLAIMS_CACHE_TTL=0.2)
+    def test_revocation_elsewhere_applies_within_ttl(self):
+        """
+        Test that a version bump this process did not see is picked up once the cache entry expires
+        """
+        reset_token_cache()
+        access = self.obtain()['access']
+        self.authenticate(access)
+        # As another process would: no signal reaches this one
+        User.objects.filter(pk=self.customer_user.pk).update(token_version=F('token_version') + 1)
+        self.authenticate(access)
+        time.sleep(0.3)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(access)
+
+    def test_refresh_checks_revocation(self):
+        """
+        Test that a revoked refresh token cannot mint access tokens, and a current one can
+        """
+        tokens = self.obtain()
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.authenticate(response.data['access']).user_type, 'CUSTOMER')
+
+        revoke_tokens(self.customer_user.pk)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_without_claims_use_the_database(self):
+        """
+        Test that tokens issued before the claims existed still authenticate, as the User row
+        """
+        with self.assertNumQueries(1):
+            user = self.authenticate(self.customer_token)
+        self.assertIsInstance(user, User)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProfileImagePipelineTestCase(TransactionTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.staging = os.path.join(tmp.name, 'staging')
+        media = override_settings(
+            MEDIA_ROOT=os.path.join(tmp.name, 'media'),
+            PROFILE_IMAGE_STAGING_DIR=self.staging,
+            PROFILE_IMAGE_STORAGE='api.images.FileSystemImageStorage',
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='customer', email='customer@test.com', password='testpass123',
+            user_type='CUSTOMER', phone='1234567890'
+        )
+
+    def make_image(self, size=(3000, 2000), color='red', mode='RGB', image_format='JPEG', name='photo.jpg'):
+        out = io.BytesIO()
+        Image.new(mode, size, color).save(out, image_format)
+        return SimpleUploadedFile(name, out.getvalue(), content_type=f'image/{image_format.lower()}')
+
+    def upload(self, image):
+        response = self.client.patch(reverse('user-detail', kwargs={'pk': self.user.pk}), {'image': image},
+                                     format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def stored(self, url):
+        return Image.open(os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):]))
+
+    def test_registration_stages_and_pushes_renditions(self):
+        """
+        Test that registration returns before the image is processed, and the worker stores the downscaled image and thumbnail
+        """
+        response = self.client.post(reverse('user-list'), {
+            'username': 'newuser', 'email': 'newuser@test.com', 'password': 'testpass123',
+            'user_type': 'CUSTOMER', 'phone': '1122334455', 'image': self.make_image(),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data['image_url'])
+        self.assertTrue(get_image_uploader().flush(timeout=10))
+
+        response = self.client.get(reverse('user-detail', kwargs={'pk': response.data['id']}))
+        self.assertTrue(response.data['image'].startswith('image/upload/v'))
+        self.assertTrue(response.data['image_url'].startswith('/media/profile_images/processed/'))
+        with self.stored(response.data['image_url']) as image:
+            self.assertEqual(image.size, (1024, 683))
+        with self.stored(response.data['image_thumbnail_url']) as thumbnail:
+            self.assertEqual(thumbnail.size, (128, 128))
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_invalid_image_is_rejected(self):
+        """
+        Test that an upload Pillow cannot read is refused before anything is staged
+        """
+        response = self.client.patch(reverse('user-detail', kwargs={'pk': self.user.pk}), {
+            'image': SimpleUploadedFile('photo.jpg', b'not an image', content_type='image/jpeg'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        self.assertFalse(os.path.exists(self.staging))
+
+    def test_oversized_image_is_rejected_from_its_header(self):
+        """
+        Test that a small file declaring more than PROFILE_IMAGE_MAX_PIXELS is refused before anything is staged
+        """
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        header = struct.pack('>IIBBBBB', 10000, 8000, 8, 0, 0, 0, 0)
+        png = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(b'\0')) + chunk(b'IEND', b'')
+        self.assertLess(len(png), 100)
+        response = self.client.patch(reverse('user-detail', kwargs={'pk': self.user.pk}), {
+            'image': SimpleUploadedFile('photo.png', png, content_type='image/png'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        self.assertFalse(os.path.exists(self.staging))
+
+    def test_latest_upload_wins(self):
+        """
+        Test that of two uploads in a row the second one ends up as the user's image, transparency on white
+        """
+        self.upload(self.make_image(color='red'))
+        self.upload(self.make_image(size=(64, 64), color=(0, 0, 255, 0), mode='RGBA', image_format='PNG',
+                                    name='photo.png'))
+        self.assertTrue(get_image_uploader().flush(timeout=10))
+
+        self.user.refresh_from_db()
+        with self.stored(image_url(self.user.image)) as image:
+            self.assertEqual(image.size, (64, 64))
+            self.assertEqual(image.convert('RGB').getpixel((32, 32)), (255, 255, 255))
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def test_urls_are_memoized_per_public_id(self):
+        """
+        Test that image URLs are built once per public id and variant, and images from before the pipeline fall back for variants
+        """
+        User.objects.filter(pk=self.user.pk).update(image='image/upload/v1/profile_images/legacy.jpg')
+        self.user.refresh_from_db()
+        self.assertEqual(image_url(self.user.image, 'thumbnail'), image_url(self.user.image))
+
+        _image_url.cache_clear()
+        for _ in range(3):
+            response = self.client.get(reverse('user-detail', kwargs={'pk': self.user.pk}))
+            self.assertEqual(response.data['image_url'], '/media/profile_images/legacy.jpg')
+        self.assertEqual(_image_url.cache_info().misses, 2)
+
+    def test_push_staged_images_recovers_leftovers(self):
+        """
+        Test that uploads staged but never pushed are pushed by the command, newest per user
+        """
+        uploader = get_image_uploader()
+        uploader.stage(self.user.pk, self.make_image(color='red'))
+        time.sleep(0.01)
+        uploader.stage(self.user.pk, self.make_image(size=(32, 32), color='blue'))
+
+        out = io.StringIO()
+        call_command('push_staged_images', stdout=out)
+        self.assertIn('1 staged uploads pushed', out.getvalue())
+
+        self.user.refresh_from_db()
+        with self.stored(image_url(self.user.image)) as image:
+            self.assertEqual(image.size, (32, 32))
+        self.assertEqual(os.listdir(self.staging), [])
+
+
+class PasswordHashingTestCase(BaseTestCase):
+    def test_registration_and_login_hash_on_the_pool(self):
+        """
+        Test that a registered user's password is hashed by a worker process and verifies at login
+        """
+        with override_settings(PASSWORD_HASHING_WORKERS=1):
+            response = self.client.post(reverse('user-list'), {
+                'username': 'newuser', 'email': 'newuser@test.com', 'password': 'testpass123',
+                'user_type': 'CUSTOMER', 'phone': '1122334455',
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertIsNotNone(get_hashing_pool()._executor)
+            self.assertTrue(check_password('testpass123', User.objects.get(username='newuser').password))
+
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'newuser', 'password': 'testpass123'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'newuser', 'password': 'wrong'})
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saturated_pool_sheds_load(self):
+        """
+        Test that hashing beyond the pool's capacity waits for the timeout and then fails, sync and async
+        """
+        pool = PasswordHashingPool(1, queue_size=0, timeout=0.1)
+        self.addCleanup(pool.shutdown)
+        busy = threading.Thread(target=pool.run, args=(time.sleep, 1))
+        busy.start()
+        time.sleep(0.2)
+        with self.assertRaises(HashingUnavailable):
+            pool.run(make_password, 'testpass123')
+        with self.assertRaises(HashingUnavailable):
+            async_to_sync(pool.arun)(make_password, 'testpass123')
+        busy.join()
+        self.assertTrue(check_password('testpass123', async_to_sync(pool.arun)(make_password, 'testpass123')))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0, PASSWORD_HASHING_QUEUE_SIZE=0, PASSWORD_HASHING_TIMEOUT=0)
+    def test_registration_returns_503_when_saturated(self):
+        """
+        Test that registration answers 503 with Retry-After while no hashing slot frees up
+        """
+        slots = get_hashing_pool()._slots
+        slots.acquire()
+        self.addCleanup(slots.release)
+        response = self.client.post(reverse('user-list'), {
+            'username': 'newuser', 'email': 'newuser@test.com', 'password': 'testpass123',
+            'user_type': 'CUSTOMER', 'phone': '1122334455',
+        })
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='newuser').exists())
+
+    def test_outdated_hash_is_upgraded_at_login(self):
+        """
+        Test that logging in rehashes a password stored with fewer iterations than the current hasher's
+        """
+        self.customer_user.password = PBKDF2PasswordHasher().encode('testpass123', 'oldsalt', iterations=1000)
+        self.customer_user.save()
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'customer', 'password': 'testpass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.customer_user.refresh_from_db()
+        self.assertTrue(self.customer_user.password.startswith(f'pbkdf2_sha256${PBKDF2PasswordHasher.iterations}$'))
+        # The upgraded hash does not log the user out of the token just issued
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('slot-list')).status_code, status.HTTP_200_OK)
+
+    def test_async_token_view_matches_sync_view(self):
+        """
+        Test that the async token endpoint answers like TokenObtainPairView
+        """
+        factory = RequestFactory()
+        sync_view = TokenObtainPairView.as_view()
+        for data in (
+            {'username': 'customer', 'password': 'testpass123'},
+            {'username': 'customer', 'password': 'wrong'},
+            {'username': 'nobody', 'password': 'testpass123'},
+            {'username': 'customer'},
+        ):
+            sync_response = sync_view(factory.post('/api/token/', data))
+            sync_response.render()
+            async_response = async_to_sync(async_views.token_obtain_pair)(factory.post('/api/token/', data))
+            self.assertEqual(async_response.status_code, sync_response.status_code, data)
+            for header in ('Content-Type', 'Allow', 'Vary', 'WWW-Authenticate'):
+                self.assertEqual(async_response.get(header), sync_response.get(header), header)
+            if sync_response.status_code == status.HTTP_200_OK:
+                self.assertEqual(json.loads(async_response.content).keys(), sync_response.data.keys())
+                access = json.loads(async_response.content)['access']
+                self.assertEqual(ClaimsJWTAuthentication().get_validated_token(access)['username'], 'customer')
+            else:
+                self.assertEqual(async_response.content, sync_response.content)
+
+    def test_import_users(self):
+        """
+        Test that the import command creates valid rows with hashed passwords and reports the rest
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            self.addCleanup(os.remove, source.name)
+            writer = csv.writer(source)
+            writer.writerow(['username', 'email', 'phone', 'user_type', 'password', 'college'])
+            for i in range(5):
+                writer.writerow([f'student{i}', f'student{i}@test.com', '1122334455', 'CUSTOMER', f'pass{i}', 'IITJ'])
+            writer.writerow(['student0', 'again@test.com', '1122334455', 'CUSTOMER', 'pass', ''])
+            writer.writerow(['pilot', 'pilot@test.com', '1122334455', 'PILOT', 'pass', ''])
+            writer.writerow(['customer', 'taken@test.com', '1122334455', 'CUSTOMER', 'pass', ''])
+            writer.writerow(['nopass', 'nopass@test.com', '1122334455', 'DRIVER', '', ''])
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_users', source.name, '--batch-size', '3', '--workers', '1', stdout=out, stderr=err)
+        self.assertIn('6 users imported, 3 skipped', out.getvalue())
+        self.assertIn('line 7: duplicate of an earlier row', err.getvalue())
+        self.assertIn("line 8: unknown user_type 'PILOT'", err.getvalue())
+        self.assertIn('line 9: username or email already taken', err.getvalue())
+
+        student = User.objects.get(username='student3')
+        self.assertTrue(student.check_password('pass3'))
+        self.assertEqual(student.college, 'IITJ')
+        self.assertFalse(User.objects.get(username='nopass').has_usable_password())
+
+
+class AdminChangelistTestCase(SlotFixtureTestCase):
+    changelists = ('api_slot', 'api_slotparticipant', 'api_auto', 'api_user', 'api_autoqueue', 'api_dispatchoffer')
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user.is_staff = self.admin_user.is_superuser = True
+        self.admin_user.save()
+        self.client = Client()
+        self.client.force_login(self.admin_user)
+
+    def add_rows(self, count):
+        self.create_slots(count)
+        for i in range(count):
+            driver = User.objects.create(username=f'admindriver{count}_{i}', email=f'admindriver{count}_{i}@test.com',
+                                         phone='1111111111', user_type='DRIVER')
+            auto = Auto.objects.create(driver=driver, license_plate=f'ADM{count}-{i}')
+            AutoQueue.objects.create(auto=auto)
+        DispatchOffer.objects.bulk_create(
+            DispatchOffer(slot=slot, auto=slot.auto, expires_at=slot.ride_time)
+            for slot in Slot.objects.filter(offers__isnull=True)
+        )
+
+    def changelist_queries(self, name, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:{name}_changelist'), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries]
+
+    def test_changelist_query_count_is_fixed(self):
+        """
+        Test that every changelist page costs the same number of queries for 2 or 12 rows per model
+        """
+        self.add_rows(2)
+        few = {name: len(self.changelist_queries(name)) for name in self.changelists}
+        self.add_rows(10)
+        many = {name: len(self.changelist_queries(name)) for name in self.changelists}
+        self.assertEqual(many, few)
+        # Session, user, the estimate (PostgreSQL only), COUNT(*) (these tables
+        # are under the threshold) and the rows; the date hierarchy adds MIN
+        # and MAX for slots
+        base = 5 if connection.vendor == 'postgresql' else 4
+        for name, count in many.items():
+            self.assertEqual(count, base + 2 if name == 'api_slot' else base, name)
+
+    def test_search_uses_exact_indexed_lookups(self):
+        """
+        Test that search matches whole values on indexed columns and skips fields the term cannot be
+        """
+        self.add_rows(3)
+        response = self.client.get(reverse('admin:api_slot_changelist'), {'q': 'QC123'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        response = self.client.get(reverse('admin:api_slot_changelist'), {'q': 'QC12'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+        response = self.client.get(reverse('admin:api_slotparticipant_changelist'), {'q': 'rider1@test.com'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        response = self.client.get(reverse('admin:api_user_changelist'), {'q': str(self.driver_user.pk)})
+        self.assertEqual(list(response.context['cl'].result_list), [self.driver_user])
+        queries = self.changelist_queries('api_auto', {'q': 'ADM3-1'})
+        self.assertFalse(any('LIKE' in sql for sql in queries))
+
+    def test_date_hierarchy_is_drawn_from_the_ride_time_range(self):
+        """
+        Test that the slot date hierarchy offers every period between the first and last ride without a DISTINCT scan
+        """
+        self.create_slots(2)
+        Slot.objects.filter(pk=Slot.objects.order_by('id').last().pk).update(ride_time='2030-02-18T10:00:00Z')
+        url = reverse('admin:api_slot_changelist')
+        response = self.client.get(url)
+        self.assertContains(response, 'ride_time__day=15')
+        self.assertContains(response, 'ride_time__day=17')
+        self.assertContains(response, 'ride_time__day=18')
+        self.assertNotContains(response, 'ride_time__day=19')
+
+        Slot.objects.filter(pk=Slot.objects.order_by('id').last().pk).update(ride_time='2031-03-01T10:00:00Z')
+        queries = self.changelist_queries('api_slot')
+        self.assertFalse(any('DISTINCT' in sql for sql in queries))
+        response = self.client.get(url)
+        self.assertContains(response, 'ride_time__year=2030')
+        self.assertContains(response, 'ride_time__year=2031')
+        response = self.client.get(url, {'ride_time__year': '2031'})
+        self.assertContains(response, 'ride_time__month=3')
+        self.assertNotContains(response, 'ride_time__month=2')
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'planner statistics are PostgreSQL specific')
+    def test_large_tables_are_counted_from_estimates(self):
+        """
+        Test that unfiltered changelists past the threshold skip COUNT(*), while searches count exactly
+        """
+        self.add_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE slot_participants')
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1):
+            queries = self.changelist_queries('api_slotparticipant')
+            self.assertFalse(any('COUNT(' in sql for sql in queries))
+            response = self.client.get(reverse('admin:api_slotparticipant_changelist'))
+            self.assertEqual(response.context['cl'].result_count, SlotParticipant.objects.count())
+
+            queries = self.changelist_queries('api_slotparticipant', {'status__exact': 'JOINED'})
+            self.assertTrue(any('COUNT(' in sql for sql in queries))
+
+    @skipUnless(connection.vendor != 'postgresql', 'PostgreSQL counts from planner statistics')
+    def test_tables_without_statistics_are_counted_exactly(self):
+        """
+        Test that without planner statistics a large changelist is counted exactly, despite id gaps
+        """
+        self.add_rows(3)
+        # Popping autos deletes their rows, so ids run well past the row count
+        AutoQueue.objects.pop()
+        AutoQueue.objects.pop()
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1):
+            queries = self.changelist_queries('api_autoqueue')
+            self.assertTrue(any('COUNT(' in sql for sql in queries))
+            response = self.client.get(reverse('admin:api_autoqueue_changelist'))
+            self.assertEqual(response.context['cl'].result_count, AutoQueue.objects.count())
+
+
+class DriverOfferDispatchTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.drivers = [self.driver_user] + [
+            User.objects.create(username=f'offerdriver{i}', email=f'offerdriver{i}@test.com',
+                                phone='1111111111', user_type='DRIVER')
+            for i in range(1, 3)
+        ]
+        self.autos = []
+        for i, driver in enumerate(self.drivers):
+            auto = Auto.objects.create(driver=driver, license_plate=f'OFFER{i}', status='AVAILABLE')
+            AutoQueue.objects.create(auto=auto)
+            self.autos.append(auto)
+
+    def create_slot(self):
+        response = self.client.post(reverse('slot-create'), {
+            'creator_id': self.customer_user.id, 'ride_time': '2030-02-15T10:00:00Z'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def respond(self, action, slot_id, driver):
+        token = RefreshToken.for_user(driver).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.client.patch(reverse(f'slot-{action}', kwargs={'pk': slot_id}))
+
+    def queued_autos(self):
+        return list(AutoQueue.objects.order_by('created_at', 'id').values_list('auto_id', flat=True))
+
+    def test_timer_wheel_fires_each_timer_once_and_never_early(self):
+        """
+        Test that the wheel fires timers at their tick, across turns, and drops cancelled ones
+        """
+        wheel = TimerWheel(resolution=1.0, size=8, start=100.0)
+        wheel.schedule('soon', 101.5)
+        wheel.schedule('later', 103)
+        wheel.schedule('turns away', 126)
+        wheel.schedule('cancelled', 104)
+        wheel.cancel('cancelled')
+        self.assertEqual(wheel.advance(101.9), [])
+        self.assertEqual(wheel.advance(102), ['soon'])
+        self.assertEqual(wheel.advance(110), ['later'])
+        self.assertEqual(wheel.advance(125.9), [])
+        self.assertEqual(wheel.advance(126), ['turns away'])
+        self.assertEqual(len(wheel), 0)
+
+        wheel.schedule('overdue', 50)
+        self.assertEqual(wheel.advance(127), ['overdue'])
+
+    def test_only_the_offered_driver_can_accept_before_the_deadline(self):
+        """
+        Test that accepting checks the driver and the offer deadline
+        """
+        slot_id = self.create_slot()
+        self.assertEqual(self.respond('accept', slot_id, self.drivers[1]).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+        self.assertEqual(self.client.patch(reverse('slot-accept', kwargs={'pk': slot_id})).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.patch(reverse('slot-decline', kwargs={'pk': slot_id})).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        DispatchOffer.objects.filter(slot_id=slot_id).update(expires_at=timezone.now())
+        self.assertEqual(self.respond('accept', slot_id, self.drivers[0]).status_code, status.HTTP_409_CONFLICT)
+
+        slot_id = self.create_slot()
+        response = self.respond('accept', slot_id, self.drivers[1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'OPEN')
+        self.assertEqual(DispatchOffer.objects.get(slot_id=slot_id).status, 'ACCEPTED')
+        self.assertEqual(Auto.objects.get(pk=self.autos[1].pk).status, 'BOOKED')
+
+    def test_declined_slot_goes_to_each_queued_auto_once(self):
+        """
+        Test that a decline requeues the auto and re-offers, until nobody is left to ask
+        """
+        slot_id = self.create_slot()
+        response = self.respond('decline', slot_id, self.drivers[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['auto'], self.autos[1].id)
+        self.assertEqual(self.queued_autos(), [self.autos[2].id, self.autos[0].id])
+        self.assertEqual(Auto.objects.get(pk=self.autos[0].pk).status, 'AVAILABLE')
+        self.assertEqual(Auto.objects.get(pk=self.autos[1].pk).status, 'QUEUED')
+        self.assertEqual(self.respond('accept', slot_id, self.drivers[0]).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.assertEqual(self.respond('decline', slot_id, self.drivers[1]).data['auto'], self.autos[2].id)
+        response = self.respond('decline', slot_id, self.drivers[2])
+        self.assertEqual(response.data['status'], 'CANCELLED')
+        self.assertEqual(
+            list(DispatchOffer.objects.filter(slot_id=slot_id).order_by('id').values_list('auto_id', 'status')),
+            [(auto.id, 'DECLINED') for auto in self.autos]
+        )
+        self.assertEqual(self.queued_autos(), [self.autos[0].id, self.autos[1].id, self.autos[2].id])
+        self.assertEqual(set(Auto.objects.values_list('status', flat=True)), {'AVAILABLE'})
+
+    def test_dispatcher_reoffers_expired_offers(self):
+        """
+        Test that the dispatcher expires an unanswered offer on time and schedules the next one
+        """
+        slot_id = self.create_slot()
+        self.now = timezone.now()
+        dispatcher = OfferDispatcher(clock=lambda: self.now)
+        dispatcher.tick()
+        self.assertEqual(len(dispatcher), 1)
+
+        self.now += timedelta(seconds=settings.DISPATCH_OFFER_TIMEOUT - 5)
+        dispatcher.tick()
+        self.assertEqual(Slot.objects.get(pk=slot_id).auto_id, self.autos[0].id)
+
+        self.now += timedelta(seconds=10)
+        dispatcher.tick()
+        self.assertEqual(dispatcher.totals, {'expired': 1, 'reoffered': 1, 'cancelled': 0})
+        offer = DispatchOffer.objects.get(slot_id=slot_id, status='OFFERED')
+        self.assertEqual(offer.auto_id, self.autos[1].id)
+        self.assertIn(offer.pk, dispatcher.wheel)
+        self.assertEqual(self.queued_autos(), [self.autos[2].id, self.autos[0].id])
+
+    def test_dispatcher_starts_on_the_first_request_in_each_worker(self):
+        """
+        Test that loading the WSGI application starts no dispatcher, a request does, and a forked worker starts its own
+        """
+        script = (
+            'import os\n'
+            'from django.core.signals import request_started\n'
+            'import urban_ride.wsgi\n'
+            'from api import dispatch\n'
+            'print(dispatch._dispatcher is None)\n'
+            'request_started.send(sender=None)\n'
+            'parent = dispatch._dispatcher\n'
+            'print(parent._thread.is_alive())\n'
+            'pid = os.fork()\n'
+            'if pid == 0:\n'
+            '    started = dispatch._dispatcher is None\n'
+            '    request_started.send(sender=None)\n'
+            '    started = started and dispatch._dispatcher is not parent and dispatch._dispatcher._thread.is_alive()\n'
+            '    os._exit(0 if started else 1)\n'
+            'print(os.waitpid(pid, 0)[1] == 0)\n'
+            'dispatch.reset_offer_dispatcher()\n'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='urban_ride.settings'),
+            capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.split(), ['True', 'True', 'True'])
+
+    def test_thousands_of_concurrent_offers(self):
+        """
+        Test that thousands of offers being accepted, declined and left to expire keep every auto in one place
+        """
+        slots, spare = 2000, 40
+        rng = random.Random(7)
+        autos = Auto.objects.bulk_create(
+            Auto(driver=self.driver_user, license_plate=f'SIM{i}', status='AVAILABLE') for i in range(slots + spare)
+        )
+        AutoQueue.objects.bulk_create(AutoQueue(auto=auto) for auto in autos)
+        result = ingest_slots([
+            {'creator_id': self.customer_user.id, 'ride_time': '2030-02-15T10:00:00Z'} for _ in range(slots)
+        ])
+        self.assertEqual(len(result['created']), slots)
+
+        self.now = timezone.now()
+        dispatcher = OfferDispatcher(clock=lambda: self.now)
+        dispatcher.tick()
+        self.assertEqual(len(dispatcher), slots)
+        for _ in range(4):
+            outstanding = list(DispatchOffer.objects.filter(status='OFFERED').select_related('slot'))
+            for offer in outstanding:
+                # 30% accept, 10% decline, the rest never answer
+                answer = rng.random()
+                if answer < 0.4:
+                    with transaction.atomic():
+                        respond_to_offer(offer.slot, accept=answer < 0.3, now=self.now)
+            Slot.objects.filter(offers__status='ACCEPTED', status='PENDING_DRIVER').update(status='OPEN')
+            Auto.objects.filter(slots__status='OPEN').update(status='BOOKED')
+            # Declines were scheduled on this process's dispatcher; pick them up
+            dispatcher.refresh(self.now)
+            self.now += timedelta(seconds=settings.DISPATCH_OFFER_TIMEOUT + 1)
+            dispatcher.tick()
+            self.assertDispatchConsistent(dispatcher, Auto.objects.count())
+
+        self.assertGreater(dispatcher.totals['expired'], slots // 2)
+        self.assertGreater(DispatchOffer.objects.filter(status='DECLINED').count(), slots // 10)
+
+    def assertDispatchConsistent(self, dispatcher, auto_count):
+        pending = dict(Slot.objects.filter(status='PENDING_DRIVER').values_list('id', 'auto_id'))
+        outstanding = dict(DispatchOffer.objects.filter(status='OFFERED').values_list('slot_id', 'auto_id'))
+        self.assertEqual(outstanding, pending)
+        self.assertTrue(all(offer_id in dispatcher.wheel for offer_id in
+                            DispatchOffer.objects.filter(status='OFFERED').values_list('id', flat=True)))
+        pairs = DispatchOffer.objects.values_list('slot_id', 'auto_id')
+        self.assertEqual(len(set(pairs)), len(pairs))
+
+        # Every auto is queued, offered a slot, or booked on one, and only one of those
+        queued = set(AutoQueue.objects.values_list('auto_id', flat=True))
+        booked = set(Slot.objects.filter(status='OPEN').values_list('auto_id', flat=True))
+        offered = set(pending.values())
+        self.assertEqual(len(queued) + len(offered) + len(booked), auto_count)
+        self.assertEqual(len(queued | offered | booked), auto_count)
+        self.assertEqual(set(Auto.objects.filter(pk__in=queued).values_list('status', flat=True)), {'AVAILABLE'})
+
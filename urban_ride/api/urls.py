@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
@@ -5,28 +6,52 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from .views import (
-    UserViewSet, SlotViewSet, AutoQueueViewSet, PaymentViewSet,
-    SlotParticipantCreateView, SlotCreateView, AutoDriverAcceptView,
-    AutoCreateView, AutoViewSet
+    UserViewSet, SlotViewSet, AutoQueueViewSet, PaymentViewSet, PricingViewSet,
+    SlotParticipantCreateView, SlotCreateView, AutoDriverAcceptView, AutoDriverDeclineView,
+    AutoCreateView, AutoViewSet, SlotSearchView, RideMatchView, SlotBulkCreateView,
+    ExportView, RouteAvailabilityView, MetricsView
 )
 from .auth_views import request_otp, verify_otp
+from . import async_views
+
+if settings.ASYNC_READ_ENDPOINTS:
+    auto_list_view = async_views.auto_list
+    slot_list_view = async_views.slot_list
+    slot_detail_view = async_views.slot_detail
+else:
+    auto_list_view = AutoViewSet.as_view({'get': 'list'})
+    slot_list_view = SlotViewSet.as_view({'get': 'list'})
+    slot_detail_view = SlotViewSet.as_view({'get': 'retrieve'})
+
+if settings.ASYNC_TOKEN_ENDPOINT:
+    token_obtain_pair_view = async_views.token_obtain_pair
+else:
+    token_obtain_pair_view = TokenObtainPairView.as_view()
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'auto-queue', AutoQueueViewSet, basename='autoqueue')
 router.register(r'payments', PaymentViewSet, basename='payment')
+router.register(r'pricing', PricingViewSet, basename='pricing')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', token_obtain_pair_view, name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('autos/create/', AutoCreateView.as_view(), name='auto-create'),
-    path('autos/', AutoViewSet.as_view({'get': 'list'}), name='auto-list'),
-    path('slots/', SlotViewSet.as_view({'get': 'list'}), name='slot-list'),
-    path('slots/<int:pk>/', SlotViewSet.as_view({'get': 'retrieve'}), name='slot-detail'),
+    path('autos/', auto_list_view, name='auto-list'),
+    path('slots/', slot_list_view, name='slot-list'),
+    path('slots/search/', SlotSearchView.as_view(), name='slot-search'),
+    path('slots/<int:pk>/', slot_detail_view, name='slot-detail'),
     path('slots/create/', SlotCreateView.as_view(), name='slot-create'),
+    path('slots/bulk/', SlotBulkCreateView.as_view(), name='slot-bulk-create'),
     path('slots/<int:pk>/accept/', AutoDriverAcceptView.as_view(), name='slot-accept'),
+    path('slots/<int:pk>/decline/', AutoDriverDeclineView.as_view(), name='slot-decline'),
     path('slots/<int:pk>/join/', SlotParticipantCreateView.as_view(), name='slot-join'),
+    path('routes/availability/', RouteAvailabilityView.as_view(), name='route-availability'),
+    path('rides/match/', RideMatchView.as_view(), name='ride-match'),
+    path('exports/<str:dataset>/', ExportView.as_view(), name='export'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('auth/request-otp/', request_otp, name='request-otp'),
     path('auth/verify-otp/', verify_otp, name='verify-otp'),
 ]
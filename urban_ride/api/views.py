@@ -1,32 +1,140 @@
+import logging
+from datetime import timedelta
+
 from rest_framework import status, viewsets, generics, serializers, mixins
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db import transaction
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 
-from .models import Auto, Slot, User, AutoQueue, SlotParticipant
+from .models import Auto, Slot, User, AutoQueue, SlotParticipant, RouteAvailability, hour_bucket
 from .serializers import (
     AutoSerializer, 
     SlotSerializer, 
     AutoQueueSerializer, 
     UserSerializer,
-    SlotParticipantSerializer
+    SlotParticipantSerializer,
+    SlotSearchSerializer,
+    RideMatchSerializer,
+    ConvenienceFeeSerializer,
+    QuoteBatchSerializer,
+    RouteAvailabilitySerializer,
+    RouteAvailabilityQuerySerializer
 )
+from .pagination import SlotCursorPagination, IdCursorPagination
+from . import slot_cache
+from .realtime import publish_slot_update
+from .dispatch import offer_slots, respond_to_offer
+from .matching import get_matching_engine
+from .pricing import quote_batch, quote_slot
+from .parsers import NDJSONParser
+from .ingestion import ingest_slots
+from .renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from .fast_serializers import compile_serializer
+from .exports import DATASETS, aiterate, export_cursor, export_lines, export_rows
+from .profiling import get_registry
+
+logger = logging.getLogger(__name__)
+
 #TODO : Please add creator detail in slot and participant's detail too.
 
+def slot_detail_queryset(serializer):
+    # Only join and prefetch what survives ?fields= / ?expand=
+    fields = serializer.fields
+    return Slot.objects.with_details(
+        auto='auto_details' in fields,
+        creator='creator_details' in fields,
+        participants='participants' in fields,
+    )
+
+def create_slot_from_queue(creator, data, context=None):
+    """
+    Pops the auto that has waited longest, books a PENDING_DRIVER slot on it
+    for creator and offers the slot to its driver. Returns the saved
+    SlotSerializer, or None when no auto is queued. Raises ValidationError,
+    in which case the auto stays queued.
+    """
+    # The auto is popped inside the same transaction that books it, so
+    # a failed validation or save puts it back at the head of the queue.
+    with transaction.atomic():
+        auto = AutoQueue.objects.pop()
+        if auto is None:
+            return None
+
+        serializer_data = {
+            'auto': auto.id,
+            'creator': creator.id,
+            'max_capacity': data.get('max_capacity', 4),
+            'current_capacity': data.get('current_capacity', 1),
+            'ride_time': data.get('ride_time'),
+            'start_loc': data.get('start_loc', 'IITJ'),
+            'dest_loc': data.get('dest_loc', 'Paota')
+        }
+        # Without an explicit fare SlotSerializer prices the route
+        if data.get('fare') is not None:
+            serializer_data['fare'] = data.get('fare')
+
+        serializer = SlotSerializer(data=serializer_data, context=context or {})
+        serializer.is_valid(raise_exception=True)
+        slot = serializer.save(
+            status='PENDING_DRIVER',
+        )
+
+        auto.status = 'QUEUED'
+        auto.save(update_fields=['status'])
+        offer_slots([(slot.id, auto.id)])
+        publish_slot_update(slot.id, 'slot.created')
+    return serializer
+
 class UserViewSet(mixins.ListModelMixin,mixins.CreateModelMixin,mixins.UpdateModelMixin,mixins.DestroyModelMixin,mixins.RetrieveModelMixin,viewsets.GenericViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     authentication_classes = []
     permission_classes = []
+    pagination_class = IdCursorPagination
     parser_classes = (MultiPartParser, FormParser)
 
-class AutoViewSet(viewsets.ModelViewSet):
-    queryset = Auto.objects.all()
+class FastReadMixin:
+    """
+    Serves list and retrieve from a compiled plan of the view's serializer
+    and renders JSON with orjson, while FAST_READ_SERIALIZERS is on.
+    """
+
+    def get_renderers(self):
+        if not settings.FAST_READ_SERIALIZERS:
+            return super().get_renderers()
+        return [FastJSONRenderer(), BrowsableAPIRenderer()]
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_READ_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = compile_serializer(self.get_serializer())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.many(page))
+        return Response(plan.many(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.FAST_READ_SERIALIZERS:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(compile_serializer(self.get_serializer()).one(self.get_object()))
+
+class AutoViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = Auto.objects.select_related('driver')
     serializer_class = AutoSerializer
     authentication_classes = []
     permission_classes = []
+    pagination_class = IdCursorPagination
 
 class AutoCreateView(generics.CreateAPIView):
     serializer_class = AutoSerializer
@@ -35,7 +143,6 @@ class AutoCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         driver = User.objects.get(id=self.request.data.get('driver_id'))
 
-        #TODO: Only that driver which is attached with the slot should accept this (not any driver)(for simplicity any driver can accept for now)
         if driver.user_type != 'DRIVER':
             return Response(
                 {"error": "User must be a driver"},
@@ -64,74 +171,100 @@ class SlotCreateView(generics.CreateAPIView):
     permission_classes = []
     
     def create(self, request, *args, **kwargs):
+        # Validate creator_id
+        creator_id = request.data.get('creator_id')
+        if not creator_id:
+            return Response(
+                {"error": "Creator ID is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         try:
-            auto_queue = AutoQueue.objects.latest('created_at')
-            auto = auto_queue.auto
-            
-            # Validate creator_id
-            creator_id = request.data.get('creator_id')
-            if not creator_id:
-                return Response(
-                    {"error": "Creator ID is required"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            try:
-                creator = User.objects.get(id=creator_id)
-            except User.DoesNotExist:
+            creator = User.objects.get(id=creator_id)
+        except User.DoesNotExist:
+            return Response(
+                {"error": "Invalid creator ID"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            serializer = create_slot_from_queue(creator, request.data, self.get_serializer_context())
+            if serializer is None:
                 return Response(
-                    {"error": "Invalid creator ID"},
+                    {"error": "No autos in queue"},
                     status=status.HTTP_404_NOT_FOUND
                 )
-            
-            serializer_data = {
-                'auto': auto.id,
-                'creator': creator.id,
-                'max_capacity': request.data.get('max_capacity', 4),
-                'current_capacity': request.data.get('current_capacity', 1),
-                'fare': request.data.get('fare', 100),
-                'ride_time': request.data.get('ride_time'),
-                'start_loc': request.data.get('start_loc', 'IITJ'),
-                'dest_loc': request.data.get('dest_loc', 'Paota')
-            }
-            
-            serializer = self.get_serializer(data=serializer_data)
-            
-            try:
-                serializer.is_valid(raise_exception=True)
-                
-                with transaction.atomic():
-                    slot = serializer.save(
-                        status='PENDING_DRIVER',
-                    )
-                    
-                    auto.status = 'QUEUED'
-                    auto.save()
-                    auto_queue.delete()
-                    
-                headers = self.get_success_headers(serializer.data)
-                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-            
-            except serializers.ValidationError as e:
-                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        
-        except AutoQueue.DoesNotExist:
+
+            headers = self.get_success_headers(serializer.data)
+            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+        except serializers.ValidationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            logger.exception('Error creating a slot for creator %s', creator.id)
             return Response(
-                {"error": "No autos in queue"},
-                status=status.HTTP_404_NOT_FOUND
+                {"error": "Could not create slot"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class SlotBulkCreateView(APIView):
+    """
+    Creates many slots in one request, e.g. a term of daily shuttle runs.
+    Accepts a JSON array (or {"slots": [...]}) or an application/x-ndjson
+    body with one slot per line. Either way the rows are parsed into a list
+    before ingestion, so at most SLOT_BULK_MAX_ROWS are taken. Rows that
+    fail validation, or that find the auto queue empty, are listed under
+    errors with their index; the rest are still created. Admin only: every
+    row pops an auto off the queue.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = (JSONParser, NDJSONParser)
+
+    def get_parser_context(self, http_request):
+        # NDJSON parsing stops one row past the limit instead of reading the rest
+        return {**super().get_parser_context(http_request), 'max_rows': settings.SLOT_BULK_MAX_ROWS}
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('slots')
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {"error": "Expected a non-empty list of slots"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except Exception as e:
-            print(f"Unexpected error: {e}")
+        if len(rows) > settings.SLOT_BULK_MAX_ROWS:
             return Response(
-                {"error": str(e)},
+                {"error": f"At most {settings.SLOT_BULK_MAX_ROWS} slots per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = ingest_slots(rows)
+        except Exception:
+            logger.exception('Error ingesting %d slots', len(rows))
+            return Response(
+                {"error": "Could not create slots"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        return Response(
+            result,
+            status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST
+        )
+
+def offered_driver_error(request, slot):
+    # Only the driver of the auto the slot is offered to may answer for it
+    if request.user.id != slot.auto.driver_id:
+        return Response(
+            {"error": "This slot is not offered to this driver"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return None
+
 class AutoDriverAcceptView(generics.UpdateAPIView):
-    queryset = Slot.objects.all()
+    queryset = Slot.objects.with_details()
     serializer_class = SlotSerializer
-    authentication_classes = []
-    permission_classes = []
 
     def update(self, request, *args, **kwargs):
         slot = self.get_object()
@@ -140,21 +273,61 @@ class AutoDriverAcceptView(generics.UpdateAPIView):
                 {"error": "Only pending slots can be accepted"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+        error = offered_driver_error(request, slot)
+        if error:
+            return error
+
         with transaction.atomic():
+            if not respond_to_offer(slot, accept=True):
+                return Response(
+                    {"error": "The offer has expired"},
+                    status=status.HTTP_409_CONFLICT
+                )
             serializer = self.get_serializer(slot, data={'status': 'OPEN'}, partial=True)
             serializer.is_valid(raise_exception=True)
             self.perform_update(serializer)
             
             slot.auto.status = 'BOOKED'
             slot.auto.save()
+            publish_slot_update(slot.id, 'slot.accepted')
         
         return Response(serializer.data)
 
+class AutoDriverDeclineView(generics.UpdateAPIView):
+    """
+    The offered driver turns a slot down; it goes to the next queued auto
+    (api/dispatch.py), or is cancelled when there is none left to ask.
+    """
+    queryset = Slot.objects.with_details()
+    serializer_class = SlotSerializer
+
+    def update(self, request, *args, **kwargs):
+        slot = self.get_object()
+        if slot.status != 'PENDING_DRIVER':
+            return Response(
+                {"error": "Only pending slots can be declined"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        error = offered_driver_error(request, slot)
+        if error:
+            return error
+
+        with transaction.atomic():
+            if not respond_to_offer(slot, accept=False):
+                return Response(
+                    {"error": "The offer has expired"},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        return Response(self.get_serializer(self.get_queryset().get(pk=slot.pk)).data)
+
+def has_joined(slot, user):
+    # Cancelled participations do not count; the rider may join again
+    return SlotParticipant.objects.filter(slot=slot, user=user).exclude(status='CANCELLED').exists()
+
 class SlotParticipantCreateView(generics.CreateAPIView):
 
     #TODO: User xyz can create and join the same slot multiple times fix this
-    #TODO: User xyz can join the same slot multiple times fix this
 
     serializer_class = SlotParticipantSerializer
     queryset = SlotParticipant.objects.all()
@@ -185,13 +358,7 @@ class SlotParticipantCreateView(generics.CreateAPIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                if SlotParticipant.objects.filter(slot=slot, user=user).exists():
-                    return Response(
-                        {"error": "You have already joined this slot"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                if slot.creator.id == user.id:
+                if slot.creator_id == user.id:
                     return Response(
                         {"error": "Slot creator cannot join as a participant"},
                         status=status.HTTP_400_BAD_REQUEST
@@ -201,12 +368,18 @@ class SlotParticipantCreateView(generics.CreateAPIView):
                     user=user,
                     slot__ride_time=slot.ride_time,
                     slot__status__in=['OPEN', 'PENDING_DRIVER']
-                )
+                ).exclude(slot=slot)
                 if user_slots.exists():
                     return Response(
                         {"error": "You already have a slot booked for this time"},
                         status=status.HTTP_400_BAD_REQUEST
                     )
+
+                if has_joined(slot, user):
+                    return Response(
+                        {"error": "You have already joined this slot"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
                 
             except User.DoesNotExist:
                 return Response(
@@ -214,22 +387,41 @@ class SlotParticipantCreateView(generics.CreateAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+            convenience_fee = request.data.get('convenience_fee')
+            if convenience_fee is None:
+                # Priced at the occupancy the slot will have once this rider is in
+                convenience_fee = quote_slot(slot, seats=slot.current_capacity + 1)['convenience_fee']
+
             serializer = self.get_serializer(
-                data={'convenience_fee': request.data.get('convenience_fee')},
+                data={'convenience_fee': convenience_fee},
                 context={'slot': slot}
             )
             serializer.is_valid(raise_exception=True)
 
-            with transaction.atomic():
-                participant = serializer.save(
-                    slot=slot,
-                    user=user,
-                    status='JOINED'
+            try:
+                with transaction.atomic():
+                    if not Slot.objects.reserve_seat(slot.pk):
+                        return Response(
+                            {"error": "Slot is already full"},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+
+                    participant = serializer.save(
+                        slot=slot,
+                        user=user,
+                        status='JOINED'
+                    )
+                    publish_slot_update(slot.id, 'slot.joined', user=user.id)
+            except IntegrityError:
+                # A concurrent join by the same rider won on unique_slot_participant;
+                # the seat reservation is rolled back too. Anything else surfaces.
+                if not has_joined(slot, user):
+                    raise
+                return Response(
+                    {"error": "You have already joined this slot"},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                
-                slot.current_capacity += 1
-                slot.save()
-                
+
             return Response(self.get_serializer(participant).data, status=status.HTTP_201_CREATED)
             
         except Slot.DoesNotExist:
@@ -237,17 +429,143 @@ class SlotParticipantCreateView(generics.CreateAPIView):
                 {"error": "Slot not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
+        except Exception:
+            logger.exception('Error joining slot %s', self.kwargs['pk'])
             return Response(
-                {"error": str(e)},
+                {"error": "Could not join slot"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class SlotViewSet(viewsets.ModelViewSet):
-    queryset = Slot.objects.all()
+class RideMatchView(generics.GenericAPIView):
+    """
+    Pools the rider into the best open slot on their route leaving within
+    window_minutes of ride_time, and only takes an auto from the queue when
+    nothing fits.
+    """
+    serializer_class = RideMatchSerializer
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request, *args, **kwargs):
+        params = self.get_serializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        try:
+            user = User.objects.get(id=data['user_id'])
+        except User.DoesNotExist:
+            return Response(
+                {"error": "User not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if user.user_type != 'CUSTOMER':
+            return Response(
+                {"error": "User must be a customer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            participant = get_matching_engine().join_best(
+                user,
+                data['start_loc'],
+                data['dest_loc'],
+                data['ride_time'],
+                data['window_minutes'],
+            )
+            if participant is not None:
+                slot = Slot.objects.with_details().get(pk=participant.slot_id)
+                return Response(
+                    {'matched': True, 'slot': SlotSerializer(slot, context=self.get_serializer_context()).data},
+                    status=status.HTTP_200_OK
+                )
+
+            serializer = create_slot_from_queue(user, {
+                'ride_time': data['ride_time'],
+                'start_loc': data['start_loc'],
+                'dest_loc': data['dest_loc'],
+            }, self.get_serializer_context())
+            if serializer is None:
+                return Response(
+                    {"error": "No autos in queue"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(
+                {'matched': False, 'slot': serializer.data},
+                status=status.HTTP_201_CREATED
+            )
+        except serializers.ValidationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            logger.exception('Error matching a ride for user %s', user.id)
+            return Response(
+                {"error": "Could not match a ride"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class SlotViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = Slot.objects.with_details()
+    serializer_class = SlotSerializer
+    authentication_classes = []
+    permission_classes = []
+    pagination_class = SlotCursorPagination
+
+    def get_queryset(self):
+        return slot_detail_queryset(self.get_serializer())
+
+    def retrieve(self, request, *args, **kwargs):
+        return slot_cache.cached_response(
+            request,
+            slot_cache.detail_key(kwargs['pk'], request),
+            lambda: super(SlotViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return slot_cache.cached_response(
+            request,
+            slot_cache.list_key(request),
+            lambda: super(SlotViewSet, self).list(request, *args, **kwargs),
+        )
+
+class SlotSearchView(FastReadMixin, generics.ListAPIView):
     serializer_class = SlotSerializer
     authentication_classes = []
     permission_classes = []
+    pagination_class = SlotCursorPagination
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Slot.objects.none()
+
+        params = SlotSearchSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return slot_detail_queryset(self.get_serializer()).search(**params.validated_data)
+
+    def list(self, request, *args, **kwargs):
+        return slot_cache.cached_response(
+            request,
+            slot_cache.list_key(request),
+            lambda: super(SlotSearchView, self).list(request, *args, **kwargs),
+        )
+
+class RouteAvailabilityView(generics.ListAPIView):
+    """Open slots and free seats per route for the coming hours, from the summary table."""
+    serializer_class = RouteAvailabilitySerializer
+    authentication_classes = []
+    permission_classes = []
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return RouteAvailability.objects.none()
+
+        params = RouteAvailabilityQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        since = hour_bucket(timezone.now())
+        return RouteAvailability.objects.upcoming(
+            since,
+            since + timedelta(hours=params.validated_data['hours']),
+            start_loc=params.validated_data.get('start_loc'),
+            dest_loc=params.validated_data.get('dest_loc'),
+        )
 
 class PaymentViewSet(viewsets.ViewSet):
     authentication_classes = []
@@ -255,8 +573,108 @@ class PaymentViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['post'])
     def convenience_fee(self, request):
-        total_fee = 50
+        params = ConvenienceFeeSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+
+        try:
+            if 'participant_id' in params.validated_data:
+                participant = SlotParticipant.objects.select_related('slot').get(
+                    pk=params.validated_data['participant_id']
+                )
+                # Already counted in current_capacity
+                seats = participant.slot.current_capacity
+                slot = participant.slot
+            else:
+                slot = Slot.objects.get(pk=params.validated_data['slot_id'])
+                seats = min(slot.current_capacity + 1, slot.max_capacity)
+        except (SlotParticipant.DoesNotExist, Slot.DoesNotExist):
+            return Response(
+                {"error": "Slot not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        total_fee = quote_slot(slot, seats=seats)['convenience_fee']
 
         return Response({
             'total_fee': total_fee
         })
+
+class PricingViewSet(viewsets.ViewSet):
+    authentication_classes = []
+    permission_classes = []
+
+    @action(detail=False, methods=['post'])
+    def quotes(self, request):
+        """
+        Prices a batch of {start_loc, dest_loc, ride_time, seats} in one
+        vectorized call; results come back in request order.
+        """
+        params = QuoteBatchSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        try:
+            quotes = quote_batch(params.validated_data['quotes'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'quotes': quotes})
+
+class ExportView(APIView):
+    """
+    Streams a whole dataset (slots, participants or rides) as NDJSON or CSV,
+    chosen with ?format= or the Accept header. ?since=<id> exports only rows
+    added after an earlier export; the X-Export-Cursor response header is
+    the since value for the next one. Rows from the last EXPORT_SAFETY_LAG
+    seconds wait for the next export (see api/exports.py).
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = (NDJSONRenderer, CSVRenderer)
+
+    def get(self, request, dataset):
+        if dataset not in DATASETS:
+            return Response(
+                {"error": f"Unknown dataset, expected one of: {', '.join(DATASETS)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            since = int(request.query_params.get('since', 0))
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": "since must be a non-negative integer id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        renderer = request.accepted_renderer
+        cursor = export_cursor(dataset, since)
+        lines = export_lines(dataset, renderer.format, export_rows(dataset, since, cursor))
+        if isinstance(request._request, ASGIRequest):
+            lines = aiterate(lines)
+
+        response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['X-Export-Cursor'] = str(cursor)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{dataset}-{since}-{cursor}.{renderer.format}"'
+        )
+        return response
+
+class MetricsView(APIView):
+    """
+    Request profiling histograms in the Prometheus text format, for scrapers
+    holding METRICS_TOKEN. Without a token configured the endpoint is off.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not token:
+            return Response(
+                {"error": "Metrics are disabled"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response(
+                {"error": "Invalid metrics token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return HttpResponse(get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
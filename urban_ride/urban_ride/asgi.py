@@ -10,7 +10,23 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.signals import request_started
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'urban_ride.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads models
+from api.dispatch import start_offer_dispatcher  # noqa: E402
+from api.realtime import websocket_application  # noqa: E402
+
+# Expires unanswered driver offers in the background. Started by each worker
+# on its first request, since this module may be imported before forking
+request_started.connect(start_offer_dispatcher, dispatch_uid='start_offer_dispatcher')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
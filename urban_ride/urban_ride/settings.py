@@ -50,6 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its wall time covers the rest of the chain; idle unless
+    # PROFILING_SAMPLE_RATE is above 0
+    'api.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -84,11 +87,52 @@ WSGI_APPLICATION = 'urban_ride.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DATABASE_PROFILE picks the backend (see api/db_backends):
+# - sqlite, the default, for a single host. WAL lets reads run alongside the
+#   writer, and write transactions queue for the write lock for up to
+#   SQLITE_BUSY_TIMEOUT seconds instead of failing with "database is locked".
+# - postgres for several workers or hosts. Each thread keeps its connection
+#   for DATABASE_CONN_MAX_AGE seconds, checked before reuse; with
+#   DATABASE_POOL_SIZE set, each process shares up to that many instead.
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='sqlite')
+DATABASE_POOL_SIZE = config('DATABASE_POOL_SIZE', default=0, cast=int)
+
+DATABASE_PROFILES = {
+    'sqlite': {
+        'ENGINE': 'api.db_backends.sqlite3',
+        'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        'OPTIONS': {
+            'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            'transaction_mode': 'IMMEDIATE',
+            # synchronous=NORMAL syncs at checkpoints rather than every
+            # commit, which WAL keeps safe against corruption
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA mmap_size=268435456;'
+            ),
+        },
+    },
+    'postgres': {
+        'ENGINE': 'api.db_backends.postgresql',
+        'NAME': config('DATABASE_NAME', default='urban_ride'),
+        'USER': config('DATABASE_USER', default='postgres'),
+        'PASSWORD': config('DATABASE_PASSWORD', default=''),
+        'HOST': config('DATABASE_HOST', default='localhost'),
+        'PORT': config('DATABASE_PORT', default='5432'),
+        # Pooled connections go back to the pool at the end of each request
+        'CONN_MAX_AGE': 0 if DATABASE_POOL_SIZE else config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': config('DATABASE_CONNECT_TIMEOUT', default=10, cast=int),
+            **({'pool': {'max_size': DATABASE_POOL_SIZE}} if DATABASE_POOL_SIZE else {}),
+        },
+    },
+}
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': DATABASE_PROFILES[DATABASE_PROFILE],
 }
 
 
@@ -113,10 +157,20 @@ AUTH_PASSWORD_VALIDATORS = [
 # Custom User Model
 AUTH_USER_MODEL = 'api.User'
 
+AUTHENTICATION_BACKENDS = ['api.hashing.PooledModelBackend']
+
+# Password hashing runs on a pool of worker processes (api/hashing.py); 0
+# hashes on the request thread. Beyond workers + queue size, callers wait up
+# to the timeout (seconds) for room and then get a 503. Every web process
+# starts its own pool, so size workers per host: cores / web processes.
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+PASSWORD_HASHING_QUEUE_SIZE = config('PASSWORD_HASHING_QUEUE_SIZE', default=32, cast=int)
+PASSWORD_HASHING_TIMEOUT = config('PASSWORD_HASHING_TIMEOUT', default=5, cast=float)
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -138,8 +192,17 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_USER_CLASS': 'api.authentication.ClaimsUser',
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
 }
 
+# Access tokens carry the user's claims; each process caches whether they
+# are still current for this many seconds, which bounds how long a revoked
+# user's tokens keep working (see api/authentication.py)
+AUTH_CLAIMS_CACHE_TTL = config('AUTH_CLAIMS_CACHE_TTL', default=30, cast=int)
+AUTH_CLAIMS_CACHE_SIZE = config('AUTH_CLAIMS_CACHE_SIZE', default=10000, cast=int)
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -168,6 +231,25 @@ CLOUDINARY_STORAGE = {
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+MEDIA_URL = config('MEDIA_URL', default='/media/')
+
+# Profile image pipeline (api/images.py): uploads are staged to disk, then
+# downscaled, thumbnailed and pushed to PROFILE_IMAGE_STORAGE by background
+# workers. api.images.FileSystemImageStorage keeps them under MEDIA_ROOT
+# instead of Cloudinary.
+PROFILE_IMAGE_STORAGE = config('PROFILE_IMAGE_STORAGE', default='api.images.CloudinaryImageStorage')
+PROFILE_IMAGE_STAGING_DIR = config('PROFILE_IMAGE_STAGING_DIR', default=str(BASE_DIR / 'media' / 'staging'))
+PROFILE_IMAGE_WORKERS = config('PROFILE_IMAGE_WORKERS', default=2, cast=int)
+PROFILE_IMAGE_MAX_SIZE = config('PROFILE_IMAGE_MAX_SIZE', default=1024, cast=int)
+# Uploads declaring more pixels than this are refused before anything decodes them
+PROFILE_IMAGE_MAX_PIXELS = config('PROFILE_IMAGE_MAX_PIXELS', default=50_000_000, cast=int)
+PROFILE_IMAGE_QUALITY = config('PROFILE_IMAGE_QUALITY', default=85, cast=int)
+# Square thumbnails rendered alongside every image, by name and side in pixels
+PROFILE_IMAGE_VARIANTS = {
+    'thumbnail': config('PROFILE_IMAGE_THUMBNAIL_SIZE', default=128, cast=int),
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
@@ -175,13 +257,111 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
+# OTP emails are sent by background workers, each holding one pooled SMTP connection
+OTP_EMAIL_WORKERS = config('OTP_EMAIL_WORKERS', default=2, cast=int)
+OTP_EMAIL_BATCH_SIZE = config('OTP_EMAIL_BATCH_SIZE', default=20, cast=int)
+
 # Cache Configuration
+# OTPs and read caches must be visible to every worker process, so the default
+# backend is a SQLite file shared by all processes on the host. For several
+# hosts set CACHE_BACKEND=redis (needs the redis package) and CACHE_LOCATION
+# to a redis:// URL.
+CACHE_BACKENDS = {
+    'sqlite': ('api.cache_backends.SQLiteCache', BASE_DIR / 'cache.sqlite3'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', BASE_DIR / '.cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[config('CACHE_BACKEND', default='sqlite')]
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default=str(CACHE_DEFAULT_LOCATION)),
     }
 }
 
+# Serve slot list/detail and auto list from async views; turn on when running
+# under uvicorn (asgi.py), leave off under WSGI where they would need an adapter
+ASYNC_READ_ENDPOINTS = config('ASYNC_READ_ENDPOINTS', default=False, cast=bool)
+
+# Likewise for token/, which awaits the password hashing pool on the event
+# loop instead of holding the sync adapter thread while it hashes
+ASYNC_TOKEN_ENDPOINT = config('ASYNC_TOKEN_ENDPOINT', default=False, cast=bool)
+
+# Render the slot and auto read endpoints through compiled serializers and
+# orjson (api/fast_serializers.py); the output is the same as DRF's, so this
+# is only a switch back to the plain serializers
+FAST_READ_SERIALIZERS = config('FAST_READ_SERIALIZERS', default=True, cast=bool)
+
+# Admin changelists over tables with at least this many rows show an
+# estimated total (api/admin.py) instead of running COUNT(*) on every page
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+
+# Pub/sub hub behind the /ws/slots/ WebSocket; swap for a broker-backed hub
+# when running more than one worker process
+REALTIME_HUB = config('REALTIME_HUB', default='api.realtime.InProcessHub')
+
+# Seconds a rendered slot detail/list payload stays cached; writes invalidate sooner
+SLOT_CACHE_TIMEOUT = config('SLOT_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds before a worker's in-memory ride-matching index is rebuilt from the
+# database to pick up slots written by other processes
+MATCHING_INDEX_TTL = config('MATCHING_INDEX_TTL', default=30, cast=int)
+
+# Pricing (api/pricing.py): fare = (base + per_km * distance) * demand for the
+# hour, and each participant pays fee_rate of their share, at least min_fee
+PRICING_BASE_FARE = config('PRICING_BASE_FARE', default=20, cast=float)
+PRICING_PER_KM = config('PRICING_PER_KM', default=4, cast=float)
+PRICING_FEE_RATE = config('PRICING_FEE_RATE', default=0.1, cast=float)
+PRICING_MIN_FEE = config('PRICING_MIN_FEE', default=5, cast=float)
+PRICING_MAX_BATCH = config('PRICING_MAX_BATCH', default=10000, cast=int)
+# Seats a batch quote may ask for: the largest slot capacity, an auto's seats
+PRICING_MAX_SEATS = config('PRICING_MAX_SEATS', default=6, cast=int)
+
+# POST /api/slots/bulk/: rows accepted per request, and rows written per
+# transaction (each transaction draws its autos with one locking query)
+SLOT_BULK_MAX_ROWS = config('SLOT_BULK_MAX_ROWS', default=10000, cast=int)
+SLOT_BULK_CHUNK_SIZE = config('SLOT_BULK_CHUNK_SIZE', default=500, cast=int)
+
+# Rows fetched per round trip by /api/exports/ and the export_data command
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Seconds a row must have existed before an export's cursor moves past it,
+# so transactions still open at export time are not skipped (api/exports.py)
+EXPORT_SAFETY_LAG = config('EXPORT_SAFETY_LAG', default=60, cast=int)
+
+# Slot lifecycle worker (manage.py run_lifecycle): seconds a PENDING_DRIVER
+# slot waits for a driver, seconds after ride_time a ride counts as done,
+# slots per UPDATE batch and seconds between schedule reloads
+SLOT_PENDING_TIMEOUT = config('SLOT_PENDING_TIMEOUT', default=900, cast=int)
+SLOT_RIDE_DURATION = config('SLOT_RIDE_DURATION', default=3600, cast=int)
+LIFECYCLE_BATCH_SIZE = config('LIFECYCLE_BATCH_SIZE', default=500, cast=int)
+LIFECYCLE_REFRESH_INTERVAL = config('LIFECYCLE_REFRESH_INTERVAL', default=60, cast=int)
+
+# Driver offers (api/dispatch.py): seconds the driver of a newly booked auto
+# has to accept before the slot is offered to the next queued auto. Deadlines
+# are kept in a timer wheel of DISPATCH_WHEEL_SIZE buckets, one per
+# DISPATCH_WHEEL_RESOLUTION seconds; each process expires offers in batches
+# and reloads those coming due from the database every refresh interval
+DISPATCH_OFFER_TIMEOUT = config('DISPATCH_OFFER_TIMEOUT', default=30, cast=int)
+DISPATCH_WHEEL_RESOLUTION = config('DISPATCH_WHEEL_RESOLUTION', default=1.0, cast=float)
+DISPATCH_WHEEL_SIZE = config('DISPATCH_WHEEL_SIZE', default=512, cast=int)
+DISPATCH_BATCH_SIZE = config('DISPATCH_BATCH_SIZE', default=500, cast=int)
+DISPATCH_REFRESH_INTERVAL = config('DISPATCH_REFRESH_INTERVAL', default=60, cast=int)
+
+# Route availability summary (manage.py reconcile_availability): seconds
+# between rebuilds from Slot, and hours of past rows kept before pruning
+AVAILABILITY_RECONCILE_INTERVAL = config('AVAILABILITY_RECONCILE_INTERVAL', default=300, cast=int)
+AVAILABILITY_KEEP_HOURS = config('AVAILABILITY_KEEP_HOURS', default=1, cast=int)
+
+# Request profiling (api.profiling.ProfilingMiddleware): fraction of requests
+# sampled (0 turns it off), executions of one statement with different
+# parameters in a request that are reported as an N+1, and the bearer token
+# /api/metrics/ requires; the endpoint answers 404 until one is set
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_N_PLUS_ONE_THRESHOLD = config('PROFILING_N_PLUS_ONE_THRESHOLD', default=5, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.core.signals import request_started
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'urban_ride.settings')
 
 application = get_wsgi_application()
+
+# Imported after Django is set up, since it loads models
+from api.dispatch import start_offer_dispatcher  # noqa: E402
+
+# Expires unanswered driver offers in the background. Started by each worker
+# on its first request, since this module may be imported before forking
+request_started.connect(start_offer_dispatcher, dispatch_uid='start_offer_dispatcher')